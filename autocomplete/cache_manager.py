@@ -5,10 +5,16 @@ It caches various GPAC components such as filters, modules, arguments, protocols
 properties, and enum values to improve performance and reduce redundant command executions.
 Classes:
     Cache: Manages the caching of GPAC command outputs.
+    DeadlineExceeded: Raised when gpac could not answer before the deadline of a completion.
 
 The cache has this structure:
 content = {
     "version": "version_of_gpac_associated_with_cache_content",
+    "fingerprint": {
+        "gpac": [path, inode, size, mtime_ns] of the gpac binary,
+        "libgpac": [path, inode, size, mtime_ns] of libgpac, or null if not found,
+        "ld_library_path": value of LD_LIBRARY_PATH when libgpac was searched,
+    },
     "cache": {
         "filters": [list of all filters],
         "args": {
@@ -40,17 +46,393 @@ content = {
             ...
         },
         props: [list of all properties],
+        index: {
+            "filters": [positions of the filters, sorted by name],
+            "args.filter1": [positions of the args of filter1, sorted by name],
+            ...
+        },
         enum_values: {
             "filter1": {dict of all enum values of filter1 args: value1=>arg1, value2=>arg2, ...},
             "filter2": {dict of all enum values of filter2 args: value1=>arg1, value2=>arg2, ...},
         }
     }
 }
+
+A read-only base cache, e.g. built once for all the users of a machine by build_base_cache, may
+be layered under the cache: its entries are used when they are for the same version of GPAC,
+and the cache itself only holds the entries missing from it.
+
+The cache files of the previous versions of GPAC are kept in a cache_versions.VersionStore:
+when the gpac binary found in PATH is one of them, its cache file is restored at once.
+Otherwise, the entries of the previous version are served, marked stale, until the cache is
+rebuilt for the new version (by Cache.fill, e.g. in a background process) and replaced in a
+single write.
+
+With a deadline (see set_deadline), a cache miss which gpac cannot answer in time raises
+DeadlineExceeded, and the missing entry is recorded in Cache.missed, to be fetched later by
+Cache.fill (e.g. in a background process).
 """
 import os
 import json
-import subprocess as sp
-import re
+import atexit
+import time
+from _thread import get_ident
+import completion_trace as trace
+# subprocess and re are imported by the functions running gpac: a completion served
+# from the cache does not pay for them
+from prefix_index import PrefixIndex
+from cache_storage import get_storage, to_builtin, FileLock, KeyLock, KEYED_SECTIONS
+from cache_versions import VersionStore
+
+# directories searched for libgpac, after LD_LIBRARY_PATH and the prefix of the gpac binary
+LIB_DIRS = ["/usr/local/lib", "/usr/local/lib64", "/usr/lib", "/usr/lib64",
+            "/usr/lib/x86_64-linux-gnu", "/usr/lib/aarch64-linux-gnu", "/opt/homebrew/lib"]
+LIB_NAMES = ["libgpac.so", "libgpac.dylib"]
+
+# delay (in seconds) during which a computed fingerprint is trusted without new stat calls
+FINGERPRINT_TTL = 1.0
+
+# escape sequences used by gpac to color its help
+ANSI_PATTERN = r"\x1b\[[0-9;]*m"
+
+# versions already obtained from a gpac binary by this process, keyed by fingerprint
+_known_versions = {}
+
+# time.monotonic() time after which gpac is not run anymore by each thread, keyed by thread
+# identifier: the completions of several threads have their own deadlines
+_deadlines = {}
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when gpac could not answer before the deadline of the completion.
+    """
+
+
+def set_deadline(deadline: float|None)-> None:
+    """
+    Set the time.monotonic() time after which the runs of gpac of the current thread are
+    interrupted, or None.
+    """
+    if deadline is None:
+        _deadlines.pop(get_ident(), None)
+    else:
+        _deadlines[get_ident()] = deadline
+
+
+def find_gpac()-> str|None:
+    """
+    Find the gpac binary in PATH, as shutil.which("gpac") would.
+    """
+    for directory in os.environ.get("PATH", os.defpath).split(os.pathsep):
+        candidate = os.path.join(directory or os.curdir, "gpac")
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return candidate
+    return None
+
+
+def find_libgpac(gpac_path: str)-> str|None:
+    """
+    Find the libgpac library most likely loaded by the given gpac binary.
+    """
+    prefix = os.path.dirname(os.path.dirname(gpac_path))
+    dirs = [e for e in os.environ.get("LD_LIBRARY_PATH", "").split(":") if e]
+    dirs += [os.path.dirname(gpac_path), os.path.join(prefix, "lib"), os.path.join(prefix, "lib64")]
+    for directory in dirs + LIB_DIRS:
+        for name in LIB_NAMES:
+            candidate = os.path.join(directory, name)
+            if os.path.exists(candidate):
+                return os.path.realpath(candidate)
+    return None
+
+
+def get_gpac_fingerprint(previous: dict|None = None)-> dict|None:
+    """
+    Get a cheap fingerprint of the gpac binary found in PATH and of its libgpac:
+    path, inode, size and modification time of both files, and the LD_LIBRARY_PATH the
+    library was searched with.
+    A rebuild, an upgrade or a change of PATH or LD_LIBRARY_PATH gives a different fingerprint.
+    previous is the previous fingerprint, if any: its library is not searched again as long as
+    it exists and LD_LIBRARY_PATH has not changed.
+    """
+    gpac = find_gpac()
+    if gpac is None:
+        return None
+    gpac = os.path.realpath(gpac)
+    library_path = os.environ.get("LD_LIBRARY_PATH", "")
+    libgpac = None
+    if previous and previous.get("libgpac") and previous.get("ld_library_path", None) == library_path:
+        libgpac = previous["libgpac"][0]
+    if libgpac is None or not os.path.exists(libgpac):
+        libgpac = find_libgpac(gpac)
+    fingerprint = {}
+    for key, path in (("gpac", gpac), ("libgpac", libgpac)):
+        if path is None:
+            fingerprint[key] = None
+            continue
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        fingerprint[key] = [path, stat.st_ino, stat.st_size, stat.st_mtime_ns]
+    fingerprint["ld_library_path"] = library_path
+    return fingerprint
+
+
+def run_gpac(args: list, merge_stderr: bool = False)-> bytes:
+    """
+    Run the GPAC binary with the given arguments and return its output.
+    The error output is merged into the output if merge_stderr is True, discarded otherwise.
+    If a deadline is set (see set_deadline), gpac is killed when it passes and DeadlineExceeded
+    is raised.
+    """
+    import subprocess as sp
+    stderr = sp.STDOUT if merge_stderr else sp.DEVNULL
+    timeout = None
+    deadline = _deadlines.get(get_ident(), None)
+    if deadline is not None:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            raise DeadlineExceeded(f"deadline passed before running gpac {' '.join(args)}")
+    start = time.perf_counter()
+    status = 0
+    try:
+        return sp.check_output(["gpac", *args], stderr=stderr, timeout=timeout)
+    except sp.TimeoutExpired:
+        status = None
+        raise DeadlineExceeded(f"gpac {' '.join(args)} still running at the deadline") from None
+    except sp.CalledProcessError as e:
+        status = e.returncode
+        raise
+    finally:
+        if trace.enabled:
+            trace.event("run", argv=["gpac", *args], ms=(time.perf_counter() - start) * 1000, status=status)
+
+
+def run_gpac_version(fingerprint: dict|None)-> str|None:
+    """
+    Get the version of the GPAC binary by running it.
+    The binary is run at most once per process for a given fingerprint.
+    """
+    key = json.dumps(fingerprint) if fingerprint is not None else None
+    if key is not None and key in _known_versions:
+        return _known_versions[key]
+    import re
+    result = run_gpac([], merge_stderr=True).decode()
+    pattern = r".*version\s(?P<version>[\dA-Za-z\.\-]+).*"
+    match = re.search(pattern, result)
+    version = match.group("version") if match else None
+    if key is not None:
+        _known_versions[key] = version
+    return version
+
+
+def fetch_list_filters()-> list:
+    """
+    Fetch the list of filters from the GPAC binary.
+    """
+    import re
+    temp = run_gpac(["-h", "filters"]).decode()
+    pattern = re.compile(r"\x1b\[32m([A-Za-z0-9]*):\x1b\[0m")
+    return pattern.findall(temp)
+
+
+def fetch_list_modules()-> list:
+    """
+    Fetch the list of modules from the GPAC binary.
+    """
+    import re
+    temp = run_gpac(["-h", "modules"]).decode()
+    pattern = re.compile(r"\x1b\[32m([A-Za-z0-9\.\_]*):\x1b\[0m")
+    return pattern.findall(temp)
+
+
+def fetch_list_args(gfilter: str)-> dict:
+    """
+    Fetch the arguments of a filter and their types from the GPAC binary.
+    """
+    import re
+    tmp = run_gpac(["-h", gfilter+".*", "-logs=ncl"]).decode()
+    tmp = tmp.strip("\n ").split("\n")
+    args = {}
+    pattern = re.compile(pattern = r"^(?P<name>\w+)\s*\((?P<type>\w+).*$")
+    for line in tmp:
+        if len(line) > 0 and line[0] not in {' ', '-', '\t'}:
+            res = pattern.match(line)
+            if res:
+                args[res.group('name')] = res.group('type')
+    return args
+
+
+def fetch_type_arg_filter(gfilter: str, arg: str)-> tuple:
+    """
+    Fetch the type and values of an argument of a filter from the GPAC binary.
+    """
+    import re
+    type_arg = None
+    values = []
+    help_arg = run_gpac(["-h", f"{gfilter}.{arg}"]).decode()
+    pattern = re.compile(pattern = rf"^\x1b\[32m{arg}\x1b\[0m\s*\((?P<type>[^,\)]+)[,\)]")
+    res_match = pattern.match(help_arg)
+    if res_match:
+        type_arg = res_match.group('type')
+    if type_arg == "enum":
+        pattern = re.compile(r"\x1b\[33m([A-Za-z0-9]+)\x1b\[0m\:")
+        values = pattern.findall(help_arg)
+    return (type_arg, values)
+
+
+def fetch_list_protocols()-> dict:
+    """
+    Fetch the protocols and their input and output filters from the GPAC binary.
+    """
+    import re
+    protocols = {}
+    temp = run_gpac(["-ha", "protocols", "-logs=ncl"])
+    temp = temp.decode().strip("\n").split("\n")[1:]
+    regex = r"(?P<proto>\w+):(?:\s*in\s*\((?P<in>[^\)]*)\))?(?:\s*out\s*\((?P<out>[^\)]*)\))?"
+    pattern = re.compile(regex)
+    for line in temp:
+        match = pattern.match(line)
+        if match:
+            protocol = match.group('proto')
+            in_filters = match.group('in')
+            out_filters = match.group('out')
+            protocols[protocol] = {
+                "input": in_filters.split(", ") if in_filters else [],
+                "output": out_filters.split(", ") if out_filters else []
+            }
+    return protocols
+
+
+def fetch_list_props()-> list:
+    """
+    Fetch the list of properties from the GPAC binary.
+    """
+    import re
+    temp = run_gpac(["-h", "props"]).decode()
+    pattern = re.compile(r"\x1b\[32m([A-Z][A-Za-z]*)\x1b\[0m")
+    return pattern.findall(temp)
+
+
+def parse_filter_options(lines: list)-> tuple:
+    """
+    Parse the options printed by gpac in the help of a filter.
+    Only the lines of the "# Options" block are parsed: the help text of the filter before it
+    may be laid out like options. The values of an enum argument are the "- value:" lines
+    following it.
+    Returns the dict of arguments and their types, and the dict of values of each enum argument.
+    """
+    import re
+    args = {}
+    values_enum_args = {}
+    pattern = re.compile(pattern = r"^(?P<name>\w+)\s*\((?P<type>\w+)[,\)]")
+    value_pattern = re.compile(r"^-\s*\x1b\[33m([A-Za-z0-9]+)\x1b\[0m\:")
+    header = re.compile(r"^#\s*(?P<title>\w+)")
+    ansi = re.compile(ANSI_PATTERN)
+    in_options = False
+    current = None
+    for line in lines:
+        plain = ansi.sub("", line)
+        res = header.match(plain)
+        if res:
+            in_options = res.group('title') == "Options"
+            current = None
+            continue
+        if not in_options:
+            continue
+        res = pattern.match(plain)
+        if res:
+            current = res.group('name')
+            args[current] = res.group('type')
+            if args[current] == "enum":
+                values_enum_args[current] = []
+            continue
+        values = value_pattern.findall(line)
+        if current in values_enum_args and values:
+            values_enum_args[current] += values
+        else:
+            # the values of an enum argument end with the first other line
+            current = None
+    return args, values_enum_args
+
+
+def fetch_filters_options(filters: list)-> dict:
+    """
+    Fetch the arguments, their types and their enum values of several filters
+    from a single run of the GPAC binary. The help is requested with -hx, which lists the
+    advanced and expert options too, as "gpac -h FILTER.*" does.
+    Returns a dict of (args, values_enum_args) tuples for each filter found in the help output.
+    """
+    import re
+    temp = run_gpac(["-hx", *filters]).decode()
+    names = set(filters)
+    header = re.compile(r"^#\s*(?P<name>\w+)\s*$")
+    ansi = re.compile(ANSI_PATTERN)
+    sections = {}
+    lines = None
+    for line in temp.split("\n"):
+        res = header.match(ansi.sub("", line))
+        if res and res.group('name') in names:
+            lines = sections.setdefault(res.group('name'), [])
+        elif lines is not None:
+            lines.append(line)
+    return {gfilter: parse_filter_options(lines) for gfilter, lines in sections.items()}
+
+
+def fetch_filter_options(gfilter: str)-> tuple:
+    """
+    Fetch the arguments of a filter, advanced and expert ones included, their types and the
+    values of its enum arguments from a single run of the GPAC binary.
+    If gpac prints another layout, the values of the enum arguments are fetched by one request
+    per argument, run by a pool of at most 8 threads.
+    Returns the dict of arguments and their types, and the dict of values of each enum argument.
+    """
+    import subprocess as sp
+    try:
+        options = fetch_filters_options([gfilter])
+    except sp.CalledProcessError:
+        options = {}
+    if gfilter in options:
+        return options[gfilter]
+
+    dict_args = fetch_list_args(gfilter)
+    enum_args = [arg for arg in dict_args if dict_args[arg] == "enum"]
+    if len(enum_args) == 0:
+        return dict_args, {}
+    deadline = _deadlines.get(get_ident(), None)
+
+    def fetch_values(arg):
+        # with the deadline of the calling thread, cleared for the next users of the worker
+        set_deadline(deadline)
+        try:
+            return fetch_type_arg_filter(gfilter, arg)[1]
+        finally:
+            set_deadline(None)
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(8, len(enum_args))) as pool:
+        values = pool.map(fetch_values, enum_args)
+        return dict_args, dict(zip(enum_args, values))
+
+
+def build_values_enum_args(dict_args: dict, values_enum_args: dict)-> dict:
+    """
+    Build the map of enum values to their argument from the values of each enum argument.
+    Values shared by several arguments and values named like an argument are removed.
+    """
+    duplicate = set()
+    ans = {}
+    for arg, values in values_enum_args.items():
+        for value in values:
+            if value not in duplicate:
+                if ans.get(value, None) is not None:
+                    duplicate.add(value)
+                    del ans[value]
+                elif value not in dict_args:
+                    ans[value] = arg
+    return ans
+
 
 class Cache:
     """
@@ -59,36 +441,397 @@ class Cache:
     -----------
     path : str
         The file path where the cache is stored.
+        Paths ending with ".bin" use the binary format of cache_storage.BinaryStorage,
+        other paths are JSON files.
+    base_path : str|None
+        The file path of the read-only base cache, if any.
     """
-    def __init__(self, path: str):
+    @trace.traced
+    def __init__(self, path: str, base_path: str|None = None):
         self.path = path
-        if os.path.isfile(path):
-            with open(path, "r", encoding="utf-8") as file:
-                self.content = json.load(file)
-        else:
-            self.content = {"version": self.get_gpac_version(), "cache": {}}
-            self.save()
+        self.storage = get_storage(path)
+        self.base_storage = get_storage(base_path) if base_path else None
+        # content of the base cache, loaded on first use
+        self._base = None
+        self._fingerprint = None
+        self._checked_at = None
+        self._version = None
+        self._indexes = {}
+        # entries changed since the last save, as (section, key) pairs:
+        # key is None for a whole section, section is None for the top-level entries of the content
+        self.dirty = set()
+        # entries which could not be fetched before the deadline, named "section" or "section.key",
+        # or "cache" for the whole cache when it is stale
+        self.missed = []
+        # version of GPAC of the entries served while the cache is rebuilt for a new one, or None
+        self.stale = None
+        # caches of the other versions of GPAC
+        self.versions = VersionStore(path)
+        # signature of the cache file when it was last read or written by this process,
+        # and (version, fingerprint) of its content
+        self._signature = self.storage.signature()
+        self.content = self.storage.load()
+        self._stored = (self.content["version"], self.content.get("fingerprint", None)) if self.content else None
+        if self.content is None:
+            self.content = {"version": None, "fingerprint": None, "cache": {}}
+            try:
+                version = self.get_gpac_version()
+            except DeadlineExceeded:
+                # nothing to write before the version is known
+                pass
+            else:
+                # unless the cache of this version was restored
+                if self.content["version"] != version or not self.content["cache"]:
+                    self._reset(version)
+        atexit.register(self._flush_at_exit)
 
 
-    def save(self):
+    @trace.traced
+    def save(self)-> bool:
         """
         Save the cache content to the file.
+        Several processes may share the cache file: writers are serialized by a lock, and if the
+        file was written by another process since it was read, the entries changed in this cache
+        are merged into its content instead of overwriting it.
+        The changed entries are appended to the journal of the cache file when possible, the
+        whole cache being written only when the journal is full or the cache was reset.
+        A cache file of another version of GPAC is compacted and archived before being replaced.
+        Returns False if the lock could not be taken in time, the changes being kept for the next save.
+        """
+        with FileLock(self.path) as locked:
+            if not locked:
+                return False
+            signature = self.storage.signature()
+            if signature is None:
+                self._stored = None
+            elif signature != self._signature:
+                stored = self.storage.load()
+                self._stored = (stored.get("version", None), stored.get("fingerprint", None)) if stored else None
+                self.content = self._merge(stored)
+                self._indexes = {}
+            if self._stored is not None and self._stored[0] != self.content["version"]:
+                self.storage.compact()
+                self.versions.archive(*self._stored)
+            elif self._stored is not None and self._append_journal():
+                self._signature = self.storage.signature()
+                self.dirty.clear()
+                return True
+            self.storage.save(self.content)
+            self._signature = self.storage.signature()
+            self._stored = (self.content["version"], self.content.get("fingerprint", None))
+        self.dirty.clear()
+        return True
+
+
+    def _append_journal(self)-> bool:
+        """
+        Append the entries changed in this cache to the journal of the cache file.
+        Returns False if they must be written with the whole cache instead: the cache was
+        reset, or the journal is full.
+        """
+        cache = self.content.get("cache", None) or {}
+        records = []
+        for section, key in self.dirty:
+            if section is None:
+                if key == "cache":
+                    return False
+                if key in self.content:
+                    records.append(["@", key, self.content[key]])
+            elif section not in cache:
+                continue
+            elif key is None:
+                records.append([section, None, to_builtin(cache[section])])
+            elif key in cache[section]:
+                records.append([section, key, cache[section][key]])
+        return self.storage.append(self.content, records)
+
+
+    def _merge(self, stored: dict|None)-> dict:
+        """
+        Merge the entries changed in this cache into the content stored by another process.
+        The stored content is discarded if it is not for the same version of GPAC.
+        """
+        if stored is None or stored.get("version", None) != self.content["version"]:
+            return self.content
+        if stored.get("cache", None) is None:
+            stored["cache"] = {}
+        sections = stored["cache"]
+        cache = self.content.get("cache", None) or {}
+
+        def merge_section(name, value):
+            if name in KEYED_SECTIONS and sections.get(name, None) is not None:
+                for key in value:
+                    sections[name][key] = value[key]
+            else:
+                sections[name] = value
+
+        for section, key in self.dirty:
+            if section is None:
+                if key == "cache":
+                    for name in cache:
+                        merge_section(name, cache[name])
+                elif key in self.content:
+                    stored[key] = self.content[key]
+            elif section not in cache:
+                continue
+            elif key is None:
+                merge_section(section, cache[section])
+            elif key in cache[section]:
+                if sections.get(section, None) is None:
+                    sections[section] = {}
+                sections[section][key] = cache[section][key]
+        return stored
+
+
+    def flush(self)-> bool:
+        """
+        Save the cache content to the file if it has changed since the last save.
+        Cache misses only mark the cache as changed: the cache is meant to be flushed once,
+        at the end of a completion, or periodically by long-running processes.
+        Returns True if the file was written.
+        A stale cache is never written: its file is only replaced by the rebuilt cache.
+        """
+        if not self.dirty:
+            return False
+        if self.stale is not None:
+            self.dirty.clear()
+            return False
+        return self.save()
+
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except OSError:
+            pass
+
+
+    def _mark_dirty(self, section: str|None, key: str|None = None):
+        """
+        Mark an entry of the cache as changed since the last save.
+        """
+        self.dirty.add((section, key))
+
+
+    def _fetch(self, name: str, function, *args):
+        """
+        Fetch a missing entry of the cache, named "section" or "section.key", with function(*args).
+        If it could not be fetched before the deadline, the entry is recorded in missed.
+        """
+        try:
+            return function(*args)
+        except DeadlineExceeded:
+            if name not in self.missed:
+                self.missed.append(name)
+            raise
+
+
+    def is_filling(self, name: str)-> bool:
         """
-        os.makedirs(os.path.dirname(self.path), exist_ok=True)
-        with open(self.path, "w", encoding="utf-8") as file:
-            json.dump(self.content, file, indent=4)
+        Check whether an entry of the cache is being fetched by another process (see fill).
+        """
+        lock = KeyLock(self.path, name, timeout=0)
+        if lock.acquire():
+            lock.release()
+            return False
+        return True
+
+
+    def fill(self, names: list)-> bool:
+        """
+        Fetch the given entries of the cache, named as in missed, without deadline.
+        Each entry is fetched by a single process at a time: the entries being fetched by another
+        process are skipped. The cache is saved after each entry.
+        Returns False if all the entries were skipped.
+        """
+        getters = {
+            "version": lambda key: self._get_cache_sections(),
+            "filters": lambda key: self.get_cache_list_filters(),
+            "modules": lambda key: self.get_cache_list_modules(),
+            "protocols": lambda key: self.get_cache_list_protocols(),
+            "props": lambda key: self.get_cache_list_props(),
+            "args": self.get_cache_list_args,
+            "enum_values": self.get_cache_list_values_enum_args,
+            "type_arg_filter": lambda key: self.get_cache_type_arg_filter(*key.split(".", 1)),
+            "cache": lambda key: self.rebuild(),
+        }
+        filled = False
+        for name in names:
+            section, _, key = name.partition(".")
+            if section not in getters:
+                continue
+            with KeyLock(self.path, name, timeout=0) as locked:
+                if locked:
+                    getters[section](key)
+                    self.flush()
+                    filled = True
+        return filled
 
 
     def get_gpac_version(self)-> str|None:
         """
         Get the version of the GPAC binary.
+        The binary is only run when its fingerprint differs from the one stored in the cache,
+        so that a warm cache is validated without spawning any process.
         """
-        result = sp.check_output(["gpac"], stderr=sp.STDOUT).decode()
-        pattern = r".*version\s(?P<version>[\dA-Za-z\.\-]+).*"
-        match = re.search(pattern, result)
-        if match:
-            return match.group("version")
-        return None
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < FINGERPRINT_TTL:
+            return self._version
+        return self._check_gpac_version(now)
+
+
+    @trace.traced
+    def _check_gpac_version(self, now: float)-> str|None:
+        """
+        Get the version of the GPAC binary from its fingerprint, running it if needed.
+        """
+        stored = self.content.get("fingerprint", None)
+        fingerprint = get_gpac_fingerprint(stored)
+        if fingerprint is not None and fingerprint == stored:
+            version = self.content["version"]
+        else:
+            # a binary whose cache is archived, or of the base cache, is not run
+            version = self.versions.find(fingerprint)
+            if version is None and fingerprint is not None and self._load_base().get("fingerprint", None) == fingerprint:
+                version = self._base["version"]
+            if version is None:
+                version = self._fetch("version", run_gpac_version, fingerprint)
+            if self.content.get("version", None) == version and fingerprint is not None:
+                # same version from a new binary: only refresh the fingerprint
+                self.content["fingerprint"] = fingerprint
+                self._mark_dirty(None, "fingerprint")
+
+        self._fingerprint = fingerprint
+        self._version = version
+        self._checked_at = now
+        if self.content.get("version", None) != version:
+            self._switch_version(version)
+        return version
+
+
+    def _switch_version(self, version: str|None)-> None:
+        """
+        Called when the cached entries are not for the current version of GPAC: switch to the
+        cache file if it was rebuilt for this version or to its archived cache, otherwise keep
+        serving the cached entries, marked stale, and record the whole cache as missed so that it
+        is rebuilt.
+        """
+        signature = self.storage.signature()
+        if signature is not None and signature != self._signature and self._load_version(version, signature):
+            trace.event("rebuilt", version=version)
+            return
+        if self.versions.has(version):
+            with FileLock(self.path) as locked:
+                if locked:
+                    # the current cache file is archived in turn
+                    signature = self.storage.signature()
+                    if signature != self._signature:
+                        stored = self.storage.load()
+                        self._stored = (stored.get("version", None), stored.get("fingerprint", None)) if stored else None
+                    if self._stored is not None and self._stored[0] != version:
+                        self.storage.compact()
+                        self.versions.archive(*self._stored)
+                    if self.versions.restore(version) and self._load_version(version, self.storage.signature()):
+                        trace.event("restored", version=version)
+                        return
+        if not self.content.get("cache", None) or self._load_base().get("version", None) == version:
+            # nothing to serve, or served by the base cache
+            return
+        if self.stale is None:
+            trace.event("stale", version=self.content["version"], current=version)
+        self.stale = self.content["version"]
+        if "cache" not in self.missed:
+            self.missed.append("cache")
+
+
+    def _load_version(self, version: str|None, signature: tuple|None)-> bool:
+        """
+        Load the cache file of the given signature if it holds the cache of the given version.
+        """
+        stored = self.storage.load()
+        if stored is None or stored.get("version", None) != version:
+            return False
+        self.content = stored
+        self._signature = signature
+        self._stored = (version, stored.get("fingerprint", None))
+        self._indexes = {}
+        self.dirty.clear()
+        self.stale = None
+        return True
+
+
+    def _load_base(self)-> dict:
+        """
+        Get the content of the base cache, loaded on first use, or an empty dict.
+        """
+        if self._base is None:
+            self._base = (self.base_storage.load() if self.base_storage is not None else None) or {}
+        return self._base
+
+
+    def _cached(self, cache: dict, section: str, key: str|None = None):
+        """
+        Get an entry of the cached sections, or else of the base cache if it is for the same
+        version of GPAC, or None.
+        """
+        value = cache.get(section, None)
+        if value is not None and key is not None:
+            value = value.get(key, None)
+        if value is None and self.base_storage is not None:
+            base = self._load_base()
+            if base.get("version", None) == self.content["version"] and base.get("cache", None) is not None:
+                value = base["cache"].get(section, None)
+                if value is not None and key is not None:
+                    value = value.get(key, None)
+        return value
+
+
+    def _get_cache_sections(self)-> dict:
+        """
+        Get the cached sections.
+        If the version of GPAC has changed, these are the stale sections of the previous version
+        until the cache is rebuilt, or new empty sections if there were no entries to serve.
+        """
+        current_version = self.get_gpac_version()
+        if self.content["version"] != current_version and self.content["version"] != self.stale:
+            self._reset(current_version)
+        elif self.content.get("cache", None) is None:
+            self.content["cache"] = {}
+        return self.content["cache"]
+
+
+    def _reset(self, version: str|None)-> None:
+        """
+        Replace the content by an empty cache for the given version of GPAC.
+        """
+        self.content = {
+            "version": version,
+            "fingerprint": self._fingerprint,
+            "cache": {}
+        }
+        self._indexes = {}
+        self.stale = None
+        self._mark_dirty(None, "cache")
+
+
+    def get_cache_index(self, name: str, source)-> PrefixIndex:
+        """
+        Get the prefix index of a list (or dict) of names from the cache.
+        name identifies the indexed names, e.g. "filters" or "args.inspect".
+        The sorted order of the names is stored in the cache, so that it is only computed once.
+        """
+        index = self._indexes.get(name, None)
+        if index is not None and index.source is source:
+            return index
+        cache = self._get_cache_sections()
+        cache.setdefault("index", {})
+        stored = self._cached(cache, "index", name)
+        index = PrefixIndex(source, stored)
+        if index.order is not stored:
+            cache["index"][name] = index.order
+            self._mark_dirty("index", name)
+        self._indexes[name] = index
+        return index
 
 
     def get_cache_list_filters(self)-> list:
@@ -97,23 +840,15 @@ class Cache:
         If the cache is not present or the version of GPAC has changed,
         then the list of filters is fetched from the GPAC binary.
         """
-        current_version = self.get_gpac_version()
-        if self.content["version"] == current_version:
-            if self.content.get("cache", None) is not None:
-                if self.content["cache"].get("filters", None) is not None:
-                    return self.content["cache"]["filters"]
-            else:
-                self.content["cache"] = {}
-        else:
-            self.content = {
-                "version": current_version,
-                "cache": {}
-            }
-        temp = sp.check_output(["gpac", "-h", "filters"], stderr=sp.DEVNULL).decode()
-        pattern = re.compile(r"\x1b\[32m([A-Za-z0-9]*):\x1b\[0m")
-        self.content["cache"]["filters"] = pattern.findall(temp)
-        self.save()
-        return self.content["cache"]["filters"]
+        cache = self._get_cache_sections()
+        value = self._cached(cache, "filters")
+        if value is not None:
+            trace.event("lookup", section="filters", hit=True)
+            return value
+        trace.event("lookup", section="filters", hit=False)
+        cache["filters"] = self._fetch("filters", fetch_list_filters)
+        self._mark_dirty("filters")
+        return cache["filters"]
 
 
     def get_cache_list_modules(self)-> list:
@@ -122,23 +857,15 @@ class Cache:
         If the cache is not present or the version of GPAC has changed,
         then the list of modules is fetched from the GPAC binary.
         """
-        current_version = self.get_gpac_version()
-        if self.content["version"] == current_version:
-            if self.content.get("cache", None) is not None:
-                if self.content["cache"].get("modules", None) is not None:
-                    return self.content["cache"]["modules"]
-            else:
-                self.content["cache"] = {}
-        else:
-            self.content = {
-                "version": current_version,
-                "cache": {}
-            }
-        temp = sp.check_output(["gpac", "-h", "modules"], stderr=sp.DEVNULL).decode()
-        pattern = re.compile(r"\x1b\[32m([A-Za-z0-9\.\_]*):\x1b\[0m")
-        self.content["cache"]["modules"] = pattern.findall(temp)
-        self.save()
-        return self.content["cache"]["modules"]
+        cache = self._get_cache_sections()
+        value = self._cached(cache, "modules")
+        if value is not None:
+            trace.event("lookup", section="modules", hit=True)
+            return value
+        trace.event("lookup", section="modules", hit=False)
+        cache["modules"] = self._fetch("modules", fetch_list_modules)
+        self._mark_dirty("modules")
+        return cache["modules"]
 
 
     def get_cache_list_args(self, gfilter: str)-> dict:
@@ -147,32 +874,15 @@ class Cache:
         If the cache is not present or the version of GPAC has changed,
         then the list of arguments is fetched from the GPAC binary.
         """
-        curr_version = self.get_gpac_version()
-        if self.content["version"] == curr_version:
-            if self.content.get("cache", None) is not None:
-                if self.content["cache"].get("args", None) is not None:
-                    if self.content["cache"].get("args", None).get(gfilter, None) is not None:
-                        return self.content["cache"]["args"][gfilter]
-                else:
-                    self.content["cache"]["args"] = {}
-            else:
-                self.content["cache"] = {"args": {}}
-        else:
-            self.content = {
-                "version": curr_version,
-                "cache": {"args": {}}
-            }
-        tmp = sp.check_output(["gpac", "-h", gfilter+".*", "-logs=ncl"], stderr=sp.DEVNULL).decode()
-        tmp = tmp.strip("\n ").split("\n")
-        self.content["cache"]["args"][gfilter] = {}
-        pattern = re.compile(pattern = r"^(?P<name>\w+)\s*\((?P<type>\w+).*$")
-        for line in tmp:
-            if len(line) > 0 and line[0] not in {' ', '-', '\t'}:
-                res = pattern.match(line)
-                if res:
-                    self.content["cache"]["args"][gfilter][res.group('name')] = res.group('type')
-        self.save()
-        return self.content["cache"]["args"][gfilter]
+        cache = self._get_cache_sections()
+        value = self._cached(cache, "args", gfilter)
+        if value is not None:
+            trace.event("lookup", section="args", key=gfilter, hit=True)
+            return value
+        trace.event("lookup", section="args", key=gfilter, hit=False)
+        # the types and enum values of the arguments come with them, and are needed next
+        self._store_filter_options(cache, gfilter, *self._fetch("args." + gfilter, fetch_filter_options, gfilter))
+        return cache["args"][gfilter]
 
 
     def get_cache_type_arg_filter(self, gfilter: str, arg: str)-> tuple:
@@ -182,45 +892,28 @@ class Cache:
         then the type and values of the argument are fetched from the GPAC binary.
         """
         f_arg = f"{gfilter}.{arg}"
-        curr_version = self.get_gpac_version()
-        if self.content["version"] == curr_version:
-            if self.content.get("cache", None) is not None:
-                if self.content["cache"].get("type_arg_filter", None) is not None:
-                    if self.content["cache"]["type_arg_filter"].get(f_arg, None) is not None:
-                        return self.content["cache"]["type_arg_filter"][f_arg]["type"], \
-                                self.content["cache"]["type_arg_filter"][f_arg]["values"]
-                else:
-                    self.content["cache"]["type_arg_filter"] = {}
-            else:
-                self.content["cache"] = {"type_arg_filter": {}}
-        else:
-            self.content = {
-                "version": curr_version,
-                "cache": {"type_arg_filter": {}}
-            }
+        cache = self._get_cache_sections()
+        value = self._cached(cache, "type_arg_filter", f_arg)
+        if value is not None:
+            trace.event("lookup", section="type_arg_filter", key=f_arg, hit=True)
+            return value["type"], value["values"]
+        trace.event("lookup", section="type_arg_filter", key=f_arg, hit=False)
+        cache.setdefault("type_arg_filter", {})
 
         type_arg = None
         values = []
-        if self.content["cache"].get("args", None) is not None and \
-        self.content["cache"]["args"].get(gfilter, None) is not None and \
-        self.content["cache"]["args"][gfilter].get(arg, None) is not None:
-            type_arg = self.content["cache"]["args"][gfilter][arg]
+        dict_args = self._cached(cache, "args", gfilter)
+        if dict_args is not None and dict_args.get(arg, None) is not None:
+            type_arg = dict_args[arg]
 
         if type_arg is not None and type_arg != "enum":
-            self.content["cache"]["type_arg_filter"][f_arg] = {"type": type_arg, "values": values}
-            self.save()
+            cache["type_arg_filter"][f_arg] = {"type": type_arg, "values": values}
+            self._mark_dirty("type_arg_filter", f_arg)
             return (type_arg, values)
 
-        help_arg = sp.check_output(["gpac", "-h", f_arg], stderr=sp.DEVNULL).decode()
-        pattern = re.compile(pattern = rf"^\x1b\[32m{arg}\x1b\[0m\s*\((?P<type>[^,\)]+)[,\)]")
-        res_match = pattern.match(help_arg)
-        if res_match:
-            type_arg = res_match.group('type')
-        if type_arg == "enum":
-            pattern = re.compile(r"\x1b\[33m([A-Za-z0-9]+)\x1b\[0m\:")
-            values = pattern.findall(help_arg)
-        self.content["cache"]["type_arg_filter"][f_arg] = {"type": type_arg, "values": values}
-        self.save()
+        type_arg, values = self._fetch("type_arg_filter." + f_arg, fetch_type_arg_filter, gfilter, arg)
+        cache["type_arg_filter"][f_arg] = {"type": type_arg, "values": values}
+        self._mark_dirty("type_arg_filter", f_arg)
         return (type_arg, values)
 
 
@@ -230,37 +923,15 @@ class Cache:
         If the cache is not present or the version of GPAC has changed,
         then the list of protocols is fetched from the GPAC binary.
         """
-        current_version = self.get_gpac_version()
-        if self.content["version"] == current_version:
-            if self.content.get("cache", None) is not None:
-                if self.content["cache"].get("protocols", None) is not None:
-                    return self.content["cache"]["protocols"]
-                self.content["cache"]["protocols"] = {}
-            else:
-                self.content["cache"] = {"protocols": {}}
-        else:
-            self.content = {
-                "version": current_version,
-                "cache": {"protocols": {}}
-            }
-
-        temp = sp.check_output(["gpac", "-ha", "protocols", "-logs=ncl"], stderr=sp.DEVNULL)
-        temp = temp.decode().strip("\n").split("\n")[1:]
-        regex = r"(?P<proto>\w+):(?:\s*in\s*\((?P<in>[^\)]*)\))?(?:\s*out\s*\((?P<out>[^\)]*)\))?"
-        pattern = re.compile(regex)
-        for line in temp:
-            match = pattern.match(line)
-            if match:
-                protocol = match.group('proto')
-                in_filters = match.group('in')
-                out_filters = match.group('out')
-                self.content["cache"]["protocols"][protocol] = {
-                    "input": in_filters.split(", ") if in_filters else [],
-                    "output": out_filters.split(", ") if out_filters else []
-                }
-
-        self.save()
-        return self.content["cache"]["protocols"]
+        cache = self._get_cache_sections()
+        value = self._cached(cache, "protocols")
+        if value is not None:
+            trace.event("lookup", section="protocols", hit=True)
+            return value
+        trace.event("lookup", section="protocols", hit=False)
+        cache["protocols"] = self._fetch("protocols", fetch_list_protocols)
+        self._mark_dirty("protocols")
+        return cache["protocols"]
 
 
     def get_cache_list_props(self)-> list:
@@ -269,25 +940,15 @@ class Cache:
         If the cache is not present or the version of GPAC has changed,
         then the list of properties is fetched from the GPAC binary.
         """
-        current_version = self.get_gpac_version()
-        if self.content["version"] == current_version:
-            if self.content.get("cache", None) is not None:
-                if self.content["cache"].get("props", None) is not None:
-                    return self.content["cache"]["props"]
-                self.content["cache"]["props"] = []
-            else:
-                self.content["cache"] = {"props": []}
-        else:
-            self.content = {
-                "version": current_version,
-                "cache": {"props": []}
-            }
-
-        temp = sp.check_output(["gpac", "-h", "props"], stderr=sp.DEVNULL).decode()
-        pattern = re.compile(r"\x1b\[32m([A-Z][A-Za-z]*)\x1b\[0m")
-        self.content["cache"]["props"] = pattern.findall(temp)
-        self.save()
-        return self.content["cache"]["props"]
+        cache = self._get_cache_sections()
+        value = self._cached(cache, "props")
+        if value is not None:
+            trace.event("lookup", section="props", hit=True)
+            return value
+        trace.event("lookup", section="props", hit=False)
+        cache["props"] = self._fetch("props", fetch_list_props)
+        self._mark_dirty("props")
+        return cache["props"]
 
 
     def get_cache_list_values_enum_args(self, gfilter: str)-> dict:
@@ -296,36 +957,168 @@ class Cache:
         If the cache is absent or the GPAC version has changed, recalculate the enum values.
         Duplicate values are removed.
         """
-        current_version = self.get_gpac_version()
-        if self.content["version"] == current_version:
-            if self.content.get("cache", None) is not None:
-                if self.content["cache"].get("enum_values", None) is not None:
-                    if self.content["cache"]["enum_values"].get(gfilter, None) is not None:
-                        return self.content["cache"]["enum_values"][gfilter]
-                else:
-                    self.content["cache"]["enum_values"] = {}
-            else:
-                self.content["cache"] = {"enum_values": {}}
+        cache = self._get_cache_sections()
+        value = self._cached(cache, "enum_values", gfilter)
+        if value is not None:
+            trace.event("lookup", section="enum_values", key=gfilter, hit=True)
+            return value
+        trace.event("lookup", section="enum_values", key=gfilter, hit=False)
+        cache.setdefault("enum_values", {})
+
+        dict_args = self._cached(cache, "args", gfilter)
+        enum_args = {arg: self._cached(cache, "type_arg_filter", f"{gfilter}.{arg}")
+                     for arg in dict_args or {} if dict_args[arg] == "enum"}
+        if dict_args is not None and all(e is not None for e in enum_args.values()):
+            values_enum_args = {arg: enum_args[arg]["values"] for arg in enum_args}
+            cache["enum_values"][gfilter] = build_values_enum_args(dict_args, values_enum_args)
+            self._mark_dirty("enum_values", gfilter)
         else:
-            self.content = {
-                "version": current_version,
-                "cache": {"enum_values": {}}
+            # all the enum values of the filter from a single gpac request
+            options = self._fetch("enum_values." + gfilter, fetch_filter_options, gfilter)
+            self._store_filter_options(cache, gfilter, *options)
+        return cache["enum_values"][gfilter]
+
+
+    def _store_filter_options(self, cache: dict, gfilter: str, dict_args: dict, values_enum_args: dict)-> None:
+        """
+        Store the arguments of a filter, the type and values of each of them, the map of its enum
+        values to their argument and the prefix indexes of both in the cache sections.
+        """
+        cache.setdefault("args", {})[gfilter] = dict_args
+        type_arg_filter = cache.setdefault("type_arg_filter", {})
+        for arg, type_arg in dict_args.items():
+            type_arg_filter[f"{gfilter}.{arg}"] = {"type": type_arg, "values": values_enum_args.get(arg, [])}
+            self._mark_dirty("type_arg_filter", f"{gfilter}.{arg}")
+        enum_values = cache.setdefault("enum_values", {})
+        enum_values[gfilter] = build_values_enum_args(dict_args, values_enum_args)
+        index = cache.setdefault("index", {})
+        index["args." + gfilter] = PrefixIndex(dict_args).order
+        index["enum_values." + gfilter] = PrefixIndex(enum_values[gfilter]).order
+        self._mark_dirty("args", gfilter)
+        self._mark_dirty("enum_values", gfilter)
+        self._mark_dirty("index", "args." + gfilter)
+        self._mark_dirty("index", "enum_values." + gfilter)
+
+
+    def fill_filters_options(self, filters: list, jobs: int|None = None, progress=None)-> None:
+        """
+        Fill the args, type_arg_filter and enum_values sections for all the given filters in a single pass.
+        The options of the filters are fetched from a few large gpac help requests run by a pool of
+        at most jobs threads. Filters missing from that output are fetched one request at a time.
+        When a large request fails, its filters are fetched one request each, and the filters gpac
+        fails on are skipped.
+        progress, if given, is called as progress(step, done, total) after each request.
+        """
+        import subprocess as sp
+        from concurrent.futures import ThreadPoolExecutor
+
+        jobs = jobs or min(8, os.cpu_count() or 1)
+        report = progress or (lambda step, done, total: None)
+        cache = self._get_cache_sections()
+
+        def fetch_chunk(chunk):
+            """
+            Returns the options of the filters of chunk, and the set of the filters gpac failed on.
+            """
+            try:
+                return fetch_filters_options(chunk), set()
+            except sp.CalledProcessError:
+                pass
+            # one request per filter of the chunk, skipping the ones which fail
+            options = {}
+            failed = set()
+            for gfilter in chunk:
+                try:
+                    options.update(fetch_filters_options([gfilter]))
+                except sp.CalledProcessError:
+                    failed.add(gfilter)
+            return options, failed
+
+        options = {}
+        failed = set()
+        chunks = [filters[i::jobs] for i in range(jobs) if filters[i::jobs]]
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            for i, (result, chunk_failed) in enumerate(pool.map(fetch_chunk, chunks)):
+                options.update(result)
+                failed |= chunk_failed
+                report("filters options", i + 1, len(chunks))
+
+            # gpac builds printing another layout: one request per filter and per enum argument
+            missing = [e for e in filters if e not in options and e not in failed]
+            for i, (gfilter, dict_args) in enumerate(zip(missing, pool.map(fetch_list_args, missing))):
+                options[gfilter] = (dict_args, {})
+                report("args", i + 1, len(missing))
+            enum_args = [(f, arg) for f in missing for arg in options[f][0] if options[f][0][arg] == "enum"]
+            results = pool.map(lambda e: fetch_type_arg_filter(*e), enum_args)
+            for i, ((gfilter, arg), (_, values)) in enumerate(zip(enum_args, results)):
+                options[gfilter][1][arg] = values
+                report("enum values", i + 1, len(enum_args))
+
+        # the filters gpac failed on are left to the lookups of the completions
+        for gfilter in filters:
+            if gfilter in options:
+                self._store_filter_options(cache, gfilter, *options[gfilter])
+        self.flush()
+
+
+    def rebuild(self)-> None:
+        """
+        Rebuild the whole cache if it holds the stale entries of a previous version of GPAC.
+        """
+        self._get_cache_sections()
+        if self.stale is not None:
+            self.warm()
+
+
+    def warm(self, jobs: int|None = None, progress=None)-> None:
+        """
+        Fetch the whole content of the cache for the current version of GPAC and save it in one write.
+        The gpac help requests are run by a pool of at most jobs threads.
+        progress, if given, is called as progress(step, done, total) after each request.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        jobs = jobs or min(8, os.cpu_count() or 1)
+        report = progress or (lambda step, done, total: None)
+        self._reset(self.get_gpac_version())
+        cache = self.content["cache"]
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            lists = {
+                "filters": pool.submit(fetch_list_filters),
+                "modules": pool.submit(fetch_list_modules),
+                "protocols": pool.submit(fetch_list_protocols),
+                "props": pool.submit(fetch_list_props),
             }
+            for i, name in enumerate(lists):
+                lists[name] = lists[name].result()
+                report("lists", i + 1, len(lists))
+
+        cache.update(lists)
+        cache["args"] = {}
+        cache["type_arg_filter"] = {}
+        cache["enum_values"] = {}
+        cache["index"] = {name: PrefixIndex(lists[name]).order for name in lists}
+        self._indexes = {}
+        for name in ["args", "type_arg_filter", "enum_values", "index", *lists]:
+            self._mark_dirty(name)
+        self.fill_filters_options(lists["filters"], jobs, progress)
 
-        dict_args = self.get_cache_list_args(gfilter)
-        list_args_enum = [e for e in dict_args if dict_args[e] == "enum"]
-        duplicate = set()
-        ans = {}
-        for arg in list_args_enum:
-            _, values = self.get_cache_type_arg_filter(gfilter, arg)
-            for value in values:
-                if value not in duplicate:
-                    if ans.get(value, None) is not None:
-                        duplicate.add(value)
-                        del ans[value]
-                    elif value not in dict_args:
-                        ans[value] = arg
-
-        self.content["cache"]["enum_values"][gfilter] = ans
-        self.save()
-        return ans
+
+def build_base_cache(path: str, jobs: int|None = None, progress=None)-> None:
+    """
+    Build the whole cache for the gpac binary found in PATH into a base cache file, readable by
+    every user. The file is built next to its final path, then renamed over it.
+    """
+    import shutil
+    import tempfile
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmpdir = tempfile.mkdtemp(dir=directory)
+    try:
+        tmp = os.path.join(tmpdir, os.path.basename(path))
+        Cache(tmp).warm(jobs, progress)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,618 @@
+"""
+Module: cache_storage
+This module provides the on-disk formats of the cache of the GPAC autocompletion script.
+Classes:
+    JsonStorage: Cache stored as a single JSON file.
+    BinaryStorage: Cache stored as an indexed binary file, opened with mmap and decoded lazily.
+    Journal: Append-only log of the entries changed since a cache file was written.
+    JournaledStorage: Cache stored as a snapshot file in one of the formats above, and a journal.
+    FileLock: Advisory lock serializing the writers of a cache file.
+    KeyLock: Advisory lock on one entry of a cache file, e.g. while it is being fetched.
+
+Binary format:
+    All integers are little-endian unsigned 32-bit integers.
+    - magic: b"GPACAC\\x00\\x01"
+    - number of records, then one (key offset, key length, value offset, value length) entry
+      per record, sorted by key
+    - keys, then values, each value being compact JSON
+
+    Record keys are:
+    - "@name" for the top-level entries of the content, e.g. "@version"
+    - "section" for the sections of the cache, e.g. "filters"
+    - "section\\x00name" for the entries of the sections keyed by filter, e.g. "args\\x00inspect",
+      the "section" record being then an empty object marking the section as present.
+
+    A lookup binary-searches the entry table in the mapped file and only decodes the
+    records it touches.
+
+Journal format:
+    "<cache file>.journal" holds one record per line:
+        <crc32 of the payload, 8 hexadecimal digits> <payload>
+    where the payload is the compact JSON of [section, key, value]: an entry of a section keyed
+    by filter if key is not null, a whole section otherwise, or a top-level entry of the content
+    if section is "@". The first record, ["@", "generation", generation], names the snapshot
+    the journal applies to: a snapshot gets a new generation each time it is written.
+    Records are applied in order on top of the snapshot, as the merge of the entries of
+    concurrent writers does. A record torn by a crash fails its checksum: it is ignored with
+    all the records after it, and cut off by the next writer.
+
+Files are replaced atomically, so readers never take any lock. A file which cannot be
+decoded (e.g. written by a version of the script without atomic writes) is loaded as empty.
+"""
+import os
+import json
+import mmap
+import time
+import struct
+from bisect import bisect_left
+from collections.abc import MutableMapping
+
+MAGIC = b"GPACAC\x00\x01"
+ENTRY = struct.Struct("<IIII")
+COUNT = struct.Struct("<I")
+
+# sections of the cache holding one entry per filter (or per filter argument)
+KEYED_SECTIONS = ("args", "type_arg_filter", "enum_values", "index")
+# time (in seconds) to wait for the lock of a cache file before giving up writing it
+LOCK_TIMEOUT = 0.5
+# size of the journal past which the cache is compacted into a new snapshot, 0 for no journal
+JOURNAL_MAX_SIZE = int(float(os.environ.get("GPAC_AC_JOURNAL_KB", "256")) * 1024)
+
+
+def encode_value(value)-> bytes:
+    """
+    Encode a value of the cache as compact JSON.
+    """
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def to_builtin(value):
+    """
+    Convert a content which may hold lazily decoded sections into builtin dicts and lists.
+    """
+    if isinstance(value, (dict, MutableMapping)):
+        return {k: to_builtin(v) for k, v in value.items()}
+    return value
+
+
+def write_atomic(path: str, data: bytes)-> None:
+    """
+    Write a file through a temporary file renamed over it, so that readers never see partial content.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as file:
+            file.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def file_signature(path: str)-> tuple|None:
+    """
+    Get the (inode, size, mtime_ns) of a file, or None if it does not exist.
+    A file rewritten through write_atomic always gets a new signature.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class FileLock:
+    """
+    Advisory lock on "<path>.lock", held by a single process at a time.
+    Attributes:
+    -----------
+    path : str
+        The path of the lock file.
+    timeout : float
+        The time (in seconds) to wait for the lock.
+    """
+    def __init__(self, path: str, timeout: float = LOCK_TIMEOUT):
+        self.path = path + ".lock"
+        self.timeout = timeout
+        self.file = None
+
+
+    def acquire(self)-> bool:
+        """
+        Take the lock, waiting at most timeout seconds.
+        Returns False if the lock is held by another process for longer.
+        """
+        import fcntl
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        file = open(self.path, "a")
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                self._lock(fcntl, file.fileno())
+                self.file = file
+                return True
+            except (BlockingIOError, PermissionError):
+                if time.monotonic() >= deadline:
+                    file.close()
+                    return False
+                time.sleep(0.005)
+
+
+    def _lock(self, fcntl, fd: int)-> None:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+    def release(self)-> None:
+        """
+        Release the lock.
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+    def __enter__(self)-> bool:
+        return self.acquire()
+
+
+    def __exit__(self, *exc)-> None:
+        self.release()
+
+
+class KeyLock(FileLock):
+    """
+    Advisory lock on a key, held by a single process at a time.
+    All the keys of a cache file share "<path>.keys.lock": the lock of a key is a record lock
+    on one byte of it, at an offset given by the hash of the key, so that no file is created
+    per key. Two keys with the same hash share their lock.
+    Record locks belong to a process, and closing any descriptor of the file releases all of
+    them: a process should hold a single KeyLock at a time.
+    """
+    def __init__(self, path: str, key: str, timeout: float = LOCK_TIMEOUT):
+        import zlib
+        super().__init__(path + ".keys", timeout)
+        self.offset = zlib.crc32(key.encode()) & 0xFFFFFF
+
+
+    def _lock(self, fcntl, fd: int)-> None:
+        fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, self.offset)
+
+
+class JsonStorage:
+    """
+    Cache stored as a single JSON file.
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+
+    def load(self)-> dict|None:
+        """
+        Load the content of the cache, or None if there is no cache file.
+        """
+        if not os.path.isfile(self.path):
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                content = json.load(file)
+        except ValueError:
+            return None
+        return content if isinstance(content, dict) else None
+
+
+    def save(self, content: dict)-> None:
+        """
+        Save the content of the cache.
+        """
+        write_atomic(self.path, json.dumps(to_builtin(content), indent=4).encode())
+
+
+class BinaryReader:
+    """
+    Read-only access to the records of a binary cache file mapped in memory.
+    """
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC or len(self.map) < len(MAGIC) + COUNT.size:
+            raise ValueError(f"{path} is not a binary gpac autocompletion cache")
+        self.count = COUNT.unpack_from(self.map, len(MAGIC))[0]
+        self.table = len(MAGIC) + COUNT.size
+        if self.table + self.count * ENTRY.size > len(self.map) or \
+                (self.count and sum(self._entry(self.count - 1)[2:]) > len(self.map)):
+            raise ValueError(f"{path} is truncated")
+
+
+    def _entry(self, i: int)-> tuple:
+        return ENTRY.unpack_from(self.map, self.table + i * ENTRY.size)
+
+
+    def key(self, i: int)-> bytes:
+        """
+        Get the key of the i-th record.
+        """
+        key_offset, key_size, _, _ = self._entry(i)
+        return self.map[key_offset:key_offset + key_size]
+
+
+    def raw(self, i: int)-> bytes:
+        """
+        Get the encoded value of the i-th record.
+        """
+        _, _, value_offset, value_size = self._entry(i)
+        return self.map[value_offset:value_offset + value_size]
+
+
+    def find(self, key: bytes)-> int|None:
+        """
+        Get the position of the record of the given key, or None if there is none.
+        """
+        i = bisect_left(range(self.count), key, key=self.key)
+        if i < self.count and self.key(i) == key:
+            return i
+        return None
+
+
+    def keys_with_prefix(self, prefix: bytes)-> list:
+        """
+        Get the keys of the records starting with prefix.
+        """
+        keys = []
+        for i in range(bisect_left(range(self.count), prefix, key=self.key), self.count):
+            key = self.key(i)
+            if not key.startswith(prefix):
+                break
+            keys.append(key)
+        return keys
+
+
+class LazyMapping(MutableMapping):
+    """
+    Mapping whose values are decoded from the records of a binary cache file on first access.
+    Attributes:
+    -----------
+    reader : BinaryReader
+        The mapped binary cache file.
+    prefix : bytes
+        The prefix of the keys of the records of this mapping.
+    """
+    def __init__(self, reader: BinaryReader, prefix: bytes):
+        self.reader = reader
+        self.prefix = prefix
+        self.local = {}
+        self.deleted = set()
+
+
+    def _decode(self, key: str, i: int):
+        return json.loads(self.reader.raw(i))
+
+
+    def __getitem__(self, key: str):
+        if key in self.local:
+            return self.local[key]
+        if key in self.deleted:
+            raise KeyError(key)
+        i = self.reader.find(self.prefix + key.encode())
+        if i is None:
+            raise KeyError(key)
+        self.local[key] = self._decode(key, i)
+        return self.local[key]
+
+
+    def __setitem__(self, key: str, value):
+        self.local[key] = value
+        self.deleted.discard(key)
+
+
+    def __delitem__(self, key: str):
+        if key not in self:
+            raise KeyError(key)
+        self.local.pop(key, None)
+        self.deleted.add(key)
+
+
+    def _stored_keys(self)-> list:
+        size = len(self.prefix)
+        return [e[size:].decode() for e in self.reader.keys_with_prefix(self.prefix) if b"\x00" not in e[size:]]
+
+
+    def __iter__(self):
+        keys = [e for e in self._stored_keys() if e not in self.deleted and e not in self.local]
+        return iter(keys + list(self.local))
+
+
+    def __len__(self)-> int:
+        return sum(1 for _ in self)
+
+
+    def __contains__(self, key) -> bool:
+        if key in self.local:
+            return True
+        if key in self.deleted:
+            return False
+        return self.reader.find(self.prefix + key.encode()) is not None
+
+
+    def raw_items(self):
+        """
+        Iterate over (key, encoded value) pairs, without decoding the values not accessed yet.
+        """
+        for key in self:
+            if key in self.local:
+                value = self.local[key]
+                yield key, value
+            else:
+                yield key, self.reader.raw(self.reader.find(self.prefix + key.encode()))
+
+
+class LazySections(LazyMapping):
+    """
+    Lazily decoded sections of a binary cache file. The sections keyed by filter are
+    themselves lazily decoded.
+    """
+    def _decode(self, key: str, i: int):
+        if key in KEYED_SECTIONS:
+            return LazyMapping(self.reader, key.encode() + b"\x00")
+        return json.loads(self.reader.raw(i))
+
+
+    def _stored_keys(self)-> list:
+        return [e.decode() for e in self.reader.keys_with_prefix(b"") if b"\x00" not in e and not e.startswith(b"@")]
+
+
+class BinaryStorage:
+    """
+    Cache stored as an indexed binary file, opened with mmap.
+    A cache stored in the JSON file of the same name is migrated on first load.
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+
+    def load(self)-> dict|None:
+        """
+        Load the content of the cache, or None if there is no cache file.
+        The sections of the cache are only decoded when accessed.
+        """
+        if not os.path.isfile(self.path):
+            content = get_storage(os.path.splitext(self.path)[0] + ".json").load()
+            if content is not None:
+                self.save(content)
+            return content
+        try:
+            reader = BinaryReader(self.path)
+        except ValueError:
+            # empty, truncated or foreign file
+            return None
+        content = {}
+        for key in reader.keys_with_prefix(b"@"):
+            content[key[1:].decode()] = json.loads(reader.raw(reader.find(key)))
+        content["cache"] = LazySections(reader, b"")
+        return content
+
+
+    def save(self, content: dict)-> None:
+        """
+        Save the content of the cache. Records which were not decoded are copied as is.
+        """
+        records = {}
+        for key, value in content.items():
+            if key != "cache":
+                records[b"@" + key.encode()] = encode_value(value)
+        sections = content.get("cache", {}) or {}
+        for name in sections:
+            value = sections[name]
+            if name not in KEYED_SECTIONS:
+                records[name.encode()] = encode_value(value)
+                continue
+            records[name.encode()] = b"{}"
+            items = value.raw_items() if isinstance(value, LazyMapping) else value.items()
+            for key, item in items:
+                records[name.encode() + b"\x00" + key.encode()] = item if isinstance(item, bytes) else encode_value(item)
+
+        keys = sorted(records)
+        header_size = len(MAGIC) + COUNT.size + len(keys) * ENTRY.size
+        key_offset = header_size
+        value_offset = header_size + sum(len(e) for e in keys)
+        table = []
+        for key in keys:
+            table.append(ENTRY.pack(key_offset, len(key), value_offset, len(records[key])))
+            key_offset += len(key)
+            value_offset += len(records[key])
+        data = b"".join([MAGIC, COUNT.pack(len(keys))] + table + keys + [records[e] for e in keys])
+        write_atomic(self.path, data)
+
+
+def apply_entry(content: dict, section: str, key: str|None, value)-> None:
+    """
+    Set an entry of the content of a cache: an entry of a section keyed by filter, a whole
+    section (merged key by key into a section keyed by filter), or a top-level entry if
+    section is "@".
+    """
+    if section == "@":
+        content[key] = value
+        return
+    if content.get("cache", None) is None:
+        content["cache"] = {}
+    sections = content["cache"]
+    if key is None:
+        if section in KEYED_SECTIONS and sections.get(section, None) is not None:
+            for name in value:
+                sections[section][name] = value[name]
+        else:
+            sections[section] = value
+    else:
+        if sections.get(section, None) is None:
+            sections[section] = {}
+        sections[section][key] = value
+
+
+class Journal:
+    """
+    Append-only log of the entries changed since a cache file was written (see the journal
+    format above). The journal is only written by the holder of the lock of the cache file.
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+
+    @staticmethod
+    def encode(record: list)-> bytes:
+        import zlib
+        payload = encode_value(record)
+        return b"%08x %s\n" % (zlib.crc32(payload), payload)
+
+
+    def read(self)-> tuple:
+        """
+        Read the valid records of the journal.
+        Returns the generation of the snapshot they apply to (None if there is no valid
+        journal), the records after the first one, and the size of the valid records.
+        """
+        import zlib
+        try:
+            with open(self.path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None, [], 0
+        generation = None
+        records = []
+        size = 0
+        for line in data.split(b"\n")[:-1]:
+            if len(line) < 9 or line[8:9] != b" ":
+                break
+            try:
+                if int(line[:8], 16) != zlib.crc32(line[9:]):
+                    break
+                record = json.loads(line[9:])
+            except ValueError:
+                break
+            if not isinstance(record, list) or len(record) != 3:
+                break
+            if generation is None:
+                if record[:2] != ["@", "generation"] or not record[2]:
+                    break
+                generation = record[2]
+            else:
+                records.append(record)
+            size += len(line) + 1
+        return generation, records, size
+
+
+    def reset(self, generation: str)-> None:
+        """
+        Start an empty journal for the snapshot of the given generation.
+        """
+        write_atomic(self.path, self.encode(["@", "generation", generation]))
+
+
+    def append(self, generation: str, records: list, max_size: int)-> bool:
+        """
+        Append records to the journal of the snapshot of the given generation, cutting off
+        the torn records left by a crash first.
+        Returns False if the journal would grow past max_size, nothing being written then.
+        """
+        data = b"".join(self.encode(e) for e in records)
+        current, _, size = self.read()
+        if current != generation:
+            header = self.encode(["@", "generation", generation])
+            if len(header) + len(data) > max_size:
+                return False
+            write_atomic(self.path, header + data)
+            return True
+        if size + len(data) > max_size:
+            return False
+        with open(self.path, "r+b") as file:
+            file.truncate(size)
+            file.seek(size)
+            file.write(data)
+        return True
+
+
+class JournaledStorage:
+    """
+    Cache stored as a snapshot file, written by another storage, and a journal of the
+    entries changed since, in "<path>.journal". Adding entries appends them to the journal
+    instead of rewriting the snapshot, until the journal is larger than max_size: the cache is
+    then compacted into a new snapshot.
+    """
+    def __init__(self, storage, max_size: int = JOURNAL_MAX_SIZE):
+        self.storage = storage
+        self.path = storage.path
+        self.journal = Journal(storage.path + ".journal")
+        self.max_size = max_size
+
+
+    def signature(self)-> tuple|None:
+        """
+        Get the signatures of the snapshot and of the journal, or None if there is no snapshot.
+        Any write of the cache changes it.
+        """
+        signature = file_signature(self.path)
+        if signature is None:
+            return None
+        return signature, file_signature(self.journal.path)
+
+
+    def load(self)-> dict|None:
+        """
+        Load the content of the snapshot, then apply the records of its journal.
+        """
+        content = self.storage.load()
+        if content is None:
+            return None
+        generation, records, _ = self.journal.read()
+        if generation is not None and generation == content.get("generation", None):
+            for section, key, value in records:
+                apply_entry(content, section, key, value)
+        return content
+
+
+    def save(self, content: dict)-> None:
+        """
+        Write the content as a new snapshot, with an empty journal.
+        """
+        content["generation"] = os.urandom(8).hex()
+        self.storage.save(content)
+        if self.max_size > 0:
+            self.journal.reset(content["generation"])
+        elif os.path.exists(self.journal.path):
+            os.unlink(self.journal.path)
+
+
+    def append(self, content: dict, records: list)-> bool:
+        """
+        Append [section, key, value] records, changing the content loaded from the snapshot
+        of this storage, to its journal.
+        Returns False if the content must be saved as a new snapshot instead.
+        """
+        generation = content.get("generation", None)
+        if self.max_size <= 0 or not generation or file_signature(self.path) is None:
+            return False
+        return self.journal.append(generation, records, self.max_size)
+
+
+    def compact(self)-> None:
+        """
+        Write the snapshot and its journal as a new snapshot, if the journal has records.
+        """
+        content = self.storage.load()
+        if content is None:
+            return
+        generation, records, _ = self.journal.read()
+        if records and generation == content.get("generation", None):
+            for section, key, value in records:
+                apply_entry(content, section, key, value)
+            self.save(content)
+
+
+def get_storage(path: str):
+    """
+    Get the storage of a cache file from its extension: ".bin" for the binary format, JSON
+    otherwise, with a journal of the entries added since the file was written.
+    """
+    if path.endswith(".bin"):
+        return JournaledStorage(BinaryStorage(path))
+    return JournaledStorage(JsonStorage(path))
@@ -0,0 +1,161 @@
+"""
+Module: cache_versions
+This module keeps the cache files of the versions of GPAC used before the current one, so that
+switching between several gpac builds (e.g. through PATH) does not rebuild their caches.
+Classes:
+    VersionStore: Directory of the cache files of previous versions of GPAC.
+
+The cache file of the current version is the one given to cache_manager.Cache. When it is
+replaced by the cache of another version, it is moved to "<cache file>.versions/", next to
+an index of the archived versions:
+    index.json = {
+        "version1": {"fingerprint": fingerprint of the gpac binary of version1, "used": time},
+        ...
+    }
+"used" is the time at which the version was last used, so that the least recently used
+versions are evicted first once there are more than GPAC_AC_MAX_VERSIONS versions (default 4,
+the current one included) or more than GPAC_AC_MAX_VERSIONS_MB megabytes of archives (default 64).
+
+The files of the store are only changed by the holder of the lock of the cache file.
+"""
+import os
+import json
+import time
+from cache_storage import write_atomic
+
+MAX_VERSIONS = int(os.environ.get("GPAC_AC_MAX_VERSIONS", "4"))
+MAX_BYTES = int(float(os.environ.get("GPAC_AC_MAX_VERSIONS_MB", "64")) * (1 << 20))
+
+
+def file_name(version: str)-> str:
+    """
+    Get the name of the archived cache of a version: characters other than letters, digits, "."
+    and "-" are escaped, so that two versions never share a file.
+    """
+    return "gpac-" + "".join(c if c.isalnum() or c in ".-" else f"_{ord(c):02x}" for c in version)
+
+
+class VersionStore:
+    """
+    Directory of the cache files of previous versions of GPAC.
+    Attributes:
+    -----------
+    path : str
+        The path of the cache file of the current version.
+    dir : str
+        The directory of the archived cache files.
+    max_versions : int
+        The maximal number of versions, the current one included.
+    max_bytes : int
+        The maximal total size of the archived cache files.
+    """
+    def __init__(self, path: str, max_versions: int = MAX_VERSIONS, max_bytes: int = MAX_BYTES):
+        self.path = path
+        self.dir = path + ".versions"
+        self.ext = os.path.splitext(path)[1]
+        self.max_versions = max_versions
+        self.max_bytes = max_bytes
+
+
+    def file(self, version: str)-> str:
+        """
+        Get the path of the archived cache file of a version.
+        """
+        return os.path.join(self.dir, file_name(version) + self.ext)
+
+
+    def load_index(self)-> dict:
+        """
+        Load the index of the archived versions, dropping the versions whose file is missing.
+        """
+        try:
+            with open(os.path.join(self.dir, "index.json"), "r", encoding="utf-8") as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(index, dict):
+            return {}
+        return {k: v for k, v in index.items() if isinstance(v, dict) and os.path.exists(self.file(k))}
+
+
+    def save_index(self, index: dict)-> None:
+        write_atomic(os.path.join(self.dir, "index.json"), json.dumps(index).encode())
+
+
+    def find(self, fingerprint: dict|None)-> str|None:
+        """
+        Get the archived version built by the gpac binary of the given fingerprint, or None.
+        """
+        if fingerprint is None or not os.path.isdir(self.dir):
+            return None
+        for version, entry in self.load_index().items():
+            if entry.get("fingerprint", None) == fingerprint:
+                return version
+        return None
+
+
+    def has(self, version: str|None)-> bool:
+        """
+        Check whether the cache of a version is archived.
+        """
+        return version is not None and os.path.exists(self.file(version))
+
+
+    def archive(self, version: str|None, fingerprint: dict|None)-> None:
+        """
+        Archive the cache file, holding the cache of the given version, before it is replaced.
+        The cache file itself is left in place.
+        """
+        if version is None or not os.path.exists(self.path):
+            return
+        os.makedirs(self.dir, exist_ok=True)
+        tmp = f"{self.file(version)}.{os.getpid()}.tmp"
+        try:
+            os.link(self.path, tmp)
+        except OSError:
+            with open(self.path, "rb") as file:
+                write_atomic(tmp, file.read())
+        os.replace(tmp, self.file(version))
+        index = self.load_index()
+        index[version] = {"fingerprint": fingerprint, "used": time.time()}
+        self.evict(index)
+        self.save_index(index)
+
+
+    def restore(self, version: str)-> bool:
+        """
+        Move the archived cache of a version to the cache file, replacing it atomically.
+        The cache file should have been archived first.
+        Returns False if the version is not archived.
+        """
+        try:
+            os.replace(self.file(version), self.path)
+        except OSError:
+            return False
+        index = self.load_index()
+        index.pop(version, None)
+        self.save_index(index)
+        return True
+
+
+    def evict(self, index: dict)-> None:
+        """
+        Remove the least recently used versions from the index and their files, until the
+        limits of count and size are met.
+        """
+        versions = sorted(index, key=lambda e: index[e].get("used", 0))
+        sizes = {}
+        for version in versions:
+            try:
+                sizes[version] = os.path.getsize(self.file(version))
+            except OSError:
+                sizes[version] = 0
+        total = sum(sizes.values())
+        while versions and (len(versions) > self.max_versions - 1 or total > self.max_bytes):
+            version = versions.pop(0)
+            total -= sizes[version]
+            del index[version]
+            try:
+                os.unlink(self.file(version))
+            except OSError:
+                pass
@@ -0,0 +1,193 @@
+#! /usr/bin/python3
+"""
+Module: completion_daemon
+This module provides an optional per-user daemon serving gpac completions over a Unix
+domain socket. The daemon keeps the cache and the lazily loaded lists of the autocompletion
+script in memory, so a completion does not pay for the interpreter startup and the cache
+loading anymore. Its completions are memoized (see completion_memo.py).
+
+Protocol:
+    The client sends the cursor position on a first line, its working directory on a second
+    line, followed by the command line, and then shuts down its writing side. The daemon answers with one completion per line
+    and closes the connection.
+
+The cache is written FLUSH_DELAY seconds after the last request which changed it, and when
+the daemon exits. When the version of gpac changes, the daemon serves the stale entries of the
+previous version until the cache file is rebuilt by a background process. The daemon exits after GPAC_AC_DAEMON_IDLE seconds without request (default 1800) or
+as soon as its memory usage exceeds GPAC_AC_DAEMON_MAX_RSS megabytes (default 256).
+A single daemon runs per socket: it holds an advisory lock on "<socket>.lock" until it exits.
+
+Usage:
+    completion_daemon.py                      start the daemon
+    completion_daemon.py --query POS "LINE"   get completions from a running daemon
+"""
+import os
+import sys
+import time
+import socket
+
+IDLE_TIMEOUT = float(os.environ.get("GPAC_AC_DAEMON_IDLE", "1800"))
+MAX_RSS_MB = int(os.environ.get("GPAC_AC_DAEMON_MAX_RSS", "256"))
+MAX_REQUEST_SIZE = 1 << 20
+# delay (in seconds) without request after which the changes of the cache are written
+FLUSH_DELAY = 5.0
+
+
+def get_socket_path() -> str:
+    """
+    Get the path of the socket of the daemon of the current user.
+    """
+    if os.environ.get("GPAC_AC_SOCKET"):
+        return os.environ["GPAC_AC_SOCKET"]
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "gpac")
+    return os.path.join(runtime_dir, "gpac_autocomplete.sock")
+
+
+def get_rss_mb() -> float:
+    """
+    Get the peak memory usage of the current process, in megabytes.
+    """
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / 1024
+
+
+def is_running(path: str) -> bool:
+    """
+    Check whether a daemon is listening on the given socket.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(path)
+        except OSError:
+            return False
+    return True
+
+
+def read_request(conn: socket.socket) -> tuple:
+    """
+    Read a request until the client shuts down its writing side.
+    Returns the cursor position, the working directory of the client and the command line.
+    """
+    data = b""
+    while len(data) < MAX_REQUEST_SIZE:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    pos, _, data = data.decode().partition("\n")
+    cwd, _, command_line = data.partition("\n")
+    return int(pos), cwd, command_line
+
+
+def serve(path: str|None = None, idle_timeout: float = IDLE_TIMEOUT, max_rss_mb: int = MAX_RSS_MB) -> None:
+    """
+    Serve completions on the given socket until the daemon is idle for idle_timeout seconds
+    or uses more than max_rss_mb megabytes.
+    """
+    path = path or get_socket_path()
+    if is_running(path):
+        return
+    # a single daemon per socket, held on "<socket>.lock" until it exits: the daemons started by
+    # other shells at the same time exit without touching the socket
+    from cache_storage import FileLock
+    lock = FileLock(path, timeout=0)
+    if not lock.acquire():
+        return
+    try:
+        _serve(path, idle_timeout, max_rss_mb)
+    finally:
+        lock.release()
+
+
+def _serve(path: str, idle_timeout: float, max_rss_mb: int) -> None:
+    """
+    Serve completions on the given socket, its lock being held (see serve).
+    """
+    if os.path.exists(path):
+        # socket left by a daemon that did not exit cleanly
+        os.unlink(path)
+
+    import gpac_autocomplete as ga
+    cache = ga.get_cache()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(old_umask)
+    inode = os.stat(path).st_ino
+    server.listen(16)
+
+    last_request = time.monotonic()
+    try:
+        while True:
+            timeout = idle_timeout - (time.monotonic() - last_request)
+            if cache.dirty:
+                timeout = min(timeout, FLUSH_DELAY)
+            if timeout <= 0:
+                break
+            server.settimeout(timeout)
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                ga.engine.flush()
+                continue
+            last_request = time.monotonic()
+            with conn:
+                conn.settimeout(2)
+                try:
+                    pos, cwd, command_line = read_request(conn)
+                    # the engine follows the version of gpac, and fills the missed entries in the background
+                    completions = ga.complete(command_line, pos, cwd)
+                    ga.write_shell_lists()
+                except Exception:
+                    completions = []
+                try:
+                    conn.sendall("".join(e + "\n" for e in completions).encode())
+                except OSError:
+                    pass
+            if get_rss_mb() > max_rss_mb:
+                break
+    finally:
+        server.close()
+        ga.engine.flush()
+        try:
+            if os.stat(path).st_ino == inode:
+                os.unlink(path)
+        except OSError:
+            pass
+
+
+def query(pos: int, command_line: str, path: str|None = None) -> int:
+    """
+    Print the completions computed by a running daemon.
+    Returns 0 on success and 1 if no daemon could be reached.
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(2)
+            client.connect(path or get_socket_path())
+            client.sendall(f"{pos}\n{os.getcwd()}\n{command_line}".encode())
+            client.shutdown(socket.SHUT_WR)
+            data = b""
+            while True:
+                chunk = client.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+    except OSError:
+        return 1
+    sys.stdout.write(data.decode())
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--query":
+        if len(sys.argv) < 4:
+            sys.exit(1)
+        # Remove the quotes added by Bash script
+        sys.exit(query(int(sys.argv[2]), sys.argv[3][1:-1]))
+    serve()
@@ -0,0 +1,174 @@
+"""
+Module: completion_memo
+This module provides a bounded LRU memo of the completions computed by a long-running process
+(e.g. the completion daemon), for the TAB presses repeated on the same or on a growing prefix.
+Classes:
+    CompletionMemo: LRU memo of completion results.
+    DirListings: LRU cache of the listings of the directories whose paths are completed.
+
+Entries are keyed by the version of gpac, the working directory and the command line
+truncated at the cursor. An entry depending on the content of directories (path completions)
+stores their modification times, and is dropped as soon as one of them has changed.
+A command line extending a memoized one by a few word characters is answered by filtering
+the memoized completions, when they are a plain list of candidates starting with the word
+being completed, and were not truncated.
+The listings of the directories are cached separately, so that completing longer and longer
+prefixes of a path in a huge directory lists it once.
+"""
+import os
+from collections import OrderedDict
+
+# maximal number of memoized command lines
+MEMO_SIZE = int(os.environ.get("GPAC_AC_MEMO_SIZE", "256"))
+# maximal number of directory listings kept in memory
+DIR_CACHE_SIZE = int(os.environ.get("GPAC_AC_DIR_CACHE", "8"))
+# characters which may be appended to a word without changing the kind of its completions
+WORD_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_")
+
+
+def dir_mtime(path: str)-> int|None:
+    """
+    Get the modification time of a directory, or None if it does not exist.
+    """
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class CompletionMemo:
+    """
+    Bounded LRU memo of completion results.
+    Attributes:
+    -----------
+    size : int
+        The maximal number of entries.
+    entries : OrderedDict
+        (version, cwd, line) => (completions, word, narrowable, dirs), the least recently used first.
+        dirs is the list of (directory, modification time) the completions depend on.
+    """
+    def __init__(self, size: int = MEMO_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.narrowed = 0
+        self.misses = 0
+
+
+    def _is_valid(self, dirs: list)-> bool:
+        return all(dir_mtime(path) == mtime for path, mtime in dirs)
+
+
+    def get(self, version: str|None, cwd: str, line: str, word: str, is_filter)-> list|None:
+        """
+        Get the memoized completions of a command line, or None.
+        word is the word being completed, and is_filter(name) tells whether a name is a filter
+        (the completions of a filter name are its arguments, not other filter names).
+        """
+        key = (version, cwd, line)
+        entry = self.entries.get(key, None)
+        if entry is not None:
+            if self._is_valid(entry[3]):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return list(entry[0])
+            del self.entries[key]
+
+        # narrow the completions of a shorter prefix of the word
+        if word and word[0] != "-" and all(e in WORD_CHARS for e in word) and not is_filter(word):
+            for i in range(len(line) - 1, len(line) - len(word) - 1, -1):
+                if line[i] not in WORD_CHARS:
+                    break
+                entry = self.entries.get((version, cwd, line[:i]), None)
+                if entry is None or not entry[2] or not self._is_valid(entry[3]):
+                    continue
+                completions = [e for e in entry[0] if e.startswith(word)]
+                self.put(version, cwd, line, word, completions, entry[3], is_filter)
+                self.narrowed += 1
+                return list(completions)
+
+        self.misses += 1
+        return None
+
+
+    def put(self, version: str|None, cwd: str, line: str, word: str, completions: list, dirs: list, is_filter,
+            complete: bool = True)-> None:
+        """
+        Memoize the completions of a command line, computed with the given directories.
+        complete is False when the completions are not all the candidates, e.g. a marker
+        completed instead of too many paths.
+        """
+        # the completions of a word are narrowable if they are all candidates starting with it:
+        # not option names, nor the arguments of a filter
+        narrowable = complete and '"' not in line and "\\" not in line and (word == "" or word[0] != "-") \
+            and not is_filter(word.split(":")[0].split(".")[0]) and all(e.startswith(word) for e in completions)
+        self.entries[(version, cwd, line)] = (list(completions), word, narrowable, dirs)
+        self.entries.move_to_end((version, cwd, line))
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+    def clear(self)-> None:
+        """
+        Drop every entry, e.g. when the version of gpac has changed.
+        """
+        self.entries.clear()
+
+
+class DirListings:
+    """
+    Bounded LRU cache of the listings of directories, each dropped as soon as the modification
+    time of its directory has changed.
+    Attributes:
+    -----------
+    size : int
+        The maximal number of listings.
+    entries : OrderedDict
+        absolute path => (modification time, sorted names, whether each name is a directory),
+        the least recently used first.
+    """
+    def __init__(self, size: int = DIR_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+
+
+    def find(self, directory: str, prefix: str, only_dirs: bool, limit: int)-> list|None:
+        """
+        Get the (name, is_dir) entries of a directory whose name starts with prefix, sorted by
+        name, only the directories if only_dirs, or None if there are more than limit of them
+        (0 for no limit). Raises OSError if the directory cannot be listed.
+        """
+        from bisect import bisect_left
+        path = os.path.abspath(directory)
+        # modification time taken before listing: a later change always invalidates the listing
+        mtime = dir_mtime(path)
+        entry = self.entries.get(path, None)
+        if entry is None or entry[0] != mtime:
+            with os.scandir(path) as it:
+                listing = sorted((e.name, e.is_dir()) for e in it)
+            entry = (mtime, [e[0] for e in listing], [e[1] for e in listing])
+            if self.size > 0:
+                self.entries[path] = entry
+                while len(self.entries) > self.size:
+                    self.entries.popitem(last=False)
+        if self.size > 0:
+            self.entries.move_to_end(path)
+
+        _, names, is_dir = entry
+        entries = []
+        for i in range(bisect_left(names, prefix), len(names)):
+            if not names[i].startswith(prefix):
+                break
+            if only_dirs and not is_dir[i]:
+                continue
+            entries.append((names[i], is_dir[i]))
+            if limit and len(entries) > limit:
+                return None
+        return entries
+
+
+    def clear(self)-> None:
+        """
+        Drop every listing.
+        """
+        self.entries.clear()
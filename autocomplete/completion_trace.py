@@ -0,0 +1,72 @@
+"""
+Module: completion_trace
+This module provides an opt-in tracing of the GPAC autocompletion scripts, to find where the
+time of a completion goes.
+With GPAC_AC_TRACE=/path/to/log, JSON lines are appended to the log file:
+    {"pid": ..., "ts": ..., "event": "phase", "name": "generate_completions", "ms": ...}
+        time spent in a phase: interpreter startup ("startup", measured from the Bash script),
+        cache loading, version check, completion generation, path listing, cache writing...
+    {"pid": ..., "ts": ..., "event": "run", "argv": ["gpac", ...], "ms": ..., "status": ...}
+        each run of the gpac binary
+    {"pid": ..., "ts": ..., "event": "lookup", "section": "args", "key": "inspect", "hit": true}
+        each lookup in the cache
+    {"pid": ..., "ts": ..., "event": "completion", "line": ..., "pos": ..., "completions": ...}
+        the end of a completion
+
+When GPAC_AC_TRACE is not set, the traced functions are not even wrapped.
+"""
+import os
+import time
+
+TRACE_PATH = os.environ.get("GPAC_AC_TRACE", "")
+enabled = TRACE_PATH != ""
+
+_fd = None
+
+
+def event(kind: str, **fields)-> None:
+    """
+    Append an event to the trace log, if tracing is enabled.
+    """
+    global _fd
+    if not enabled:
+        return
+    import json
+    record = {"pid": os.getpid(), "ts": time.time(), "event": kind, **fields}
+    if _fd is None:
+        _fd = os.open(TRACE_PATH, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    # a single write per line: lines of concurrent processes and threads are not interleaved
+    os.write(_fd, (json.dumps(record) + "\n").encode())
+
+
+def traced(function):
+    """
+    Decorator recording the time spent in each call of a function as a phase named after it.
+    Returns the function itself when tracing is disabled.
+    """
+    if not enabled:
+        return function
+    from functools import wraps
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            event("phase", name=function.__qualname__, ms=(time.perf_counter() - start) * 1000)
+
+    return wrapper
+
+
+def startup()-> None:
+    """
+    Record the time elapsed since the Bash script started the interpreter
+    (GPAC_AC_TRACE_START, in seconds since the epoch).
+    """
+    start = os.environ.get("GPAC_AC_TRACE_START", "")
+    if enabled and start:
+        try:
+            event("phase", name="startup", ms=(time.time() - float(start)) * 1000)
+        except ValueError:
+            pass
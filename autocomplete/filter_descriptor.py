@@ -0,0 +1,77 @@
+"""
+Module: filter_descriptor
+This module provides a compact description of the options of a filter, built once per filter
+from the cache and reused by every completion of its options.
+Classes:
+    FilterDescriptor: Arguments, types and enum values of a filter.
+"""
+
+
+class FilterDescriptor:
+    """
+    Arguments, types and enum values of a filter, with the indexes answering the queries made
+    when completing its options.
+    Attributes:
+    -----------
+    name : str
+        The name of the filter.
+    args : dict
+        The arguments of the filter and their types, in the order printed by gpac.
+    enum_values : dict
+        The enum values of the arguments of the filter, mapped to their argument.
+    args_index : PrefixIndex
+        The prefix index of the arguments.
+    enum_values_index : PrefixIndex
+        The prefix index of the enum values.
+    types : dict
+        The type and values of the arguments already looked up, as returned by get_type.
+    """
+    __slots__ = ("name", "args", "enum_values", "args_index", "enum_values_index", "types", "get_type")
+
+    def __init__(self, name: str, args: dict, enum_values: dict, args_index, enum_values_index, get_type):
+        self.name = name
+        self.args = args
+        self.enum_values = enum_values
+        self.args_index = args_index
+        self.enum_values_index = enum_values_index
+        self.types = {}
+        self.get_type = get_type
+
+
+    def arg_type(self, arg: str)-> tuple:
+        """
+        Get the type and values of an argument, looked up once per argument.
+        """
+        result = self.types.get(arg, None)
+        if result is None:
+            result = self.types[arg] = self.get_type(self.name, arg)
+        return result
+
+
+    def resolve(self, options: list)-> tuple:
+        """
+        Get the argument set by each option of a command line, e.g. "mode" for "mode=tree" or
+        for "tree" (an enum value of mode), and the set of the properties used by the options.
+        Options which are neither an argument nor an enum value are kept as they are.
+        """
+        resolved = []
+        used_props = set()
+        for option in options:
+            name = option.partition("=")[0]
+            if name in self.args:
+                resolved.append(name)
+            elif option in self.enum_values:
+                resolved.append(self.enum_values[option])
+            else:
+                resolved.append(option)
+                if name[:1] == "#":
+                    used_props.add(name[1:])
+        return resolved, used_props
+
+
+    def unused(self, used: set)-> list:
+        """
+        Get the arguments not in used, then the enum values of the arguments not in used.
+        """
+        return [e for e in self.args if e not in used] + \
+            [e for e, arg in self.enum_values.items() if arg not in used]
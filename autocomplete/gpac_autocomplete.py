@@ -1,320 +1,871 @@
 #! /usr/bin/python3
 
-from re import findall
-from pathlib import Path
-from subprocess import check_output, CalledProcessError
-import cache_manager as cm
+import os
+# threads are handled with the built-in _thread module: importing threading would
+# cost the trivial completions several milliseconds
+from _thread import RLock, get_ident
+import completion_trace as trace
+from line_tokenizer import tokenize
 
+# Only os is imported at startup: the cache (and cache_manager) are loaded by the first
+# completion which needs them, so that trivial completions start as fast as possible.
 
-quote_added = False
 list_help = ["-h", "-help", "-ha", "-hx", "-hh"]
-list_filters = []
-list_modules = []
-list_props = []
-protocols = {}
+help_flags = frozenset(list_help)
 help_options = ["doc", "alias", "log", "core", "cfg", "net", "prompt", "modules", "module", "creds",
-                "filters", "codecs", "formats", "protocols", "props", "colors", "layouts", "links", 
+                "filters", "codecs", "formats", "protocols", "props", "colors", "layouts", "links",
                 "defer"]
+# options completed for an empty word or "-", and for the other words starting with "-"
+options = ["-h", "-help", "-netcap=", "-graph", "-stats", "-src", "-i", "-logs", "-dst", "-o"]
+prefixed_options = ["-h", "-hx", "-help", "-netcap=", "-graph", "-stats", "-src", "-i", "-logs", "-dst", "-o"]
+
+# GPAC_AC_CACHE_FORMAT=binary selects the memory-mapped binary cache (see cache_storage.py)
+CACHE_EXT = ".bin" if os.environ.get("GPAC_AC_CACHE_FORMAT", "json") == "binary" else ".json"
+CACHE_PATH = os.path.expanduser("~") + "/.cache/gpac/gpac_autocomplete" + CACHE_EXT
+# read-only cache shared by all the users, built at install time (see "--build-base")
+BASE_CACHE_PATH = os.environ.get("GPAC_AC_BASE_CACHE", "/var/cache/gpac/gpac_autocomplete_base.bin")
+
+# time (in milliseconds) given to a completion of the script to run gpac on cache misses,
+# 0 for no limit: past it, the completion is made of what the cache already holds, and the
+# missing entries are fetched in the background for the next completions
+DEADLINE_MS = float(os.environ.get("GPAC_AC_DEADLINE_MS", "80"))
+
+# maximal number of paths completed, 0 for no limit: past it, a marker is completed instead,
+# so that bash does not freeze on the paths of huge directories
+PATH_MAX_RESULTS = int(os.environ.get("GPAC_AC_PATH_MAX", "1000"))
+# completed instead of the paths: two completions without common prefix, so that bash lists
+# them and leaves the word being completed as it is
+too_many_matches = ["(too many matches, type more characters)", " "]
+
+
+# answer from the cache only, once the deadline has passed
+def or_known(function, default, state):
+    """
+    Returns function(), or default if a cache miss could not be fetched from gpac before the
+    deadline of the completion (cache_manager.DeadlineExceeded is a TimeoutError), in which
+    case the completion of state is marked partial.
+    """
+    try:
+        return function()
+    except TimeoutError:
+        state.partial = True
+        return default
 
-CACHE_PATH = str(Path.home()) + "/.cache/gpac/gpac_autocomplete.json"
-cache = cm.Cache(CACHE_PATH)
 
-# get all possible args for a filter
-def get_list_args(gfilter: str) -> dict:
+def list_directory(directory: str, prefix: str, only_dirs: bool, limit: int) -> list|None:
     """
-    Retrieve a list of arguments from the cache based on the given filter.
+    Lists the (name, is_dir) entries of a directory whose name starts with prefix, only the
+    directories if only_dirs. The directory is read as a stream, stopped as soon as more than
+    limit entries match (0 for no limit), None being returned then.
+    Raises OSError if the directory cannot be listed.
     """
-    return cache.get_cache_list_args(gfilter)
-
-# get type and possible values for an arg of a filter
-def get_type_arg_filter(gfilter: str, arg: str) -> tuple:
+    entries = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.name.startswith(prefix):
+                is_dir = entry.is_dir()
+                if only_dirs and not is_dir:
+                    continue
+                entries.append((entry.name, is_dir))
+                if limit and len(entries) > limit:
+                    return None
+    return entries
+
+
+class CompletionState:
     """
-    Retrieve the type and possible values of an argument from the cache.
+    State of a single completion, shared by the functions computing it.
+    Attributes:
+    -----------
+    cwd : str|None
+        The directory of relative paths, the current directory if None.
+    deadline : float|None
+        The time.monotonic() time after which gpac is not run anymore, None for no deadline.
+    quote_added : bool
+        Whether a double quote was added at the end of the command line to close a quoted string.
+    paths_truncated : bool
+        Whether the paths completed were replaced by too_many_matches.
+    partial : bool
+        Whether the completions lack the entries of the cache which could not be fetched from gpac
+        before the deadline.
+    scanned_dirs : list|None
+        When not None, the (directory, modification time) listed by get_list_compgen are appended to it.
     """
-    return cache.get_cache_type_arg_filter(gfilter, arg)
+    __slots__ = ("cwd", "deadline", "quote_added", "paths_truncated", "partial", "scanned_dirs")
 
-# lazy loading of filters
-def get_list_filters() -> list:
-    global list_filters
-    if list_filters == []:
-        list_filters = cache.get_cache_list_filters()
-    return list_filters
+    def __init__(self, cwd: str|None = None, deadline: float|None = None, scanned_dirs: list|None = None):
+        self.cwd = cwd
+        self.deadline = deadline
+        self.quote_added = False
+        self.paths_truncated = False
+        self.partial = False
+        self.scanned_dirs = scanned_dirs
 
-# lazy loading of modules
-def get_list_modules() -> list:
-    """
-    Returns the list of modules. If the list is empty, it fetches the list from the cache.
 
-    Returns:
-        list: A list of modules.
-    """
-    global list_modules
-    if list_modules == []:
-        list_modules = cache.get_cache_list_modules()
-    return list_modules
-
-# lazy loading of protocols
-def get_list_protocols() -> None:
-    global protocols
-    if protocols == {}:
-        protocols = cache.get_cache_list_protocols()
-
-# lazy loading of props
-def get_list_props() -> list:
-    global list_props
-    if list_props == []:
-        list_props = cache.get_cache_list_props()
-    return list_props
-
-# get autocompletion list from compgen built-in bash command
-def get_list_compgen(current : str, only_dirs : bool) -> list:
+class CompletionEngine:
     """
-    Generates a list of possible completions for a given path prefix using the `compgen` command.
-
-    Args:
-        current (str): The current path prefix to complete. 
-            If it starts with '~', it will be expanded to the user's home directory.
-        only_dirs (bool): If True, only directories will be considered for completion. 
-            If False, both files and directories will be considered.
-
-    Returns:
-        list: A list of possible completions for the given path prefix. 
-            Each completion will have spaces escaped and directories will end with a '/'.
+    Completions of gpac command lines, with the cache and the lists they are computed from.
+    The methods of an engine may be called from several threads at once: the cache and the
+    lists loaded from it are shared under a lock, and the state of a completion (see
+    CompletionState) is kept per thread, so that completions running at the same time, or
+    started from within another completion, do not see each other.
+    Attributes:
+    -----------
+    cache_path : str|None
+        The file path of the cache, CACHE_PATH when it is loaded if None.
+    base_path : str|None
+        The file path of the read-only base cache, BASE_CACHE_PATH if None, none if empty.
+    cache : cache_manager.Cache|None
+        The cache, loaded by the first completion which needs it.
+    memo : completion_memo.CompletionMemo|None
+        The memo of the completions made by complete.
+    dir_listings : completion_memo.DirListings|None
+        The listings of the directories, kept once complete has been called.
+    descriptors : dict
+        The descriptors of the filters whose options were completed (see filter_descriptor.py).
+    lists_header : str|None
+        The header of the lists of the bash hook last written or read (see write_shell_lists).
+    version : tuple|None
+        The version of gpac and the stale version of the cache entries the lists were loaded for.
     """
-    if current is None:
-        return []
-
-    opt = "-d" if only_dirs else "-f"
-    sub = 0
-    home = str(Path.home())
-    if len(current) > 0 and current[0] == "~":
-        sub = len(home)
-        current = home + current[1:]
-    try:
-        current_cleaned = current.replace(r"\ ", " ")
-        compgen_cmd = f"compgen {opt} -- \"{current_cleaned}\""
-        result = check_output(compgen_cmd, shell=True, executable='/bin/bash').decode().split('\n')
-        if sub > 0:
-            result = ["~" + e[sub:].replace(" ", r"\ ") + "/" if Path(e).is_dir() else "~" + e[sub:].replace(" ", r"\ ") + " " for e in result if e != ""]
-        else:
-            result = [e.replace(" ", r"\ ") + "/" if Path(e).is_dir() else e.replace(" ", r"\ ") + " " for e in result if e != ""]
+    def __init__(self, cache_path: str|None = None, base_path: str|None = None):
+        self.cache_path = cache_path
+        self.base_path = base_path
+        self.cache = None
+        self.memo = None
+        self.dir_listings = None
+        self.descriptors = {}
+        self.lists_header = None
+        self.version = None
+        self.list_filters = []
+        self.list_modules = []
+        self.list_props = []
+        self.protocols = {}
+        # guards the cache and everything loaded from it
+        self._lock = RLock()
+        # guards the listings of the directories, which may take long to read
+        self._paths_lock = RLock()
+        # state of the completion running in each thread
+        self._states = {}
+
+
+    def _state(self) -> CompletionState:
+        """
+        Returns the state of the completion running in the current thread, or a new state.
+        """
+        state = self._states.get(get_ident(), None)
+        return state if state is not None else CompletionState()
+
+    # lazy loading of the cache
+    def get_cache(self):
+        """
+        Returns the cache, loading it on first use.
+        The runs of gpac of the current thread are given the deadline of its completion.
+        """
+        import cache_manager as cm
+        cm.set_deadline(self._state().deadline)
+        with self._lock:
+            if self.cache is None:
+                base_path = BASE_CACHE_PATH if self.base_path is None else self.base_path
+                self.cache = cm.Cache(self.cache_path or CACHE_PATH, base_path or None)
+            return self.cache
+
+    # get all possible args for a filter
+    def get_list_args(self, gfilter: str) -> dict:
+        """
+        Retrieve a list of arguments from the cache based on the given filter.
+        """
+        with self._lock:
+            return self.get_cache().get_cache_list_args(gfilter)
+
+    # get type and possible values for an arg of a filter
+    def get_type_arg_filter(self, gfilter: str, arg: str) -> tuple:
+        """
+        Retrieve the type and possible values of an argument from the cache.
+        """
+        with self._lock:
+            return self.get_cache().get_cache_type_arg_filter(gfilter, arg)
+
+    def get_list_values_enum_args(self, gfilter: str) -> dict:
+        with self._lock:
+            return self.get_cache().get_cache_list_values_enum_args(gfilter)
+
+    # lazy loading of filters
+    def get_list_filters(self) -> list:
+        with self._lock:
+            if self.list_filters == []:
+                self.list_filters = self.get_cache().get_cache_list_filters()
+            return self.list_filters
+
+    # lazy loading of modules
+    def get_list_modules(self) -> list:
+        """
+        Returns the list of modules. If the list is empty, it fetches the list from the cache.
+
+        Returns:
+            list: A list of modules.
+        """
+        with self._lock:
+            if self.list_modules == []:
+                self.list_modules = self.get_cache().get_cache_list_modules()
+            return self.list_modules
+
+    # lazy loading of protocols
+    def get_list_protocols(self) -> dict:
+        with self._lock:
+            if self.protocols == {}:
+                self.protocols = self.get_cache().get_cache_list_protocols()
+            return self.protocols
+
+    # lazy loading of props
+    def get_list_props(self) -> list:
+        with self._lock:
+            if self.list_props == []:
+                self.list_props = self.get_cache().get_cache_list_props()
+            return self.list_props
+
+    # get the prefix index of a list of names (see prefix_index.PrefixIndex)
+    def get_index(self, name: str, source):
+        """
+        Retrieve the prefix index of a list of names from the cache.
+        """
+        with self._lock:
+            return self.get_cache().get_cache_index(name, source)
+
+    # reload the lists when the version of gpac changes, and when the cache is rebuilt for it
+    def follow_version(self) -> tuple:
+        """
+        Reset the lazily loaded lists if the version of gpac, or the stale version of the cache
+        entries, changed since they were loaded.
+        Returns the version of gpac and the stale version of the cache entries.
+        """
+        with self._lock:
+            cache = self.get_cache()
+            version = (cache.get_gpac_version(), cache.stale)
+            if version != self.version:
+                self.reset_lazy_lists()
+                self.version = version
+            return version
+
+    # reset the lazily loaded lists, e.g. when the version of gpac has changed
+    def reset_lazy_lists(self) -> None:
+        with self._lock:
+            self.list_filters = []
+            self.lists_header = None
+            self.list_modules = []
+            self.list_props = []
+            self.protocols = {}
+            self.descriptors = {}
+            if self.memo is not None:
+                self.memo.clear()
+
+    # write the changes of the cache
+    def flush(self) -> bool:
+        """
+        Write the cache if it was loaded and has changed (see cache_manager.Cache.flush).
+        Returns True if the file was written.
+        """
+        with self._lock:
+            return self.cache is not None and self.cache.flush()
+
+    # get autocompletion list from compgen built-in bash command
+    @trace.traced
+    def get_list_compgen(self, current : str, only_dirs : bool, cwd : str|None = None) -> list:
+        """
+        Generates a list of possible completions for a given path prefix, as the `compgen` command would,
+        by listing the directory of the prefix with `os.scandir`.
+
+        Args:
+            current (str): The current path prefix to complete.
+                If it starts with '~', it will be expanded to the user's home directory.
+            only_dirs (bool): If True, only directories will be considered for completion.
+                If False, both files and directories will be considered.
+            cwd (str|None): The directory of relative paths, the current directory if None.
+
+        Returns:
+            list: A sorted list of possible completions for the given path prefix.
+                Each completion will have spaces escaped and directories will end with a '/'.
+                If there are more than PATH_MAX_RESULTS of them, too_many_matches instead.
+        """
+        if current is None:
+            return []
+
+        state = self._state()
+        sub = 0
+        home = os.path.expanduser("~")
+        if len(current) > 0 and current[0] == "~":
+            sub = len(home)
+            current = home + current[1:]
+        current = current.replace(r"\ ", " ")
+        dirname, basename = os.path.split(current)
+        if dirname and not dirname.endswith("/"):
+            dirname += "/"
+
+        directory = os.path.join(cwd, dirname) if cwd else dirname or "."
+        if state.scanned_dirs is not None:
+            # modification time taken before listing: a later change always invalidates the result
+            import completion_memo
+            state.scanned_dirs.append((os.path.abspath(directory), completion_memo.dir_mtime(directory)))
+
+        try:
+            if self.dir_listings is not None:
+                with self._paths_lock:
+                    entries = self.dir_listings.find(directory, basename, only_dirs, PATH_MAX_RESULTS)
+            else:
+                entries = list_directory(directory, basename, only_dirs, PATH_MAX_RESULTS)
+        except OSError:
+            return []
+        # like compgen, "." and ".." are only proposed for a prefix starting with "."
+        if entries is not None and basename.startswith("."):
+            entries += [(e, True) for e in [".", ".."] if e.startswith(basename)]
+        if entries is None or PATH_MAX_RESULTS and len(entries) > PATH_MAX_RESULTS:
+            state.paths_truncated = True
+            return list(too_many_matches)
 
-    except CalledProcessError as e:
         result = []
-    return result
-
-def get_list_values_enum_args(gfilter: str) -> dict:
-    return cache.get_cache_list_values_enum_args(gfilter)
-
-
-def analyze_filter(filter, current_word, help_mode=False):
-    list_args = get_list_args(filter)
-    list_enum_values = get_list_values_enum_args(filter)
-
-    possiblities = list_args
-    completions = []
-
-    if not help_mode:
-        args = current_word.split(":")
-
-        opt = [*args]
-        used_props = set()
-        for i in range(len(opt)):
-            temp = opt[i].split("=")[0]
-            if temp in list_args:
-                opt[i] = temp
-            elif opt[i] in list_enum_values:
-                # get arg name
-                opt[i] = list_enum_values[opt[i]]
-            elif len(temp) > 0 and temp[0] == "#":
-                used_props.add(temp[1:])
-
+        for name, is_dir in sorted(entries):
+            path = dirname + name
+            if sub > 0:
+                path = "~" + path[sub:]
+            result.append(path.replace(" ", r"\ ") + ("/" if is_dir else " "))
+        return result
+
+    def get_filter_descriptor(self, gfilter: str):
+        """
+        Returns the descriptor of the options of a filter, built from the cache on first use.
+        """
+        with self._lock:
+            descriptor = self.descriptors.get(gfilter, None)
+            if descriptor is None:
+                from filter_descriptor import FilterDescriptor
+                list_args = self.get_list_args(gfilter)
+                list_enum_values = self.get_list_values_enum_args(gfilter)
+                descriptor = FilterDescriptor(gfilter, list_args, list_enum_values,
+                                              self.get_index("args." + gfilter, list_args),
+                                              self.get_index("enum_values." + gfilter, list_enum_values),
+                                              self.get_type_arg_filter)
+                self.descriptors[gfilter] = descriptor
+            return descriptor
+
+
+    @trace.traced
+    def analyze_filter(self, filter, current_word, help_mode=False, cwd=None):
+        descriptor = self.get_filter_descriptor(filter)
+        list_args = descriptor.args
+        list_enum_values = descriptor.enum_values
+        completions = []
 
-        if args[0] != filter:
-            completions = []
-        elif current_word[-1] == ":":
-            completions = [e for e in possiblities if e not in opt] + [e for e in list_enum_values if list_enum_values[e] not in opt]
-        else:
-            if len(args) == 1:
-                completions = [current_word + " "]
-                if len(list_args) > 0:
-                    completions += [current_word + ":"]
-            elif len(args[-1])>0 and args[-1][0] == "#":
-                props = [e for e in get_list_props() if e not in used_props]
-                prop_name = args[-1][1:]
-                completions = ["#"+e for e in props if e.startswith(prop_name)]
-            elif args[-1] in list_enum_values:
-                completions = [args[-1] + " ", args[-1] + ":"]
-            elif opt[-1] in possiblities:
-                # get type of arg
-                type, values = get_type_arg_filter(filter, opt[-1])
-
-                if type != "bool":
-                    if "=" in args[-1]:
-                        s = args[-1].index('=')
-                        if type == "strl":
-                            if args[-1][-1] == "=":
-                                completions = []
-                            elif args[-1][-1] == ",":
-                                completions = [args[-1][s+1:]]
-                            else:
-                                completions = [args[-1][s+1:], args[-1][s+1:]+",", args[-1][s+1:]+":"]
-                        elif type=="str" or type=="cstr":
-                            if not quote_added:
-                                if args[-1][s+1:].startswith("\""):
-                                    completions = [args[-1][s+1:]+":", args[-1][s+1:]+" "]
+        if not help_mode:
+            args = current_word.split(":")
+            last = args[-1]
+            opt, used_props = descriptor.resolve(args)
+            used = set(opt)
+
+            if args[0] != filter:
+                completions = []
+            elif current_word[-1] == ":":
+                completions = descriptor.unused(used)
+            else:
+                if len(args) == 1:
+                    completions = [current_word + " "]
+                    if len(list_args) > 0:
+                        completions += [current_word + ":"]
+                elif len(last)>0 and last[0] == "#":
+                    prop_name = last[1:]
+                    props = or_known(lambda: self.get_index("props", self.get_list_props()).startswith(prop_name), [], self._state())
+                    completions = ["#"+e for e in props if e not in used_props]
+                elif last in list_enum_values:
+                    completions = [last + " ", last + ":"]
+                elif opt[-1] in list_args:
+                    # get type of arg
+                    type, values = descriptor.arg_type(opt[-1])
+
+                    if type != "bool":
+                        if "=" in last:
+                            value = last[last.index('=')+1:]
+                            if type == "strl":
+                                if last[-1] == "=":
+                                    completions = []
+                                elif last[-1] == ",":
+                                    completions = [value]
                                 else:
-                                    completions = ['"'+args[-1][s+1:]+'":', "\"" + args[-1][s+1:]+"\" ", "\"" + args[-1][s+1:]]
-                            else:
-                                value = args[-1][s+1:-1]
-                                if value.startswith("\""):
-                                    completions = [value, value+"\":", value+"\" "]
+                                    completions = [value, value+",", value+":"]
+                            elif type=="str" or type=="cstr":
+                                if not self._state().quote_added:
+                                    if value.startswith("\""):
+                                        completions = [value+":", value+" "]
+                                    else:
+                                        completions = ['"'+value+'":', "\"" + value+"\" ", "\"" + value]
+                                else:
+                                    value = value[:-1]
+                                    if value.startswith("\""):
+                                        completions = [value, value+"\":", value+"\" "]
 
-                            if opt[-1] == "src":
-                                completions += get_list_compgen(current_word, False)
-                        elif type == "enum":
+                                if opt[-1] == "src":
+                                    completions += self.get_list_compgen(current_word, False, cwd)
+                            elif type == "enum":
 
-                            completions = [e if e!=args[-1][s+1:] else e+" " for e in values if e.startswith(args[-1][s+1:])]
-                            if args[-1][s+1:] in values:
-                                completions += [args[-1][s+1:] + ":"]
+                                completions = [e if e!=value else e+" " for e in values if e.startswith(value)]
+                                if value in values:
+                                    completions += [value + ":"]
+                            else:
+                                if last[-1] != "=":
+                                    completions = [value+':', value + " "]
                         else:
-                            if args[-1][-1] != "=":
-                                completions = [args[-1][s+1:]+':', args[-1][s+1:] + " "]
+                            completions = [opt[-1] + "="]
                     else:
-                        completions = [opt[-1] + "="]
-                else:
-                    if "=" in args[-1]:
-                        s = args[-1].index('=')
-                        value = args[-1][s+1:]
-                        completions = [e if e!=value else e+" " for e in ["true", "false"] if e.startswith(value)]
-                        if value in {"true", "false"}:
-                            completions += [value + ":"]
-                    else:
-                        completions = [args[-1]+":", args[-1]+" ", args[-1] + "="]
-
-            completions += [e for e in possiblities if e.startswith(args[-1]) and e not in opt] + \
-                            [e for e in list_enum_values if list_enum_values[e] not in opt[:-1] and e.startswith(args[-1]) and e != args[-1]]
-    else:
-        if current_word == filter:
-            completions = [filter + " "]
-            if len(list_args) > 0:
-                completions += [filter + "."]
-        elif current_word.startswith(filter+"."):
-            index = current_word.index(".")
-            completions = [filter+"."+e+" " for e in possiblities if e.startswith(current_word[index+1:])]
-
-    return completions
-
-
-def generate_completions(command_line, cursor_position):
-    global quote_added
-
-    command_line = command_line[0:cursor_position]
-
-    quote_added = False
-    if command_line.count("\"") % 2==1:
-        command_line += "\""
-        quote_added = True
-
-    pattern = r'(?:[^\s"\\]+|"(?:\\.|[^"\\])*"|\\.)+'
-    command_line_words = findall(pattern, command_line)
-
-
-    if command_line[-1] == " " and command_line[-2] != "\\":
-        command_line_words.append("")
-
-    ## check wether help is being requested
-    help_mode = False
-    for i in range(len(command_line_words)-1):
-        if command_line_words[i] in list_help:
-            help_mode = True
-            break
-
-    completions = []
-
-    ## get current and previous word being typed
-    current_word = ""
-    previous_word = ""
-
-    if len(command_line_words) > 0:
-        current_word = command_line_words[-1]
-        if len(command_line_words) > 1:
-            previous_word = command_line_words[-2]
+                        if "=" in last:
+                            value = last[last.index('=')+1:]
+                            completions = [e if e!=value else e+" " for e in ["true", "false"] if e.startswith(value)]
+                            if value in {"true", "false"}:
+                                completions += [value + ":"]
+                        else:
+                            completions = [last+":", last+" ", last + "="]
 
-    if help_mode:
-        if previous_word == "module" or previous_word == "modules":
-            completions = [e+" " for e in get_list_modules()+[""] if e.startswith(current_word)]
-        elif previous_word == "links":
-            completions = [e+" " for e in get_list_filters()+[""] if e.startswith(current_word)]
-        elif previous_word == "props":
-            completions = [e+" " for e in get_list_props()+[""] if e.startswith(current_word)]
+                # options already set are not proposed again, except the last one being typed
+                used_before = set(opt[:-1])
+                completions += [e for e in descriptor.args_index.startswith(last) if e not in used] + \
+                                [e for e in descriptor.enum_values_index.startswith(last) if list_enum_values[e] not in used_before and e != last]
         else:
-            if current_word.split('.')[0] in get_list_filters():
-                completions = analyze_filter(current_word.split('.')[0], current_word, help_mode)
-            if len(completions) == 0:
-                completions = [e+" " for e in help_options if e.startswith(current_word)] + \
-                                [e for e in get_list_filters() if e.startswith(current_word)]
+            if current_word == filter:
+                completions = [filter + " "]
+                if len(list_args) > 0:
+                    completions += [filter + "."]
+            elif current_word.startswith(filter+"."):
+                index = current_word.index(".")
+                completions = [filter+"."+e+" " for e in descriptor.args_index.startswith(current_word[index+1:])]
+
+        return completions
+
+
+    @trace.traced
+    def generate_completions(self, command_line: str, cursor_position: int, cwd: str|None = None,
+                             deadline: float|None = None, state: CompletionState|None = None) -> list:
+        """
+        Generates the completions of a command line truncated at the cursor position.
+        cwd is the directory of relative paths, the current directory if None, and deadline
+        the time.monotonic() time after which gpac is not run anymore, None for no deadline.
+        state is the state to compute the completions with, e.g. to collect the directories
+        listed, a new state with cwd and deadline if None.
+        """
+        if state is None:
+            state = CompletionState(cwd, deadline)
+        if self.cache is not None:
+            self.follow_version()
+        # the state of a completion started from within another one is restored afterwards
+        thread = get_ident()
+        previous = self._states.get(thread, None)
+        self._states[thread] = state
+        try:
+            return self._generate(command_line, cursor_position, state)
+        finally:
+            if previous is None:
+                del self._states[thread]
+            else:
+                self._states[thread] = previous
+
+
+    def _generate(self, command_line, cursor_position, state):
+        cwd = state.cwd
+        # words of the command line, in a single pass (see line_tokenizer.py)
+        tokens = tokenize(command_line[0:cursor_position], help_flags)
+        state.quote_added = tokens.quote_added
+        command_line_words = tokens.words
+        help_mode = tokens.help_mode
 
-    else:
-        if (previous_word in {'-i', '-src', '-dst', '-o'}) or current_word.startswith('src=') or current_word.startswith('dst='):
-            get_list_protocols()
-            input_protocols = [p for p in protocols if protocols[p]["input"] != []]
-            output_protocols = [p for p in protocols if protocols[p]["output"] != []]
-
-            list_cur = current_word.split(":")
-            curr_option = list_cur[-1]
-            protocol = list_cur[0]
-
-
-            if previous_word == "-i" or previous_word == "-src":
-                possibilities = [e+"://" for e in input_protocols]
-                completions = [e for e in possibilities if e.startswith(current_word)] + get_list_compgen(current_word, False)
-            elif previous_word == "-o" or previous_word == "-dst":
-                possibilities = [e+"://" for e in output_protocols]
-                completions = [e for e in possibilities if e.startswith(current_word)] + get_list_compgen(current_word, True)
-            elif current_word.startswith("src="):
-                possibilities = [e+"://" for e in input_protocols]
-                completions = [e for e in possibilities if e.startswith(current_word[4:])] + get_list_compgen(current_word.split("=")[1], False)
-            elif current_word.startswith("dst="):
-                possibilities = [e+"://" for e in output_protocols]
-                completions = [e for e in possibilities if e.startswith(current_word[4:])] + + get_list_compgen(current_word.split("=")[1], True)
-
-
-        elif current_word == "":
-            completions = ["-h", "-help", "-netcap=", "-graph", "-stats", "-src", "-i", "-logs", "-dst", "-o"] + get_list_filters()
-        elif current_word == "-":
-            completions = ["-h", "-help", "-netcap=", "-graph", "-stats", "-src", "-i", "-logs", "-dst", "-o"]
-        elif current_word[0] == "-":
-            completions = [e for e in ["-h", "-hx", "-help", "-netcap=", "-graph", "-stats", "-src", "-i", "-logs", "-dst", "-o"] if e.startswith(current_word)]
-        else:
+        completions = []
 
-            for gfilter in get_list_filters():
-                if current_word.split(':')[0] == gfilter:
-                    completions = analyze_filter(gfilter, current_word, help_mode)
-                    break
-            if len(completions) == 0:
-                possibilities = get_list_filters()
-                completions = [e for e in possibilities if e.startswith(current_word)]
+        ## get current and previous word being typed
+        current_word = ""
+        previous_word = ""
+
+        if len(command_line_words) > 0:
+            current_word = command_line_words[-1]
+            if len(command_line_words) > 1:
+                previous_word = command_line_words[-2]
+
+        if help_mode:
+            empty = [" "] if current_word == "" else []
+            if previous_word == "module" or previous_word == "modules":
+                completions = [e+" " for e in or_known(lambda: self.get_index("modules", self.get_list_modules()).startswith(current_word), [], state)] + empty
+            elif previous_word == "links":
+                completions = [e+" " for e in or_known(lambda: self.get_index("filters", self.get_list_filters()).startswith(current_word), [], state)] + empty
+            elif previous_word == "props":
+                completions = [e+" " for e in or_known(lambda: self.get_index("props", self.get_list_props()).startswith(current_word), [], state)] + empty
+            else:
+                filters_index = or_known(lambda: self.get_index("filters", self.get_list_filters()), (), state)
+                if current_word.split('.')[0] in filters_index:
+                    completions = or_known(lambda: self.analyze_filter(current_word.split('.')[0], current_word, help_mode, cwd), [], state)
+                if len(completions) == 0:
+                    completions = [e+" " for e in help_options if e.startswith(current_word)] + \
+                                    (filters_index.startswith(current_word) if filters_index else [])
 
-    return completions
+        else:
+            if (previous_word in {'-i', '-src', '-dst', '-o'}) or current_word.startswith('src=') or current_word.startswith('dst='):
+                try:
+                    protocols = self.get_list_protocols()
+                    # only protocols whose name starts with the typed one can match
+                    candidates = self.get_index("protocols", protocols).startswith(current_word.split("=")[-1].split(":")[0])
+                except TimeoutError:
+                    # protocols unknown before the deadline: only the paths are completed
+                    state.partial = True
+                    candidates = []
+                input_protocols = [p for p in candidates if protocols[p]["input"] != []]
+                output_protocols = [p for p in candidates if protocols[p]["output"] != []]
+
+                list_cur = current_word.split(":")
+                curr_option = list_cur[-1]
+                protocol = list_cur[0]
+
+
+                if previous_word == "-i" or previous_word == "-src":
+                    possibilities = [e+"://" for e in input_protocols]
+                    completions = [e for e in possibilities if e.startswith(current_word)] + self.get_list_compgen(current_word, False, cwd)
+                elif previous_word == "-o" or previous_word == "-dst":
+                    possibilities = [e+"://" for e in output_protocols]
+                    completions = [e for e in possibilities if e.startswith(current_word)] + self.get_list_compgen(current_word, True, cwd)
+                elif current_word.startswith("src="):
+                    possibilities = [e+"://" for e in input_protocols]
+                    completions = [e for e in possibilities if e.startswith(current_word[4:])] + self.get_list_compgen(current_word.split("=")[1], False, cwd)
+                elif current_word.startswith("dst="):
+                    possibilities = [e+"://" for e in output_protocols]
+                    completions = [e for e in possibilities if e.startswith(current_word[4:])] + self.get_list_compgen(current_word.split("=")[1], True, cwd)
+
+
+            elif current_word == "":
+                completions = options + or_known(self.get_list_filters, [], state)
+            elif current_word == "-":
+                completions = list(options)
+            elif current_word[0] == "-":
+                completions = [e for e in prefixed_options if e.startswith(current_word)]
+            else:
+                filters_index = or_known(lambda: self.get_index("filters", self.get_list_filters()), None, state)
+                if filters_index is not None:
+                    if current_word.split(':')[0] in filters_index:
+                        # the arguments of a filter unknown before the deadline: complete the filter names
+                        completions = or_known(lambda: self.analyze_filter(current_word.split(':')[0], current_word, help_mode, cwd), [], state)
+                    if len(completions) == 0:
+                        completions = filters_index.startswith(current_word)
+
+        return completions
+
+
+    # memoized completions, for long-running processes
+    def complete(self, command_line: str, cursor_position: int, cwd: str|None = None,
+                 deadline: float|None = None) -> list:
+        """
+        Generates the completions of a command line as generate_completions does, through a memo
+        of the previous completions: the same command line, or a command line extending a
+        previous one by a few characters of the same word, is answered without recomputation.
+        cwd is the directory of relative paths, the current directory if None.
+        """
+        with self._lock:
+            if self.memo is None:
+                from completion_memo import CompletionMemo
+                self.memo = CompletionMemo()
+            if self.dir_listings is None:
+                from completion_memo import DirListings
+                self.dir_listings = DirListings()
+
+        cwd = cwd or os.getcwd()
+        line = command_line[0:cursor_position]
+        word = "" if line.endswith(" ") else (line.split() or [""])[-1]
+        is_filter = lambda name: name in self.get_index("filters", self.get_list_filters())
+
+        with self._lock:
+            # the completions depend on the version of gpac, and on whether the cache entries are stale
+            cache = self.get_cache()
+            version = self.follow_version()
+            memo = self.memo
+            completions = memo.get(version, cwd, line, word, is_filter)
+        if completions is None:
+            state = CompletionState(cwd, deadline, [])
+            missed = len(cache.missed)
+            completions = self.generate_completions(command_line, cursor_position, state=state)
+            if len(cache.missed) > missed:
+                state.partial = True
+            with self._lock:
+                # completions cut by the deadline are not served to the next ones, which may have more time
+                if not state.partial:
+                    memo.put(version, cwd, line, word, completions, state.scanned_dirs, is_filter,
+                             not state.paths_truncated)
+        # e.g. a stale cache, rebuilt in the background
+        self.fill_missed(cursor_position, command_line)
+        return completions
+
+
+    # lists of names completed by the bash hook itself
+    def write_shell_lists(self) -> None:
+        """
+        Write the file of the lists completed by the bash hook without starting Python, next to
+        the cache, once the filters are loaded. Its lines are:
+            a header: path of the gpac binary, its version, a checksum of the lists, path of its
+                libgpac (empty if not found) and LD_LIBRARY_PATH, tab-separated
+            the options completed for an empty word or "-", separated by spaces
+            the options completed for the other words starting with "-", separated by spaces
+            the help flags, separated by spaces
+            the names of the filters, one per line
+        The bash hook reloads the lists when the header changes, and only uses them for the gpac
+        binary and the LD_LIBRARY_PATH of the header, as long as the binary and its libgpac are
+        older than the file.
+        """
+        with self._lock:
+            cache = self.cache
+            list_filters = self.list_filters
+            if cache is None or not list_filters or cache.stale is not None:
+                return
+            import zlib
+            import cache_manager as cm
+            gpac = cm.find_gpac()
+            if gpac is None or any(c in e for e in list_filters for c in " \t\n"):
+                return
+            lines = [" ".join(options), " ".join(prefixed_options), " ".join(list_help), *list_filters]
+            body = "".join(e + "\n" for e in lines)
+            version = cache.get_gpac_version()
+            # libgpac and LD_LIBRARY_PATH of the fingerprint of the binary (see get_gpac_fingerprint)
+            fingerprint = cache.content.get("fingerprint", None) or {}
+            libgpac = fingerprint["libgpac"][0] if fingerprint.get("libgpac") else ""
+            library_path = fingerprint.get("ld_library_path", "")
+            if any(c in e for e in (libgpac, library_path) for c in "\t\n"):
+                return
+            header = f"{gpac}\t{version}\t{zlib.crc32(body.encode()):08x}\t{libgpac}\t{library_path}"
+            if header == self.lists_header:
+                return
+            path = os.path.splitext(cache.path)[0] + ".lists"
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    current = file.readline().rstrip("\n")
+                # the hook does not use lists older than the gpac binary or its libgpac
+                mtime = os.path.getmtime(path)
+                uptodate = current == header and all(mtime >= os.path.getmtime(e) for e in (gpac, libgpac) if e)
+            except (OSError, ValueError):
+                uptodate = False
+            if not uptodate:
+                from cache_storage import write_atomic
+                write_atomic(path, (header + "\n" + body).encode())
+            self.lists_header = header
+
+
+    # fetch the entries missed by the completions, e.g. the whole cache for a new version of gpac
+    def fill_missed(self, pos: int, command_line: str, background: bool = True) -> None:
+        """
+        Fetch the entries of the cache missed by the completions, the last one being the
+        completion of command_line at pos: in a detached process if background (see
+        fill_in_background), at once otherwise, the lists being then reloaded from the filled cache.
+        """
+        with self._lock:
+            if self.cache is None or not self.cache.missed:
+                return
+            names = list(self.cache.missed)
+            self.cache.missed.clear()
+        if background:
+            self.fill_in_background(names, pos, command_line)
+            return
+        with self._lock:
+            self.cache.fill(names)
+            self.follow_version()
+
+    # fetch the entries missed by a completion in a detached process
+    def fill_in_background(self, names: list, pos: int, command_line: str) -> None:
+        """
+        Start a detached process running this script with "--fill POS LINE NAMES..." on the cache
+        of the engine, unless all the entries are already being fetched by another one.
+        """
+        with self._lock:
+            names = [e for e in names if not self.cache.is_filling(e)]
+            cache_path = self.cache.path
+            base_path = BASE_CACHE_PATH if self.base_path is None else self.base_path
+        if len(names) == 0:
+            return
+        import sys
+        import subprocess
+        flags = (["-S"] if sys.flags.no_site else []) + (["-E"] if sys.flags.ignore_environment else [])
+        code = ("import sys; sys.path[0] = sys.argv[1]; import gpac_autocomplete as ga; "
+                "ga.engine.cache_path, ga.engine.base_path = sys.argv[2:4]; sys.exit(ga.main(sys.argv[4:]))")
+        env = dict(os.environ)
+        env.pop("GPAC_AC_TRACE_START", None)
+        subprocess.Popen([sys.executable, *flags, "-c", code, os.path.dirname(os.path.abspath(__file__)),
+                          cache_path, base_path, "--fill", str(pos), f'"{command_line}"', *names],
+                         env=env, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         start_new_session=True)
+
+
+# engine of the script, behind its functions
+engine = CompletionEngine()
+get_cache = engine.get_cache
+get_list_args = engine.get_list_args
+get_type_arg_filter = engine.get_type_arg_filter
+get_list_values_enum_args = engine.get_list_values_enum_args
+get_list_filters = engine.get_list_filters
+get_list_modules = engine.get_list_modules
+get_list_protocols = engine.get_list_protocols
+get_list_props = engine.get_list_props
+get_index = engine.get_index
+follow_version = engine.follow_version
+reset_lazy_lists = engine.reset_lazy_lists
+get_list_compgen = engine.get_list_compgen
+get_filter_descriptor = engine.get_filter_descriptor
+analyze_filter = engine.analyze_filter
+generate_completions = engine.generate_completions
+complete = engine.complete
+write_shell_lists = engine.write_shell_lists
+fill_missed = engine.fill_missed
+fill_in_background = engine.fill_in_background
+
+
+# prebuild the whole cache
+def warm_cache(jobs: int|None = None, base_path: str|None = None) -> None:
+    """
+    Fetch every filter, argument, enum value, module, property and protocol into the cache,
+    or into the base cache file base_path if given, printing the progress and the total wall time.
+    """
+    import sys
+    import time
 
+    interactive = sys.stderr.isatty()
 
+    def progress(step, done, total):
+        if interactive:
+            end = "\n" if done == total else ""
+            print(f"\rwarming {step}: {done}/{total}", end=end, file=sys.stderr, flush=True)
+        elif done == total:
+            print(f"warming {step}: {done}/{total}", file=sys.stderr, flush=True)
 
-if __name__ == "__main__":
-    import sys
+    start = time.monotonic()
+    if base_path is not None:
+        import cache_manager as cm
+        cm.build_base_cache(base_path, jobs, progress)
+    else:
+        get_cache().warm(jobs, progress)
+    reset_lazy_lists()
+    print(f"cache warmed in {time.monotonic() - start:.2f}s")
 
-    if len(sys.argv) < 3:
-        sys.exit(1)
 
-    pos = int(sys.argv[1])
-    command_line = sys.argv[2][1:-1]   # Remove the quotes added by Bash script
+# complete many command lines in a single process
+def run_batch(input, output) -> int:
+    """
+    Complete the requests read from input, one JSON object per line:
+        {"line": "gpac inspect:mo", "cursor": 15}
+    where cursor is the position of the cursor in the line, its end if missing. A request may
+    also give the "cwd" directory of relative paths, and an "id" copied into its result.
+    One JSON line is written to output for each request, as soon as it is computed:
+        {"completions": ["mode"]}
+    or {"error": "..."} for an invalid request.
+    The cache is loaded once for the whole session, gpac is run without deadline, and the
+    cache is written at the end of the input. The entries missed by a completion, e.g. the
+    whole cache when the version of gpac changes, are fetched before answering it.
+    """
+    import json
+    for text in input:
+        if not text.strip():
+            continue
+        request = None
+        try:
+            request = json.loads(text)
+            if not isinstance(request, dict) or not isinstance(request.get("line", None), str):
+                raise ValueError('a request is an object with a "line" string')
+            line = request["line"]
+            cursor = request.get("cursor", len(line))
+            if type(cursor) is not int or cursor < 0:
+                raise ValueError('"cursor" is not a position in the line')
+            cwd = request.get("cwd", None)
+            if cwd is not None and not isinstance(cwd, str):
+                raise ValueError('"cwd" is not a string')
+        except ValueError as e:
+            result = {"error": f"invalid request: {e}"}
+        else:
+            try:
+                completions = engine.generate_completions(line, cursor, cwd)
+                if engine.cache is not None and engine.cache.missed:
+                    # e.g. the stale entries of a previous version of gpac: rebuilt at once
+                    engine.fill_missed(cursor, line, background=False)
+                    completions = engine.generate_completions(line, cursor, cwd)
+                result = {"completions": completions}
+            except Exception as e:
+                result = {"error": f"{type(e).__name__}: {e}"}
+        if isinstance(request, dict) and "id" in request:
+            result = {"id": request["id"], **result}
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+
+    engine.flush()
+    engine.write_shell_lists()
+    return 0
+
+
+def main(argv: list) -> int:
+    """
+    Entry point of the script: prints the completions of a command line, one per line.
+    argv holds the cursor position and the quoted command line, "--warm [JOBS]",
+    "--build-base [PATH]" to build the base cache shared by all the users,
+    "--fill POS LINE NAMES..." to fetch the entries of the cache missed by the completion
+    of a command line (see cache_manager.Cache.fill), then the others it needs, or "--batch"
+    to complete the JSON requests read from the standard input (see run_batch).
+    """
+    trace.startup()
+    if len(argv) > 0 and argv[0] == "--batch":
+        import sys
+        return run_batch(sys.stdin, sys.stdout)
+    if len(argv) > 0 and argv[0] == "--warm":
+        warm_cache(int(argv[1]) if len(argv) > 1 else None)
+        return 0
+    if len(argv) > 0 and argv[0] == "--build-base":
+        warm_cache(None, argv[1] if len(argv) > 1 else BASE_CACHE_PATH)
+        return 0
+    if len(argv) > 3 and argv[0] == "--fill":
+        # nothing to do if another process is fetching the missed entries
+        if engine.get_cache().fill(argv[3:]):
+            engine.generate_completions(argv[2][1:-1], int(argv[1]))
+            engine.flush()
+            engine.write_shell_lists()
+        return 0
+
+    if len(argv) < 2:
+        return 1
+
+    deadline = None
+    if DEADLINE_MS > 0:
+        import time
+        deadline = time.monotonic() + DEADLINE_MS / 1000
+    pos = int(argv[0])
+    command_line = argv[1][1:-1]   # Remove the quotes added by Bash script
 
     # Generate possible completions
     try:
-        completions = generate_completions(command_line, pos)
+        completions = engine.generate_completions(command_line, pos, None, deadline)
     except Exception as e:
         completions = []
 
     # Print each completion on a new line, as expected by Bash
     for completion in completions:
         print(completion)
+    trace.event("completion", line=command_line, pos=pos, completions=len(completions))
+
+    # End the output: the Bash script reads the completions until its end, and must not wait for
+    # the cache to be written (stdout is redirected to /dev/null rather than closed, so that its
+    # descriptor is not reused by a file opened afterwards)
+    import sys
+    try:
+        sys.stdout.flush()
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        os.close(devnull)
+    except (OSError, ValueError):
+        pass
+
+    # Write the cache once, with everything fetched during this completion
+    try:
+        if engine.cache is not None:
+            engine.flush()
+            engine.write_shell_lists()
+            engine.fill_missed(pos, command_line)
+    except Exception:
+        # the completions are already printed: a cache which cannot be written, or a background
+        # process which cannot be started, only costs the next completions a few gpac runs
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,68 @@
+"""
+Module: prefix_index
+This module provides a sorted index over a list of names (filters, arguments, properties,
+modules, protocols...) answering prefix and exact queries with a binary search instead of
+a linear scan of the whole list.
+Classes:
+    PrefixIndex: Sorted index of a list of names.
+"""
+from bisect import bisect_left
+
+
+class PrefixIndex:
+    """
+    Sorted index of a list of names.
+    Query results are returned in the order of the indexed list, so that they are the same
+    as the ones of a linear scan.
+    Attributes:
+    -----------
+    source : list|dict
+        The indexed list (or dict, whose keys are indexed).
+    order : list
+        Positions of the names in the indexed list, sorted by name.
+    """
+    __slots__ = ("source", "items", "order", "keys")
+
+    def __init__(self, source, order: list|None = None):
+        self.source = source
+        self.items = list(source)
+        if order is None or not self._is_valid_order(order):
+            order = sorted(range(len(self.items)), key=self.items.__getitem__)
+        self.order = order
+        self.keys = [self.items[i] for i in order]
+
+
+    def _is_valid_order(self, order: list)-> bool:
+        """
+        Check that a stored order is a permutation of the positions sorting the current names.
+        """
+        size = len(self.items)
+        if len(order) != size or len(set(order)) != size:
+            return False
+        if any(not isinstance(i, int) or i < 0 or i >= size for i in order):
+            return False
+        return all(self.items[order[i]] <= self.items[order[i + 1]] for i in range(size - 1))
+
+
+    def __contains__(self, name: str)-> bool:
+        i = bisect_left(self.keys, name)
+        return i < len(self.keys) and self.keys[i] == name
+
+
+    def __len__(self)-> int:
+        return len(self.items)
+
+
+    def startswith(self, prefix: str)-> list:
+        """
+        Get the names starting with prefix, in the order of the indexed list.
+        """
+        if prefix == "":
+            return list(self.items)
+        positions = []
+        for i in range(bisect_left(self.keys, prefix), len(self.keys)):
+            if not self.keys[i].startswith(prefix):
+                break
+            positions.append(self.order[i])
+        positions.sort()
+        return [self.items[i] for i in positions]
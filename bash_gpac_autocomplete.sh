@@ -1,3 +1,80 @@
+# Lists written by gpac_autocomplete.py (see write_shell_lists), loaded once per shell session
+# and reloaded when their header changes
+_gpac_ac_lists_header=""
+_gpac_ac_options=()
+_gpac_ac_prefixed_options=()
+_gpac_ac_help=()
+_gpac_ac_filters=()
+
+# Complete the words which only need the lists of options and filters without starting Python:
+# an empty word, options and filter names. Returns 1 if Python is needed.
+_gpac_native_completion() {
+    local line=${1:0:$2}
+    local lists="$HOME/.cache/gpac/gpac_autocomplete.lists"
+    local header gpac libgpac
+
+    # quotes and escapes are left to the tokenizer of the script
+    [[ $line == *[\"\\]* || ! -f $lists ]] && return 1
+    # the lists are only valid for the gpac binary, libgpac and LD_LIBRARY_PATH they were written
+    # for, if the binary and the library have not changed since
+    hash gpac 2>/dev/null || return 1
+    gpac=${BASH_CMDS[gpac]}
+    IFS= read -r header < "$lists" || return 1
+    [[ ${header%%$'\t'*} == "$gpac" && ! $gpac -nt $lists ]] || return 1
+    # fields after the path of gpac, its version and the checksum of the lists
+    libgpac=${header#*$'\t'*$'\t'*$'\t'}
+    [[ ${libgpac#*$'\t'} == "$LD_LIBRARY_PATH" ]] || return 1
+    libgpac=${libgpac%%$'\t'*}
+    [[ -z $libgpac || ( -f $libgpac && ! $libgpac -nt $lists ) ]] || return 1
+    if [[ $header != "$_gpac_ac_lists_header" ]]; then
+        local lines
+        mapfile -t lines < "$lists"
+        [[ ${lines[0]} == "$header" ]] || return 1
+        read -r -a _gpac_ac_options <<< "${lines[1]}"
+        read -r -a _gpac_ac_prefixed_options <<< "${lines[2]}"
+        read -r -a _gpac_ac_help <<< "${lines[3]}"
+        _gpac_ac_filters=("${lines[@]:4}")
+        _gpac_ac_lists_header=$header
+    fi
+
+    local words
+    read -r -a words <<< "$line"
+    [[ $line == *" " ]] && words+=("")
+    local count=${#words[@]}
+    (( count > 0 )) || return 1
+
+    # help requests, filter options, enum values, properties and paths are completed by the script
+    local word help
+    for word in "${words[@]:0:count-1}"; do
+        for help in "${_gpac_ac_help[@]}"; do
+            [[ $word == "$help" ]] && return 1
+        done
+    done
+    local cur=${words[count-1]}
+    local prev=""
+    (( count > 1 )) && prev=${words[count-2]}
+    case $prev in -i|-src|-dst|-o) return 1 ;; esac
+    [[ $cur == src=* || $cur == dst=* || $cur == *:* ]] && return 1
+
+    COMPREPLY=()
+    if [[ -z $cur ]]; then
+        COMPREPLY=("${_gpac_ac_options[@]}" "${_gpac_ac_filters[@]}")
+    elif [[ $cur == "-" ]]; then
+        COMPREPLY=("${_gpac_ac_options[@]}")
+    elif [[ $cur == -* ]]; then
+        for word in "${_gpac_ac_prefixed_options[@]}"; do
+            [[ $word == "$cur"* ]] && COMPREPLY+=("$word")
+        done
+    else
+        for word in "${_gpac_ac_filters[@]}"; do
+            # the options of a filter are completed by the script
+            [[ $word == "$cur" ]] && return 1
+            [[ $word == "$cur"* ]] && COMPREPLY+=("$word")
+        done
+    fi
+    return 0
+}
+
 _gpac_completion() {
     # Get the whole command line
     local cur=${COMP_WORDS[COMP_CWORD]}
@@ -7,10 +84,44 @@ _gpac_completion() {
 
     # Get the directory where the current autocomplete script is located
     SCRIPT_DIR=$(dirname "${BASH_SOURCE[0]}")
-    SCRIPTPATH="$SCRIPT_DIR/gpac_autocomplete.py"
+    DAEMONPATH="$SCRIPT_DIR/completion_daemon.py"
+
+    # Flags of the Python interpreter: by default, skip the site module and the PYTHON* variables
+    # to start faster (set GPAC_AC_PYTHON_FLAGS="" to disable)
+    local python_flags=${GPAC_AC_PYTHON_FLAGS--S -E}
+    # The scripts are imported as modules rather than run, so that their compiled bytecode is reused
+    local import_dir='import sys; sys.path[0] = sys.argv[1]'
+
+    # Socket of the completion daemon, if any (see completion_daemon.py)
+    local socket_path="${GPAC_AC_SOCKET:-${XDG_RUNTIME_DIR:-$HOME/.cache/gpac}/gpac_autocomplete.sock}"
+
+    # Trivial completions are answered by the hook itself (set GPAC_AC_NATIVE=0 to disable)
+    if [ "${GPAC_AC_NATIVE:-1}" = "1" ] && _gpac_native_completion "$command_line" "$cursor_position"; then
+        compopt -o nospace
+        return
+    fi
 
     local all_completions
-    all_completions=$(python3 "$SCRIPTPATH" "$cursor_position" \""$command_line"\")
+    local status=1
+    if [ -S "$socket_path" ]; then
+        if command -v socat >/dev/null 2>&1; then
+            all_completions=$(printf '%s\n%s\n%s' "$cursor_position" "$PWD" "$command_line" | socat -t 2 - "UNIX-CONNECT:$socket_path" 2>/dev/null)
+        else
+            all_completions=$(python3 $python_flags -c "$import_dir; import completion_daemon as d; sys.exit(d.query(int(sys.argv[2]), sys.argv[3][1:-1]))" \
+                "$SCRIPT_DIR" "$cursor_position" \""$command_line"\")
+        fi
+        status=$?
+    fi
+
+    if [ $status -ne 0 ]; then
+        # No daemon reachable: start one for the next completions if enabled, and complete in one shot
+        if [ "${GPAC_AC_DAEMON:-0}" = "1" ]; then
+            (python3 $python_flags "$DAEMONPATH" </dev/null >/dev/null 2>&1 &)
+        fi
+        # with GPAC_AC_TRACE, the start time is passed to trace the interpreter startup
+        all_completions=$(GPAC_AC_TRACE_START=${GPAC_AC_TRACE:+$EPOCHREALTIME} python3 $python_flags -c "$import_dir; import gpac_autocomplete as ga; sys.exit(ga.main(sys.argv[2:]))" \
+            "$SCRIPT_DIR" "$cursor_position" \""$command_line"\")
+    fi
 
     # Split the output based on newlines
     IFS=$'\n' read -r -d '' -a all_completions <<< "$all_completions"$'\0'
@@ -0,0 +1,113 @@
+#! /usr/bin/python3
+"""
+Throughput benchmark of the batch mode of the completions, run offline with the scripted gpac
+of benchmarks/fake_gpac.
+
+Generated command lines (filter names, options, enum values, properties, help topics, paths,
+long pipelines) are completed:
+    batch:    by a single "gpac_autocomplete.py --batch" process reading them on its standard input
+    one-shot: by one process per line, as the Bash script does without daemon, on a sample
+
+with a warm cache, and in batch mode with a cold cache too. The throughput is reported in
+lines per second, the startup of the interpreters included.
+
+Usage:
+    python3 benchmarks/batch_bench.py [--lines N] [--sample N] [--filters N]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AUTOCOMPLETE_DIR = os.path.join(ROOT, "autocomplete")
+FAKE_GPAC_DIR = os.path.join(ROOT, "benchmarks", "fake_gpac")
+SCRIPT = os.path.join(AUTOCOMPLETE_DIR, "gpac_autocomplete.py")
+
+# words completed at the end of the generated lines
+WORDS = ["", "ins", "inspect:", "inspect:mode=", "inspect:deep:#Col", 'inspect:log="out', "routein:repair=",
+         "-", "-h f", "-h modules gm_", "src=media/", "-i media/video_1", "-o http", "httpin:src=media/v"]
+# filters chained before the completed word
+PIPELINE = ["inspect:deep", "routein:repair=yes", "compositor:ogl=on", "httpin:src=x.mp4"]
+
+
+def generate_lines(count: int)-> list:
+    """
+    Command lines of 0 to 8 filters, followed by a word to complete.
+    """
+    rand = random.Random(0)
+    lines = []
+    for _ in range(count):
+        pipeline = rand.choices(PIPELINE, k=rand.randint(0, 8))
+        lines.append(" ".join(["gpac", "-i", "in.mp4", *pipeline, rand.choice(WORDS)]))
+    return lines
+
+
+def batch(lines: list, env: dict, cwd: str)-> float:
+    """
+    Complete lines with a single batch process, and return its time.
+    """
+    requests = "".join(json.dumps({"line": line, "cursor": len(line)}) + "\n" for line in lines)
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-S", "-E", SCRIPT, "--batch"], input=requests.encode(),
+                            stdout=subprocess.PIPE, env=env, cwd=cwd, check=True).stdout
+    elapsed = time.perf_counter() - start
+    results = [json.loads(e) for e in output.splitlines()]
+    if len(results) != len(lines) or any("error" in e for e in results):
+        raise RuntimeError("the batch process did not complete every line")
+    return elapsed
+
+
+def one_shot(lines: list, env: dict, cwd: str)-> float:
+    """
+    Complete lines with one process per line, as the Bash script does, and return their time.
+    """
+    start = time.perf_counter()
+    for line in lines:
+        subprocess.run([sys.executable, "-S", "-E", SCRIPT, str(len(line)), f'"{line}"'],
+                       stdout=subprocess.DEVNULL, env=env, cwd=cwd, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=10000, help="number of lines completed in batch mode")
+    parser.add_argument("--sample", type=int, default=200, help="number of lines completed by one process each")
+    parser.add_argument("--filters", type=int, default=0, help="number of synthetic filters added to the fake gpac")
+    options = parser.parse_args()
+
+    lines = generate_lines(options.lines)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        home = os.path.join(tmpdir, "home")
+        work_dir = os.path.join(tmpdir, "work")
+        os.makedirs(home)
+        os.makedirs(os.path.join(work_dir, "media"))
+        for i in range(50):
+            with open(os.path.join(work_dir, "media", f"video_{i:02d}.mp4"), "w", encoding="utf-8"):
+                pass
+        env = dict(os.environ, HOME=home, PATH=FAKE_GPAC_DIR + os.pathsep + os.environ.get("PATH", ""),
+                   FAKE_GPAC_EXTRA_FILTERS=str(options.filters), GPAC_AC_DEADLINE_MS="0", GPAC_AC_BASE_CACHE="")
+        subprocess.check_call([sys.executable, "-m", "compileall", "-q", AUTOCOMPLETE_DIR], stdout=subprocess.DEVNULL)
+
+        print(f"{options.lines} lines in batch mode, {options.sample} lines one-shot, {options.filters} synthetic filters")
+        print(f"{'cache':6} {'mode':9} {'lines':>7} {'time (s)':>9} {'lines/s':>10}")
+        rows = [("cold", "batch", lines, batch)]
+        rows += [("warm", "batch", lines, batch), ("warm", "one-shot", lines[:options.sample], one_shot)]
+        rates = {}
+        for state, mode, sample, function in rows:
+            elapsed = function(sample, env, work_dir)
+            rates[state, mode] = len(sample) / elapsed
+            print(f"{state:6} {mode:9} {len(sample):7} {elapsed:9.2f} {rates[state, mode]:10.0f}")
+        print(f"batch mode speedup (warm cache): {rates['warm', 'batch'] / rates['warm', 'one-shot']:.0f}x")
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
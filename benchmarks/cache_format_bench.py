@@ -0,0 +1,73 @@
+#! /usr/bin/python3
+"""
+Benchmark of the on-disk formats of the cache: JSON file vs memory-mapped binary file.
+
+A full cache is built with the scripted gpac of benchmarks/fake_gpac (with many synthetic
+filters), then each format is loaded by fresh processes which look up the arguments and
+enum values of one filter. The load time and the peak RSS of these processes are reported.
+
+Usage:
+    python3 benchmarks/cache_format_bench.py [--filters N] [--runs N]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AUTOCOMPLETE_DIR = os.path.join(ROOT, "autocomplete")
+FAKE_GPAC_DIR = os.path.join(ROOT, "benchmarks", "fake_gpac")
+
+# run in a fresh interpreter: load the cache and look up one filter
+CHILD = """
+import json, resource, sys, time
+sys.path.insert(0, sys.argv[1])
+start = time.perf_counter()
+import cache_manager as cm
+cache = cm.Cache(sys.argv[2])
+cache.get_cache_list_args(sys.argv[3])
+cache.get_cache_list_values_enum_args(sys.argv[3])
+elapsed = time.perf_counter() - start
+print(json.dumps({"time": elapsed, "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+"""
+
+
+def run_child(path: str, gfilter: str, env: dict) -> dict:
+    output = subprocess.check_output([sys.executable, "-c", CHILD, AUTOCOMPLETE_DIR, path, gfilter], env=env)
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filters", type=int, default=500, help="number of synthetic filters")
+    parser.add_argument("--runs", type=int, default=20, help="number of loads per format")
+    options = parser.parse_args()
+
+    env = dict(os.environ, PATH=FAKE_GPAC_DIR + os.pathsep + os.environ.get("PATH", ""),
+               FAKE_GPAC_EXTRA_FILTERS=str(options.filters))
+    tmpdir = tempfile.mkdtemp()
+    try:
+        json_path = os.path.join(tmpdir, "gpac_autocomplete.json")
+        bin_path = os.path.join(tmpdir, "gpac_autocomplete.bin")
+        subprocess.check_call([sys.executable, "-c", "import sys; sys.path.insert(0, sys.argv[1]);"
+                               "import cache_manager as cm; cm.Cache(sys.argv[2]).warm();"
+                               "cm.Cache(sys.argv[3])", AUTOCOMPLETE_DIR, json_path, bin_path], env=env)
+
+        gfilter = f"zf{options.filters // 2:04d}"
+        print(f"cache with {options.filters} synthetic filters, lookup of {gfilter}, {options.runs} runs")
+        print(f"{'format':8} {'size (kB)':>10} {'load p50 (ms)':>14} {'load min (ms)':>14} {'peak RSS (MB)':>14}")
+        for name, path in (("json", json_path), ("binary", bin_path)):
+            results = [run_child(path, gfilter, env) for _ in range(options.runs)]
+            times = sorted(e["time"] * 1000 for e in results)
+            rss = max(e["rss"] for e in results) / 1024
+            print(f"{name:8} {os.path.getsize(path) / 1024:10.0f} {times[len(times) // 2]:14.2f} "
+                  f"{times[0]:14.2f} {rss:14.1f}")
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
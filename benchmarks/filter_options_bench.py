@@ -0,0 +1,83 @@
+#! /usr/bin/python3
+"""
+Benchmark of the completion of the options of filters with large option tables.
+
+For each size of option table, a synthetic filter is added to the scripted gpac of
+benchmarks/fake_gpac and its options are put in the cache. Then a fresh interpreter completes
+command lines setting many options of this filter, and reports the time of the first completion
+(including the loading of the cache and of the filter) and the median time of the next ones.
+
+Usage:
+    python3 benchmarks/filter_options_bench.py [--args N,N,...] [--runs N]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AUTOCOMPLETE_DIR = os.path.join(ROOT, "autocomplete")
+FAKE_GPAC_DIR = os.path.join(ROOT, "benchmarks", "fake_gpac")
+
+
+def lines(nb_args: int)-> list:
+    """
+    Command lines completed on the synthetic filter zf0000: a quarter of its options are set.
+    """
+    options = ":".join(f"opt{j}=1" if j % 5 else f"v0x{j}a" for j in range(1, nb_args, 4))
+    return [
+        ("all options", f"gpac zf0000:{options}:"),
+        ("option prefix", f"gpac zf0000:{options}:opt1"),
+        ("enum value", f"gpac zf0000:{options}:opt{nb_args - nb_args % 5 - 5}="),
+        ("value prefix", f"gpac zf0000:{options}:v0x"),
+    ]
+
+
+# run in a fresh interpreter: time the completions of a command line
+CHILD = """
+import json, sys, time
+sys.path[0] = sys.argv[1]
+import gpac_autocomplete as ga
+ga.CACHE_PATH = sys.argv[2]
+line, runs = sys.argv[3], int(sys.argv[4])
+times = []
+for _ in range(runs):
+    start = time.perf_counter()
+    completions = ga.generate_completions(line, len(line))
+    times.append(time.perf_counter() - start)
+print(json.dumps({"first": times[0], "next": sorted(times[1:])[len(times[1:]) // 2], "count": len(completions)}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--args", default="40,400,4000", help="sizes of the option tables")
+    parser.add_argument("--runs", type=int, default=200, help="number of completions per line")
+    options = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        print(f"{'options':>8} {'line':14} {'first (ms)':>11} {'next (us)':>10} {'completions':>12}")
+        for nb_args in [int(e) for e in options.args.split(",")]:
+            env = dict(os.environ, PATH=FAKE_GPAC_DIR + os.pathsep + os.environ.get("PATH", ""),
+                       FAKE_GPAC_EXTRA_FILTERS="1", FAKE_GPAC_EXTRA_ARGS=str(nb_args))
+            path = os.path.join(tmpdir, f"cache_{nb_args}.json")
+            subprocess.check_call([sys.executable, "-c", "import sys; sys.path.insert(0, sys.argv[1]);"
+                                   "import cache_manager as cm; cache = cm.Cache(sys.argv[2]);"
+                                   "cache.get_cache_list_filters(); cache.get_cache_list_args('zf0000');"
+                                   "cache.get_cache_list_props(); cache.flush()", AUTOCOMPLETE_DIR, path], env=env)
+            for name, line in lines(nb_args):
+                output = subprocess.check_output([sys.executable, "-c", CHILD, AUTOCOMPLETE_DIR, path, line,
+                                                  str(options.runs)], env=env)
+                result = json.loads(output)
+                print(f"{nb_args:8} {name:14} {result['first'] * 1000:11.2f} {result['next'] * 1e6:10.1f} "
+                      f"{result['count']:12}")
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+#! /usr/bin/python3
+"""
+Latency benchmark of the completions, run offline with the scripted gpac of benchmarks/fake_gpac.
+
+A representative set of command lines is completed in three modes:
+    python:      generate_completions is timed inside a fresh interpreter (cache loading included,
+                 interpreter startup excluded)
+    bash-native: the whole round trip is timed, from the Bash completion function of the installed
+                 scripts to the completions it returns, answered without Python when the lists of
+                 the Bash script allow it
+    bash-script: the same round trip, always through the script (GPAC_AC_NATIVE=0)
+
+and in three states of the cache:
+    cold:            no cache file
+    warm:            cache file and lists of the Bash script written by a previous completion of
+                     the same line through the script
+    version-changed: cache file filled for another version of gpac, whose binary was replaced
+
+For each line, mode and state, the p50/p99 latency, the number of gpac runs, the peak RSS of
+the completion processes and, in bash-native mode, the share of completions answered without
+Python are reported. By default the bash completions have no deadline
+(GPAC_AC_DEADLINE_MS=0), so that they are complete. With a deadline, the gpac runs of the
+background processes filling the cache are counted as well.
+
+Usage:
+    python3 benchmarks/latency_bench.py [--runs N] [--filters N] [--mode python|bash-native|bash-script|all]
+                                        [--state cold|warm|version-changed|all] [--deadline MS]
+                                        [--json FILE]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AUTOCOMPLETE_DIR = os.path.join(ROOT, "autocomplete")
+FAKE_GPAC_DIR = os.path.join(ROOT, "benchmarks", "fake_gpac")
+
+# command lines completed, the cursor being at the end of the line
+LINES = [
+    ("empty word", "gpac "),
+    ("filter prefix", "gpac ins"),
+    ("filter args", "gpac inspect:"),
+    ("enum values", "gpac inspect:mode="),
+    ("property", "gpac inspect:#Col"),
+    ("help topics", "gpac -h f"),
+    ("src= paths", "gpac src=media/"),
+]
+STATES = ["cold", "warm", "version-changed"]
+MODES = ["python", "bash-native", "bash-script"]
+
+# run in a fresh interpreter: time one completion
+CHILD = """
+import sys, time
+sys.path[0] = sys.argv[1]
+start = time.perf_counter()
+import gpac_autocomplete as ga
+completions = ga.generate_completions(sys.argv[2], len(sys.argv[2]))
+ga.engine.flush()
+print(time.perf_counter() - start)
+"""
+
+BASH = """
+source "$1/bash_gpac_autocomplete.sh"
+compopt() { :; }
+COMP_LINE="$2"
+COMP_POINT=${#COMP_LINE}
+_gpac_completion
+printf '%s\\n' "${COMPREPLY[@]}"
+"""
+
+# exits with 0 if the Bash hook answers the completion without Python
+NATIVE = """
+source "$1/bash_gpac_autocomplete.sh"
+_gpac_native_completion "$2" "${#2}"
+"""
+
+
+def percentile(values: list, p: float)-> float:
+    """
+    Nearest-rank percentile of a list of values.
+    """
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(len(values) * p / 100 + 0.5) - 1))]
+
+
+def run(args: list, env: dict, cwd: str)-> tuple:
+    """
+    Run a process and return its wall time, output and peak RSS (in kB, including the
+    processes it waited for).
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(args, env=env, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    output = process.stdout.read()
+    _, status, rusage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError(f"{args} failed with status {process.returncode}")
+    return elapsed, output.decode(), rusage.ru_maxrss
+
+
+class Bench:
+    """
+    Temporary installation of the scripts, with its own home directory and gpac binary.
+    """
+    def __init__(self, tmpdir: str, filters: int, deadline: float):
+        self.tmpdir = tmpdir
+        self.install_dir = os.path.join(tmpdir, "install")
+        self.bin_dir = os.path.join(tmpdir, "bin")
+        self.home = os.path.join(tmpdir, "home")
+        self.work_dir = os.path.join(tmpdir, "work")
+        self.log = os.path.join(tmpdir, "gpac.log")
+        self.cache_path = os.path.join(self.home, ".cache", "gpac", "gpac_autocomplete.json")
+        self.old_cache = os.path.join(tmpdir, "old_cache.json")
+
+        # same layout as install.sh
+        os.makedirs(self.install_dir)
+        shutil.copy(os.path.join(ROOT, "bash_gpac_autocomplete.sh"), self.install_dir)
+        for name in os.listdir(AUTOCOMPLETE_DIR):
+            if name.endswith(".py"):
+                shutil.copy(os.path.join(AUTOCOMPLETE_DIR, name), self.install_dir)
+        subprocess.check_call([sys.executable, "-m", "compileall", "-q", self.install_dir])
+        shutil.copytree(FAKE_GPAC_DIR, self.bin_dir)
+        os.makedirs(self.home)
+        os.makedirs(os.path.join(self.work_dir, "media", "clips"))
+        for i in range(50):
+            with open(os.path.join(self.work_dir, "media", f"video_{i:02d}.mp4"), "w", encoding="utf-8"):
+                pass
+
+        self.env = dict(os.environ, HOME=self.home, PATH=self.bin_dir + os.pathsep + os.environ.get("PATH", ""),
+                        FAKE_GPAC_LOG=self.log, FAKE_GPAC_EXTRA_FILTERS=str(filters),
+                        GPAC_AC_SOCKET=os.path.join(tmpdir, "no_daemon.sock"), GPAC_AC_DAEMON="0",
+                        GPAC_AC_DEADLINE_MS=str(deadline))
+        self.env.pop("FAKE_GPAC_VERSION", None)
+
+
+    def change_gpac(self, version: str|None)-> None:
+        """
+        Replace the gpac binary by one reporting another version.
+        """
+        gpac = os.path.join(self.bin_dir, "gpac")
+        shutil.copy(gpac, gpac + ".new")
+        os.replace(gpac + ".new", gpac)
+        if version is None:
+            self.env.pop("FAKE_GPAC_VERSION", None)
+        else:
+            self.env["FAKE_GPAC_VERSION"] = version
+
+
+    def prepare(self, state: str, line: str)-> None:
+        """
+        Put the cache in the given state before a completion of line.
+        """
+        # the files of the cache deleted by install.sh: the lists of the Bash script, the journal
+        # and the archived versions would otherwise serve or restore the entries of the last run
+        for path in [self.cache_path, self.cache_path + ".journal", os.path.join(os.path.dirname(self.cache_path),
+                     "gpac_autocomplete.lists")]:
+            if os.path.exists(path):
+                os.unlink(path)
+        shutil.rmtree(self.cache_path + ".versions", ignore_errors=True)
+        if state == "warm":
+            # as a completion of the Bash script, which also writes its lists
+            subprocess.check_call([sys.executable, "-S", "-E", os.path.join(self.install_dir, "gpac_autocomplete.py"),
+                                   str(len(line)), f'"{line}"'], env=self.env, cwd=self.work_dir,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            self.wait_background()
+        elif state == "version-changed":
+            shutil.copy(self.old_cache, self.cache_path)
+
+
+    def wait_background(self)-> None:
+        """
+        Wait for the detached processes filling the cache after a completion past its deadline.
+        """
+        if not os.path.isdir("/proc"):
+            return
+        # the script directory, the cache paths, then "--fill"
+        markers = [f"\0{self.install_dir}\0".encode(), f"\0{self.cache_path}\0".encode(), b"\0--fill\0"]
+        while True:
+            running = False
+            for pid in os.listdir("/proc"):
+                try:
+                    with open(f"/proc/{pid}/cmdline", "rb") as file:
+                        cmdline = file.read()
+                        running = all(e in cmdline for e in markers)
+                except (OSError, ValueError):
+                    continue
+                if running:
+                    break
+            if not running:
+                return
+            time.sleep(0.01)
+
+
+    def complete(self, mode: str, line: str)-> dict:
+        """
+        Complete line in the given mode and return its time, number of gpac runs, peak RSS and
+        whether the Bash hook answered it without Python.
+        """
+        if os.path.exists(self.log):
+            os.unlink(self.log)
+        native = False
+        if mode == "python":
+            elapsed, output, rss = run([sys.executable, "-S", "-E", "-c", CHILD, self.install_dir, line],
+                                       self.env, self.work_dir)
+            elapsed = float(output)
+        else:
+            env = dict(self.env, GPAC_AC_NATIVE="1" if mode == "bash-native" else "0")
+            if mode == "bash-native":
+                # checked before the completion, which may write the lists
+                native = subprocess.call(["bash", "--norc", "--noprofile", "-c", NATIVE, "bash", self.install_dir, line],
+                                         env=env, cwd=self.work_dir) == 0
+            elapsed, output, rss = run(["bash", "--norc", "--noprofile", "-c", BASH, "bash", self.install_dir, line],
+                                       env, self.work_dir)
+            self.wait_background()
+        runs = 0
+        if os.path.exists(self.log):
+            with open(self.log, encoding="utf-8") as file:
+                runs = sum(1 for _ in file)
+        return {"time": elapsed, "gpac_runs": runs, "rss": rss, "native": native}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20, help="number of completions per line, mode and state")
+    parser.add_argument("--filters", type=int, default=0, help="number of synthetic filters added to the fake gpac")
+    parser.add_argument("--mode", choices=MODES + ["all"], default="all")
+    parser.add_argument("--state", choices=STATES + ["all"], default="all")
+    parser.add_argument("--deadline", type=float, default=0, help="deadline of the bash mode completions in ms (0: none)")
+    parser.add_argument("--json", help="file in which the results are also written")
+    options = parser.parse_args()
+
+    modes = MODES if options.mode == "all" else [options.mode]
+    states = STATES if options.state == "all" else [options.state]
+    tmpdir = tempfile.mkdtemp()
+    results = []
+    try:
+        bench = Bench(tmpdir, options.filters, options.deadline)
+        if "version-changed" in states:
+            # cache of the whole previous version, then a new binary
+            bench.change_gpac("2.2-OLD")
+            subprocess.check_call([sys.executable, "-S", "-E", os.path.join(bench.install_dir, "gpac_autocomplete.py"),
+                                   "--warm"], env=bench.env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            shutil.copy(bench.cache_path, bench.old_cache)
+            bench.change_gpac(None)
+
+        print(f"{options.runs} runs per line, {options.filters} synthetic filters")
+        print(f"{'state':16} {'mode':11} {'line':14} {'p50 (ms)':>9} {'p99 (ms)':>9} {'gpac runs':>10} "
+              f"{'peak RSS (MB)':>14} {'native':>7}")
+        for state in states:
+            for mode in modes:
+                for name, line in LINES:
+                    samples = []
+                    for _ in range(options.runs):
+                        bench.prepare(state, line)
+                        samples.append(bench.complete(mode, line))
+                    times = [e["time"] * 1000 for e in samples]
+                    result = {
+                        "state": state, "mode": mode, "name": name, "line": line,
+                        "p50_ms": percentile(times, 50), "p99_ms": percentile(times, 99),
+                        "gpac_runs": sum(e["gpac_runs"] for e in samples) / len(samples),
+                        "peak_rss_mb": max(e["rss"] for e in samples) / 1024,
+                        "native": sum(e["native"] for e in samples) / len(samples),
+                    }
+                    results.append(result)
+                    print(f"{state:16} {mode:11} {name:14} {result['p50_ms']:9.2f} {result['p99_ms']:9.2f} "
+                          f"{result['gpac_runs']:10.1f} {result['peak_rss_mb']:14.1f} {result['native']:7.0%}")
+    finally:
+        shutil.rmtree(tmpdir)
+
+    if options.json:
+        with open(options.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#! /usr/bin/python3
+"""
+Benchmark of the completion of very long gpac pipelines.
+
+Command lines chaining more and more filters, each with long ":opt=value" strings and quoted
+values, are completed in a fresh interpreter whose cache is already filled. For each length,
+the median time of the tokenization alone and of the whole completion of the last word are
+reported, with their time per thousand characters: these stay flat when the completion is
+linear in the length of the line.
+
+Usage:
+    python3 benchmarks/long_line_bench.py [--chars N,N,...] [--runs N]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AUTOCOMPLETE_DIR = os.path.join(ROOT, "autocomplete")
+FAKE_GPAC_DIR = os.path.join(ROOT, "benchmarks", "fake_gpac")
+
+# one filter of the pipeline
+STAGE = 'inspect:deep:mode=pck:log="/tmp/inspect output.txt":fmt=%dts%-%cts% @ '
+
+
+def lines(chars: int)-> list:
+    """
+    Command lines of about chars characters, completing the last filter in several ways.
+    """
+    pipeline = "gpac -i input.mp4 " + STAGE * max(1, chars // len(STAGE))
+    return [
+        ("filter prefix", pipeline + "ins"),
+        ("filter args", pipeline + "inspect:"),
+        ("enum values", pipeline + "inspect:mode="),
+        ("open quote", pipeline + 'inspect:log="/tmp/x'),
+    ]
+
+
+# run in a fresh interpreter: time the tokenization and the completion of a command line
+CHILD = """
+import json, sys, time
+sys.path[0] = sys.argv[1]
+import gpac_autocomplete as ga
+from line_tokenizer import tokenize
+ga.CACHE_PATH = sys.argv[2]
+line, runs = sys.argv[3], int(sys.argv[4])
+ga.generate_completions(line, len(line))
+tokenize_times = []
+complete_times = []
+for _ in range(runs):
+    start = time.perf_counter()
+    tokenize(line, ga.help_flags)
+    tokenize_times.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    completions = ga.generate_completions(line, len(line))
+    complete_times.append(time.perf_counter() - start)
+median = lambda times: sorted(times)[len(times) // 2]
+print(json.dumps({"tokenize": median(tokenize_times), "complete": median(complete_times), "count": len(completions)}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chars", default="100,1000,10000,100000", help="lengths of the command lines")
+    parser.add_argument("--runs", type=int, default=50, help="number of completions per line")
+    options = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        env = dict(os.environ, PATH=FAKE_GPAC_DIR + os.pathsep + os.environ.get("PATH", ""), GPAC_AC_DEADLINE_MS="0")
+        path = os.path.join(tmpdir, "gpac_autocomplete.json")
+        subprocess.check_call([sys.executable, "-c", "import sys; sys.path.insert(0, sys.argv[1]);"
+                               "import cache_manager as cm; cm.Cache(sys.argv[2]).warm()", AUTOCOMPLETE_DIR, path],
+                              env=env, stdout=subprocess.DEVNULL)
+        print(f"{'chars':>7} {'line':14} {'tokenize (us)':>14} {'us/kchar':>9} {'complete (us)':>14} {'us/kchar':>9}")
+        for chars in [int(e) for e in options.chars.split(",")]:
+            for name, line in lines(chars):
+                output = subprocess.check_output([sys.executable, "-c", CHILD, AUTOCOMPLETE_DIR, path, line,
+                                                  str(options.runs)], env=env)
+                result = json.loads(output)
+                kchars = len(line) / 1000
+                print(f"{len(line):7} {name:14} {result['tokenize'] * 1e6:14.1f} {result['tokenize'] * 1e6 / kchars:9.1f} "
+                      f"{result['complete'] * 1e6:14.1f} {result['complete'] * 1e6 / kchars:9.1f}")
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
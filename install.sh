@@ -17,16 +17,38 @@ else
     fi
 fi
 
-# delete cache file
-rm -f ~/.cache/gpac/gpac_autocomplete.json
+# delete the cache files, in both formats, with their journal, archived versions and lock files
+for cache in ~/.cache/gpac/gpac_autocomplete.json ~/.cache/gpac/gpac_autocomplete.bin; do
+    rm -f "$cache" "$cache.journal" "$cache.lock" "$cache.keys.lock"
+    rm -rf "$cache.versions"
+done
+rm -f ~/.cache/gpac/gpac_autocomplete.lists
 
 # Copy the autocompletion script
 cp bash_gpac_autocomplete.sh "$INSTALL_DIR"
 cp autocomplete/cache_manager.py "$INSTALL_DIR"
+cp autocomplete/completion_trace.py "$INSTALL_DIR"
+cp autocomplete/completion_memo.py "$INSTALL_DIR"
+cp autocomplete/prefix_index.py "$INSTALL_DIR"
+cp autocomplete/line_tokenizer.py "$INSTALL_DIR"
+cp autocomplete/filter_descriptor.py "$INSTALL_DIR"
+cp autocomplete/cache_storage.py "$INSTALL_DIR"
+cp autocomplete/cache_versions.py "$INSTALL_DIR"
 cp autocomplete/gpac_autocomplete.py "$INSTALL_DIR"
+cp autocomplete/completion_daemon.py "$INSTALL_DIR"
+
+# Compile the scripts, so that completions do not compile them (and work with a read-only INSTALL_DIR)
+python3 -m py_compile "$INSTALL_DIR"/cache_manager.py "$INSTALL_DIR"/prefix_index.py "$INSTALL_DIR"/cache_storage.py \
+    "$INSTALL_DIR"/cache_versions.py "$INSTALL_DIR"/completion_trace.py "$INSTALL_DIR"/completion_memo.py \
+    "$INSTALL_DIR"/filter_descriptor.py "$INSTALL_DIR"/line_tokenizer.py "$INSTALL_DIR"/gpac_autocomplete.py "$INSTALL_DIR"/completion_daemon.py
 
 echo "Autocompletion script installed in $INSTALL_DIR"
 
+# Build the cache shared by all the users, so that their first completions do not run gpac
+if [ "$(id -u)" = "0" ] && command -v gpac > /dev/null; then
+    python3 "$INSTALL_DIR"/gpac_autocomplete.py --build-base
+fi
+
 # Reload the shell (optional)
 source "$HOME/.bashrc"
 
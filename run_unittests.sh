@@ -6,14 +6,24 @@ TEST_DIR="./unittests"
 # Add the autocomplete directory to the PYTHONPATH
 export PYTHONPATH="$PYTHONPATH:$(dirname "$0")/autocomplete"
 
+# With GPAC_AC_TEST_STUB=1, the tests run the scripted gpac of the benchmarks instead of the gpac
+# installed on the machine, e.g. where gpac is not installed
+if [ "$GPAC_AC_TEST_STUB" = "1" ]; then
+    export PATH="$(cd "$(dirname "$0")" && pwd)/benchmarks/fake_gpac:$PATH"
+fi
+
 # Check if the test directory exists
 if [ ! -d "$TEST_DIR" ]; then
     echo "Test directory $TEST_DIR does not exist."
     exit 1
 fi
 
-# delete cache file
-rm -f ~/.cache/gpac/gpac_autocomplete.json
+# delete the cache files, in both formats, with their journal, archived versions and lock files
+for cache in ~/.cache/gpac/gpac_autocomplete.json ~/.cache/gpac/gpac_autocomplete.bin; do
+    rm -f "$cache" "$cache.journal" "$cache.lock" "$cache.keys.lock"
+    rm -rf "$cache.versions"
+done
+rm -f ~/.cache/gpac/gpac_autocomplete.lists
 
 # Run the unit tests
 echo "Running unit tests..."
@@ -0,0 +1,124 @@
+"""
+Unit tests for the batch mode of the `autocomplete.gpac_autocomplete` script.
+The completions of the JSON requests read from the standard input must be the completions of
+the script, written as one JSON line per request, in order, as soon as they are computed, with
+an error for each invalid request, and the cache filled during the session must be written.
+When the version of gpac changes during the session, the cache must be rebuilt before answering.
+"""
+import unittest
+import os
+import json
+import time
+import shutil
+import subprocess
+import autocomplete.gpac_autocomplete as ga
+import autocomplete.cache_manager as cm
+from unittests import helpers
+
+list_tests = [
+    "gpac ",
+    "gpac ins",
+    "gpac inspect:",
+    "gpac inspect:deep:mode=",
+    'gpac inspect:log="out',
+    "gpac -h modules gm_",
+    "gpac -i vid",
+    "gpac httpin:src=vid",
+]
+
+
+class BatchModeTest(helpers.TempHomeTest):
+
+    def setUp(self):
+        super().setUp()
+        self.cwd = os.path.join(self.home, "media")
+        os.makedirs(self.cwd)
+        for name in ["video1.mp4", "video 2.mp4"]:
+            with open(os.path.join(self.cwd, name), "w", encoding="utf-8"):
+                pass
+
+    def start(self)-> subprocess.Popen:
+        return subprocess.Popen(helpers.script_command("--batch"), env=self.env,
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+
+    def test_batch(self):
+        requests = [{"line": line, "cursor": len(line), "cwd": self.cwd} for line in list_tests]
+        requests += [{"line": "gpac inspect:mode=pck", "cursor": 12, "id": "cut"}, {"line": "gpac ins"}]
+        process = self.start()
+        output, _ = process.communicate("".join(json.dumps(e) + "\n" for e in requests))
+        self.assertEqual(process.returncode, 0)
+        results = [json.loads(e) for e in output.splitlines()]
+        self.assertEqual(len(results), len(requests))
+        for request, result in zip(requests, results):
+            expected = ga.generate_completions(request["line"], request.get("cursor", len(request["line"])),
+                                               request.get("cwd", None))
+            self.assertEqual(result["completions"], expected, "Test failed: _" + request["line"] + "_")
+        self.assertEqual(results[-2]["id"], "cut")
+        self.assertIn("inspect:", results[-2]["completions"])
+        # the cache filled by the session is written
+        self.assertTrue(os.path.exists(self.cache_path))
+
+    def test_errors(self):
+        process = self.start()
+        output, _ = process.communicate('not json\n\n[1]\n{"line": "gpac ", "cursor": "5", "id": 7}\n'
+                                        '{"cursor": 5}\n{"line": "gpac -"}\n')
+        results = [json.loads(e) for e in output.splitlines()]
+        self.assertEqual(len(results), 5)
+        for result in results[:4]:
+            self.assertTrue(result["error"].startswith("invalid request"))
+        self.assertEqual(results[2]["id"], 7)
+        self.assertEqual(results[4], {"completions": ga.options})
+
+    def test_streaming(self):
+        # each result is written before the next request is read
+        process = self.start()
+        try:
+            for line in ["gpac -", "gpac ins", "gpac inspect:"]:
+                process.stdin.write(json.dumps({"line": line}) + "\n")
+                process.stdin.flush()
+                result = json.loads(process.stdout.readline())
+                self.assertEqual(result["completions"], ga.generate_completions(line, len(line)))
+        finally:
+            process.stdin.close()
+            process.wait()
+            process.stdout.close()
+
+    def test_version_change(self):
+        # a copy of the scripted gpac, upgraded in the middle of the session
+        bin_dir = helpers.copy_fake_gpac(os.path.join(self.home, "bin"))
+        self.use_fake_gpac(bin_dir)
+        self.env.pop("FAKE_GPAC_VERSION", None)
+        process = self.start()
+        try:
+            line = "gpac newf"
+            process.stdin.write(json.dumps({"line": line}) + "\n")
+            process.stdin.flush()
+            self.assertEqual(json.loads(process.stdout.readline())["completions"], [])
+
+            data_path = os.path.join(bin_dir, "gpac_data.json")
+            with open(data_path, encoding="utf-8") as file:
+                data = json.load(file)
+            data["version"] = "9.9-NEW"
+            data["filters"]["newflt"] = [["opt", "bool"]]
+            with open(data_path, "w", encoding="utf-8") as file:
+                json.dump(data, file)
+            # a new binary, checked once the fingerprint of the previous one is older than FINGERPRINT_TTL
+            gpac = os.path.join(bin_dir, "gpac")
+            shutil.copy2(gpac, gpac + ".new")
+            os.replace(gpac + ".new", gpac)
+            time.sleep(cm.FINGERPRINT_TTL + 0.1)
+
+            process.stdin.write(json.dumps({"line": line}) + "\n")
+            process.stdin.flush()
+            self.assertEqual(json.loads(process.stdout.readline())["completions"], ["newflt"])
+            # the rebuilt cache is written at once
+            with open(self.cache_path, encoding="utf-8") as file:
+                self.assertEqual(json.load(file)["version"], "9.9-NEW")
+        finally:
+            process.stdin.close()
+            process.wait()
+            process.stdout.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
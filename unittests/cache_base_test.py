@@ -0,0 +1,71 @@
+"""
+Unit tests for the base cache of `autocomplete.cache_manager`.
+A cache layered over a base cache built by the same gpac binary must answer from it without
+running gpac, and only keep the entries missing from it. A base cache of another build is ignored.
+"""
+import unittest
+import os
+import autocomplete.cache_manager as cm
+from unittests import helpers
+
+
+class CacheBaseTest(helpers.TempHomeTest):
+
+    def setUp(self):
+        super().setUp()
+        self.base = os.path.join(self.home, "base", "gpac_autocomplete_base.bin")
+        self.path = os.path.join(self.home, "user", "gpac_autocomplete.json")
+        os.makedirs(os.path.dirname(self.path))
+        self.log = os.path.join(self.home, "gpac.log")
+        self.use_fake_gpac()
+        self.ttl = cm.FINGERPRINT_TTL
+        cm.FINGERPRINT_TTL = 0
+        cm.build_base_cache(self.base, 2)
+        os.environ["FAKE_GPAC_LOG"] = self.log
+
+    def tearDown(self):
+        cm.FINGERPRINT_TTL = self.ttl
+        super().tearDown()
+
+    def test_built(self):
+        self.assertEqual(os.stat(self.base).st_mode & 0o777, 0o644)
+        self.assertEqual(os.listdir(os.path.dirname(self.base)), [os.path.basename(self.base)])
+
+    def test_overlay(self):
+        cache = cm.Cache(self.path, self.base)
+        self.assertIn("inspect", cache.get_cache_list_filters())
+        self.assertIn("mode", cache.get_cache_list_args("inspect"))
+        self.assertEqual(cache.get_cache_type_arg_filter("inspect", "mode")[0], "enum")
+        self.assertIn("pck", cache.get_cache_list_values_enum_args("inspect"))
+        self.assertEqual(helpers.gpac_runs(self.log), 0, "Test failed: _inspect_")
+        self.assertTrue(cache.flush())
+
+        # the entries of the base cache are not copied in the cache of the user
+        content = cm.Cache(self.path).content
+        self.assertEqual(content["version"], cache.get_gpac_version())
+        self.assertNotIn("filters", content["cache"])
+        self.assertNotIn("inspect", content["cache"].get("args", {}))
+
+    def test_miss(self):
+        # an entry missing from the base cache is fetched into the cache of the user only
+        os.environ["FAKE_GPAC_EXTRA_FILTERS"] = "1"
+        cache = cm.Cache(self.path, self.base)
+        self.assertNotIn("zf0000", cache.get_cache_list_filters())
+        self.assertIn("opt1", cache.get_cache_list_args("zf0000"))
+        self.assertTrue(cache.flush())
+        self.assertIn("zf0000", cm.Cache(self.path).content["cache"]["args"])
+        self.assertNotIn("zf0000", cm.Cache(self.base).content["cache"]["args"])
+
+    def test_other_build(self):
+        # another build of gpac: a copy of the binary reporting another version
+        self.use_fake_gpac(helpers.copy_fake_gpac(os.path.join(self.home, "2.3-B")))
+        os.environ["FAKE_GPAC_VERSION"] = "2.3-B"
+        cache = cm.Cache(self.path, self.base)
+        self.assertEqual(cache.get_gpac_version(), "2.3-B")
+        self.assertIn("inspect", cache.get_cache_list_filters())
+        self.assertGreater(helpers.gpac_runs(self.log), 0, "Test failed: _2.3-B_")
+        self.assertIn("filters", cache.content["cache"])
+
+
+if __name__ == '__main__':
+    unittest.main()
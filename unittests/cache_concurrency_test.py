@@ -0,0 +1,65 @@
+"""
+Unit tests for the concurrent use of a cache file by several processes, as done by many shells
+completing gpac commands at once.
+Every entry fetched by any process must be found in the cache file once all processes are done,
+and a corrupted cache file must be loaded as an empty cache.
+"""
+import unittest
+import os
+import tempfile
+import multiprocessing
+import autocomplete.cache_manager as cm
+
+NB_PROCESSES = 8
+FILTERS_PER_PROCESS = 3
+
+
+def fill(path: str, filters: list)-> None:
+    cache = cm.Cache(path)
+    for gfilter in filters:
+        cache.get_cache_list_args(gfilter)
+        cache.flush()
+    while cache.dirty:
+        cache.flush()
+
+
+class CacheConcurrencyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_concurrent_writers(self):
+        for name in ["gpac_autocomplete.json", "gpac_autocomplete.bin"]:
+            path = os.path.join(self.tmpdir.name, name)
+            filters = cm.fetch_list_filters()[:NB_PROCESSES * FILTERS_PER_PROCESS]
+            ctx = multiprocessing.get_context("fork")
+            processes = [ctx.Process(target=fill, args=(path, filters[i::NB_PROCESSES]))
+                         for i in range(NB_PROCESSES)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+                self.assertEqual(process.exitcode, 0, "Test failed: _" + name + "_")
+
+            cache = cm.Cache(path)
+            args = cache.content["cache"]["args"]
+            self.assertEqual(sorted(args), sorted(filters), "Test failed: _" + name + "_")
+            for gfilter in filters:
+                self.assertEqual(args[gfilter], cm.fetch_list_args(gfilter), "Test failed: _" + gfilter + "_")
+
+    def test_corrupted_file(self):
+        for name in ["gpac_autocomplete.json", "gpac_autocomplete.bin"]:
+            path = os.path.join(self.tmpdir.name, name)
+            with open(path, "wb") as file:
+                file.write(b'{"version": "2.')
+            cache = cm.Cache(path)
+            self.assertIn("inspect", cache.get_cache_list_filters(), "Test failed: _" + name + "_")
+            self.assertTrue(cache.flush())
+            self.assertIn("inspect", cm.Cache(path).get_cache_list_filters(), "Test failed: _" + name + "_")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+"""
+Unit tests for the deferred saving of the `Cache` class of the `autocomplete.cache_manager` module.
+Cache misses must only mark the cache as changed, and the cache file must be written once,
+when the cache is flushed.
+"""
+import unittest
+import os
+import tempfile
+import autocomplete.cache_manager as cm
+
+
+class CacheFlushTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "gpac_autocomplete.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_flush(self):
+        cache = cm.Cache(self.path)
+        writes = []
+        save = cache.storage.save
+        cache.storage.save = lambda content: (writes.append(1), save(content))
+
+        cache.get_cache_list_filters()
+        cache.get_cache_list_values_enum_args("inspect")
+        cache.get_cache_list_values_enum_args("routein")
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIn(("args", "inspect"), cache.dirty)
+
+        self.assertTrue(cache.flush())
+        self.assertEqual(len(writes), 1)
+        self.assertFalse(cache.dirty)
+        self.assertFalse(cache.flush())
+        self.assertEqual(len(writes), 1)
+
+        # cache hits do not change the cache
+        cache.get_cache_list_values_enum_args("inspect")
+        self.assertFalse(cache.dirty)
+
+        reloaded = cm.Cache(self.path)
+        self.assertEqual(reloaded.get_cache_list_args("routein"), cache.get_cache_list_args("routein"))
+        self.assertFalse(reloaded.dirty)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+"""
+Unit tests for the journal of the cache files of the `autocomplete.cache_storage` module.
+New entries must be appended to the journal without rewriting the snapshot, until the journal
+is compacted, and a journal truncated at any offset (e.g. by a crash during a write) must load
+as the snapshot followed by the records written entirely before that offset.
+"""
+import unittest
+import os
+import random
+import shutil
+import tempfile
+import autocomplete.cache_storage as cs
+import autocomplete.cache_manager as cm
+
+
+def snapshot()-> dict:
+    return {
+        "version": "2.5-DEV",
+        "fingerprint": None,
+        "cache": {"filters": ["inspect", "routein"], "args": {"inspect": {"deep": "bool"}}},
+    }
+
+
+def record(i: int)-> list:
+    return ["args", f"zf{i:04}", {f"opt{j}": "str" for j in range(i % 4)}]
+
+
+class CacheJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_append(self):
+        path = os.path.join(self.tmpdir.name, "gpac_autocomplete.json")
+        cache = cm.Cache(path)
+        cache.get_cache_list_args("inspect")
+        self.assertTrue(cache.flush())
+        signature = cs.file_signature(path)
+
+        # a new entry is appended to the journal, the snapshot is left as is
+        cache.get_cache_list_args("routein")
+        self.assertTrue(cache.flush())
+        self.assertEqual(cs.file_signature(path), signature)
+        reloaded = cm.Cache(path).content["cache"]["args"]
+        self.assertIn("inspect", reloaded)
+        self.assertIn("routein", reloaded)
+
+        # past the size of the journal, the cache is compacted into a new snapshot
+        cache.storage.max_size = os.path.getsize(path + ".journal") + 10
+        cache.get_cache_list_args("httpin")
+        self.assertTrue(cache.flush())
+        self.assertNotEqual(cs.file_signature(path), signature)
+        self.assertEqual(cache.storage.journal.read()[1], [])
+        self.assertIn("httpin", cm.Cache(path).content["cache"]["args"])
+
+    def test_truncated(self):
+        rand = random.Random(0)
+        for name in ["cache.json", "cache.bin"]:
+            path = os.path.join(self.tmpdir.name, name)
+            storage = cs.get_storage(path)
+            content = snapshot()
+            storage.save(content)
+            ends = []
+            for i in range(20):
+                self.assertTrue(storage.append(content, [record(i)]))
+                ends.append(os.path.getsize(storage.journal.path))
+            with open(storage.journal.path, "rb") as file:
+                journal = file.read()
+
+            crash_dir = os.path.join(self.tmpdir.name, "crash")
+            crash = os.path.join(crash_dir, name)
+            for offset in [0, 1, ends[0] - 1, ends[0], ends[-1] - 1] + rand.sample(range(ends[-1]), 30):
+                os.makedirs(crash_dir)
+                shutil.copy(path, crash)
+                with open(crash + ".journal", "wb") as file:
+                    file.write(journal[:offset])
+
+                # the records written entirely before the offset are loaded, in order
+                written = sum(1 for e in ends if e <= offset)
+                crashed = cs.get_storage(crash)
+                loaded = cs.to_builtin(crashed.load())
+                self.assertEqual(sorted(loaded["cache"]["args"]),
+                                 sorted(["inspect"] + [record(i)[1] for i in range(written)]),
+                                 "Test failed: _" + name + " " + str(offset) + "_")
+
+                # the next writer cuts the torn record off
+                self.assertTrue(crashed.append(loaded, [record(99)]))
+                loaded = cs.to_builtin(crashed.load())
+                self.assertIn("zf0099", loaded["cache"]["args"])
+                self.assertEqual(len(loaded["cache"]["args"]), written + 2)
+                shutil.rmtree(crash_dir)
+
+    def test_other_snapshot(self):
+        path = os.path.join(self.tmpdir.name, "cache.json")
+        storage = cs.get_storage(path)
+        content = snapshot()
+        storage.save(content)
+        self.assertTrue(storage.append(content, [record(1)]))
+        with open(storage.journal.path, "rb") as file:
+            journal = file.read()
+
+        # the journal of a previous snapshot is ignored, then replaced by the next writer
+        content = snapshot()
+        storage.save(content)
+        with open(storage.journal.path, "wb") as file:
+            file.write(journal)
+        self.assertNotIn("zf0001", storage.load()["cache"]["args"])
+        self.assertTrue(storage.append(content, [record(2)]))
+        self.assertEqual(sorted(storage.load()["cache"]["args"]), ["inspect", "zf0002"])
+
+
+if __name__ == '__main__':
+    unittest.main()
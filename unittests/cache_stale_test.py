@@ -0,0 +1,78 @@
+"""
+Unit tests for the stale entries of the `autocomplete.cache_manager.Cache` class.
+When the version of gpac changes, the entries of the previous version must be served until the
+cache is rebuilt for the new version, the stale cache file must not be written, and the rebuilt
+cache must replace it in a single write.
+"""
+import unittest
+import os
+import json
+import time
+import autocomplete.cache_manager as cm
+from unittests import helpers
+
+
+class CacheStaleTest(helpers.TempHomeTest):
+
+    def setUp(self):
+        super().setUp()
+        self.path = self.cache_path
+        os.makedirs(os.path.dirname(self.path))
+        # cache of a previous version of gpac, knowing one more filter
+        self.filters = cm.fetch_list_filters()
+        content = {"version": "2.2-OLD", "fingerprint": None, "cache": {"filters": self.filters + ["oldfilter"]}}
+        with open(self.path, "w", encoding="utf-8") as file:
+            json.dump(content, file)
+        self.ttl = cm.FINGERPRINT_TTL
+        cm.FINGERPRINT_TTL = 0
+
+    def tearDown(self):
+        cm.FINGERPRINT_TTL = self.ttl
+        super().tearDown()
+
+    def test_stale(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        cache = cm.Cache(self.path)
+        self.assertIn("oldfilter", cache.get_cache_list_filters())
+        self.assertEqual(cache.stale, "2.2-OLD")
+        self.assertEqual(cache.missed, ["cache"])
+        # a miss is fetched from the new version, but not written in the stale file
+        self.assertIn("deep", cache.get_cache_list_args("inspect"))
+        self.assertFalse(cache.flush())
+        self.assertEqual(os.stat(self.path).st_mtime_ns, mtime)
+
+        rebuilder = cm.Cache(self.path)
+        self.assertTrue(rebuilder.fill(["cache"]))
+        self.assertIsNone(rebuilder.stale)
+        with open(self.path, encoding="utf-8") as file:
+            content = json.load(file)
+        self.assertEqual(content["version"], cache.get_gpac_version())
+        self.assertEqual(content["cache"]["filters"], self.filters)
+        self.assertIn("inspect", content["cache"]["args"])
+
+        # switch to the rebuilt cache
+        self.assertEqual(cache.get_cache_list_filters(), self.filters)
+        self.assertIsNone(cache.stale)
+
+        # nothing to rebuild anymore
+        mtime = os.stat(self.path).st_mtime_ns
+        self.assertTrue(cm.Cache(self.path).fill(["cache"]))
+        self.assertEqual(os.stat(self.path).st_mtime_ns, mtime)
+
+    def test_background_rebuild(self):
+        self.env["GPAC_AC_DEADLINE_MS"] = "0"
+        line = "gpac old"
+        self.assertEqual(self.complete(line), ["oldfilter"])
+
+        for _ in range(100):
+            with open(self.path, encoding="utf-8") as file:
+                if json.load(file)["version"] != "2.2-OLD":
+                    break
+            time.sleep(0.1)
+        while cm.Cache(self.path).is_filling("cache"):
+            time.sleep(0.1)
+        self.assertEqual(self.complete(line), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
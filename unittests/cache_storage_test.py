@@ -0,0 +1,68 @@
+"""
+Unit tests for the `autocomplete.cache_storage` module.
+A cache content saved in any format must be loaded back unchanged, and the binary format
+must migrate the content of the JSON file of the same name.
+"""
+import unittest
+import os
+import tempfile
+import autocomplete.cache_storage as cs
+
+content = {
+    "version": "2.5-DEV",
+    "fingerprint": {"gpac": ["/usr/bin/gpac", 12, 3456, 789], "libgpac": None},
+    "cache": {
+        "filters": ["inspect", "routein", "j2kdec"],
+        "modules": ["gm_alsa.so"],
+        "props": ["FileName", "FileNumber"],
+        "protocols": {"http": {"input": ["httpin"], "output": ["httpout"]}},
+        "args": {"inspect": {"deep": "bool", "mode": "enum"}, "routein": {"repair": "enum"}, "j2kdec": {}},
+        "type_arg_filter": {"inspect.mode": {"type": "enum", "values": ["pck", "blk"]}},
+        "enum_values": {"inspect": {"pck": "mode", "blk": "mode"}, "j2kdec": {}},
+        "index": {"filters": [0, 2, 1]},
+    },
+}
+
+
+class CacheStorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self):
+        for name in ["cache.json", "other.bin"]:
+            storage = cs.get_storage(os.path.join(self.tmpdir.name, name))
+            self.assertIsNone(storage.load())
+            storage.save(content)
+            loaded = storage.load()
+            self.assertEqual(cs.to_builtin(loaded), content, "Test failed: _" + name + "_")
+
+            # save again after partial access and changes
+            loaded["cache"]["args"]["httpin"] = {"cache": "enum"}
+            del loaded["cache"]["enum_values"]["j2kdec"]
+            storage.save(loaded)
+            expected = cs.to_builtin(loaded)
+            self.assertEqual(cs.to_builtin(storage.load()), expected, "Test failed: _" + name + "_")
+
+    def test_binary_lookup(self):
+        storage = cs.BinaryStorage(os.path.join(self.tmpdir.name, "cache.bin"))
+        storage.save(content)
+        loaded = storage.load()
+        self.assertEqual(loaded["version"], "2.5-DEV")
+        self.assertEqual(loaded["cache"]["args"].get("routein"), {"repair": "enum"})
+        self.assertIsNone(loaded["cache"]["args"].get("httpin"))
+        self.assertNotIn("httpin", loaded["cache"]["args"])
+        self.assertEqual(list(loaded["cache"]["args"]), ["inspect", "j2kdec", "routein"])
+
+    def test_migration(self):
+        cs.JsonStorage(os.path.join(self.tmpdir.name, "cache.json")).save(content)
+        path = os.path.join(self.tmpdir.name, "cache.bin")
+        self.assertEqual(cs.to_builtin(cs.BinaryStorage(path).load()), content)
+        self.assertTrue(os.path.isfile(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+Unit tests for the `autocomplete.cache_versions` module.
+Switching between several gpac builds must restore the cache of the build found in PATH without
+running it, and the least recently used versions must be evicted beyond the limits of the store.
+"""
+import unittest
+import os
+import time
+import autocomplete.cache_manager as cm
+import autocomplete.cache_versions as cv
+from unittests import helpers
+
+
+class CacheVersionsTest(helpers.TempHomeTest):
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.home, "gpac_autocomplete.json")
+        self.log = os.path.join(self.home, "gpac.log")
+        # two builds of gpac: copies of the binary reporting different versions
+        self.builds = {version: helpers.copy_fake_gpac(os.path.join(self.home, version))
+                       for version in ["2.2-A", "2.3-B"]}
+        self.ttl = cm.FINGERPRINT_TTL
+        cm.FINGERPRINT_TTL = 0
+
+    def tearDown(self):
+        cm.FINGERPRINT_TTL = self.ttl
+        super().tearDown()
+
+    def use(self, version: str):
+        self.use_fake_gpac(self.builds[version])
+        os.environ["FAKE_GPAC_VERSION"] = version
+        os.environ["FAKE_GPAC_LOG"] = self.log
+        if os.path.exists(self.log):
+            os.unlink(self.log)
+
+    def check_switch(self, path: str):
+        self.use("2.2-A")
+        cache = cm.Cache(path)
+        args = cache.get_cache_list_args("inspect")
+        self.assertTrue(cache.flush())
+
+        # another build: the cache of 2.2-A is served stale, then archived by the rebuild
+        self.use("2.3-B")
+        cache = cm.Cache(path)
+        self.assertEqual(cache.get_cache_list_args("inspect"), args)
+        self.assertEqual(cache.stale, "2.2-A")
+        self.assertTrue(cm.Cache(path).fill(["cache"]))
+        store = cv.VersionStore(path)
+        self.assertTrue(store.has("2.2-A"))
+        self.assertEqual(cm.Cache(path).content["version"], "2.3-B")
+
+        # back to the first build: its cache is restored without running gpac
+        self.use("2.2-A")
+        cache = cm.Cache(path)
+        self.assertEqual(cache.get_cache_list_args("inspect"), args)
+        self.assertIsNone(cache.stale)
+        self.assertEqual(helpers.gpac_runs(self.log), 0, "Test failed: _" + path + "_")
+        self.assertEqual(cm.Cache(path).content["version"], "2.2-A")
+        self.assertTrue(store.has("2.3-B"))
+        self.assertFalse(store.has("2.2-A"))
+
+        # a long-running process follows PATH
+        self.use("2.3-B")
+        self.assertEqual(cache.get_gpac_version(), "2.3-B")
+        self.assertIsNone(cache.stale)
+        self.assertEqual(cache.content["version"], "2.3-B")
+        self.assertIn("inspect", cache.content["cache"]["args"])
+        self.assertEqual(helpers.gpac_runs(self.log), 0, "Test failed: _" + path + "_")
+
+    def test_switch(self):
+        for name in ["gpac_autocomplete.json", "gpac_autocomplete.bin"]:
+            # in distinct directories: a missing binary cache is migrated from the JSON one
+            self.check_switch(os.path.join(self.home, "cache_" + name.split(".")[1], name))
+
+    def test_eviction(self):
+        store = cv.VersionStore(self.path, max_versions=3)
+        for version in ["1.0", "1.1", "1.2", "1.3"]:
+            with open(self.path, "w", encoding="utf-8") as file:
+                file.write(f'{{"version": "{version}"}}')
+            store.archive(version, {"gpac": [version]})
+            time.sleep(0.01)
+        self.assertEqual(sorted(store.load_index()), ["1.2", "1.3"])
+        self.assertFalse(store.has("1.0"))
+        self.assertEqual(store.find({"gpac": ["1.3"]}), "1.3")
+        self.assertIsNone(store.find({"gpac": ["1.0"]}))
+
+        store.max_bytes = os.path.getsize(store.file("1.3"))
+        store.archive("1.4", None)
+        self.assertEqual(sorted(store.load_index()), ["1.4"])
+
+    def test_library_path(self):
+        # the same binary, with two libgpac selected by LD_LIBRARY_PATH
+        self.use("2.2-A")
+        libs = {}
+        for name in ["lib1", "lib2"]:
+            libs[name] = os.path.join(self.home, name)
+            os.makedirs(libs[name])
+            with open(os.path.join(libs[name], "libgpac.so"), "w", encoding="utf-8") as file:
+                file.write(name)
+        os.environ["LD_LIBRARY_PATH"] = libs["lib1"]
+        first = cm.get_gpac_fingerprint()
+        self.assertEqual(first["libgpac"][0], os.path.join(libs["lib1"], "libgpac.so"))
+        self.assertEqual(cm.get_gpac_fingerprint(first), first)
+
+        os.environ["LD_LIBRARY_PATH"] = libs["lib2"]
+        second = cm.get_gpac_fingerprint(first)
+        self.assertEqual(second["libgpac"][0], os.path.join(libs["lib2"], "libgpac.so"))
+        self.assertNotEqual(second, first)
+
+    def test_file_name(self):
+        self.assertEqual(cv.file_name("2.5-DEV-rev12"), "gpac-2.5-DEV-rev12")
+        self.assertNotEqual(cv.file_name("2.5 DEV"), cv.file_name("2.5_DEV"))
+        self.assertNotIn("/", cv.file_name("../2.5/x"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Unit tests for the `completion_daemon` module.
+This test suite starts a daemon on a temporary socket and checks that the completions it
+serves are the same as the ones computed by `generate_completions`, and that a single daemon
+runs per socket.
+"""
+import unittest
+import io
+import os
+import sys
+import time
+import tempfile
+import subprocess
+import contextlib
+import autocomplete.gpac_autocomplete as ga
+import autocomplete.completion_daemon as cd
+import autocomplete.cache_storage as cs
+
+list_tests = [
+    "gpac -h inspect.d",
+    "gpac routein:repair=",
+    "gpac inspect:f",
+    "gpac -h module gm_",
+    "gpac -o h",
+    "gpac inspect:#Color",
+]
+
+
+class CompletionDaemonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "gpac_autocomplete.sock")
+        script = os.path.join(os.path.dirname(ga.__file__), "completion_daemon.py")
+        env = dict(os.environ, GPAC_AC_SOCKET=self.path, GPAC_AC_DAEMON_IDLE="20")
+        self.daemon = subprocess.Popen([sys.executable, script], env=env)
+        for _ in range(100):
+            if cd.is_running(self.path):
+                break
+            time.sleep(0.05)
+
+    def tearDown(self):
+        self.daemon.kill()
+        self.daemon.wait()
+        self.tmpdir.cleanup()
+
+    def test_daemon_completions(self):
+        for test in list_tests:
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                status = cd.query(len(test), test, self.path)
+            self.assertEqual(status, 0, "Test failed: _" + test + "_")
+            res = output.getvalue().split("\n")[:-1]
+            self.assertEqual(res, ga.generate_completions(test, len(test)), "Test failed: _" + test + "_")
+
+    def test_no_daemon(self):
+        self.assertEqual(cd.query(6, "gpac -", os.path.join(self.tmpdir.name, "none.sock")), 1)
+
+    def test_single_daemon(self):
+        # another daemon is starting on the socket: this one exits, leaving the socket alone
+        path = os.path.join(self.tmpdir.name, "starting.sock")
+        open(path, "w").close()
+        script = os.path.join(os.path.dirname(ga.__file__), "completion_daemon.py")
+        env = dict(os.environ, GPAC_AC_SOCKET=path, GPAC_AC_DAEMON_IDLE="20")
+        with cs.FileLock(path, timeout=0) as locked:
+            self.assertTrue(locked)
+            daemon = subprocess.Popen([sys.executable, script], env=env)
+            try:
+                self.assertEqual(daemon.wait(10), 0)
+            finally:
+                daemon.kill()
+                daemon.wait()
+        self.assertTrue(os.path.isfile(path))
+        self.assertFalse(cd.is_running(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+Unit tests for the deadline of the completions of the `autocomplete.gpac_autocomplete` script.
+With a slow gpac, a completion must return before the deadline with what the cache holds, and
+a background process must fill the cache for the next completion. An entry being fetched by
+another process must not be fetched again, and the output must end before the cache is written.
+"""
+import unittest
+import os
+import time
+import subprocess
+import autocomplete.cache_manager as cm
+import autocomplete.cache_storage as cs
+from unittests import helpers
+
+DELAY = "0.3"
+
+
+class CompletionDeadlineTest(helpers.TempHomeTest):
+
+    def setUp(self):
+        super().setUp()
+        self.log = os.path.join(self.home, "gpac.log")
+        self.use_fake_gpac()
+        self.env.update(FAKE_GPAC_DELAY=DELAY, FAKE_GPAC_LOG=self.log)
+
+    def tearDown(self):
+        cm.set_deadline(None)
+        super().tearDown()
+
+    def complete_before(self, line: str, deadline_ms: str)-> tuple:
+        self.env["GPAC_AC_DEADLINE_MS"] = deadline_ms
+        start = time.monotonic()
+        completions = self.complete(line)
+        return completions, time.monotonic() - start
+
+    def wait_for_args(self, gfilter: str)-> dict|None:
+        for _ in range(100):
+            if os.path.exists(self.cache_path):
+                args = (cm.Cache(self.cache_path).content.get("cache", None) or {}).get("args", {})
+                if gfilter in args:
+                    return args
+            time.sleep(0.1)
+        return None
+
+    def test_partial_then_filled(self):
+        # filters known, arguments of inspect missing
+        cache = cm.Cache(self.cache_path)
+        filters = cache.get_cache_list_filters()
+        cache.flush()
+
+        completions, elapsed = self.complete_before("gpac insp", "50")
+        self.assertEqual(completions, [e for e in filters if e.startswith("insp")])
+        completions, elapsed = self.complete_before("gpac inspect:", "50")
+        # the filter name, without the gpac request
+        self.assertLess(elapsed, float(DELAY) + 0.2)
+        self.assertNotIn("deep", completions)
+
+        self.assertIsNotNone(self.wait_for_args("inspect"))
+        os.unlink(self.log)
+        completions, _ = self.complete_before("gpac inspect:", "50")
+        self.assertIn("deep", completions)
+        self.assertFalse(os.path.exists(self.log))
+
+    def test_output_ended(self):
+        # the cache file is locked by another process: the completions are read before the
+        # script gives up writing the cache
+        self.env["GPAC_AC_DEADLINE_MS"] = "0"
+        with cs.FileLock(self.cache_path) as locked:
+            self.assertTrue(locked)
+            process = subprocess.Popen(helpers.script_command("5", '"gpac "'), env=self.env, stdout=subprocess.PIPE)
+            completions = process.stdout.read().decode().splitlines()
+            ended = time.monotonic()
+            process.wait()
+            exited = time.monotonic()
+            process.stdout.close()
+        self.assertIn("inspect", completions)
+        self.assertGreater(exited - ended, cs.LOCK_TIMEOUT / 2)
+
+    def test_deadline_passed(self):
+        cm.set_deadline(time.monotonic() - 1)
+        with self.assertRaises(cm.DeadlineExceeded):
+            cm.run_gpac(["-h", "filters"])
+        cm.set_deadline(None)
+        self.assertIn("inspect", cm.fetch_list_filters())
+
+    def test_missed(self):
+        cache = cm.Cache(self.cache_path)
+        cache.get_cache_list_filters()
+        cm.set_deadline(time.monotonic() - 1)
+        with self.assertRaises(TimeoutError):
+            cache.get_cache_list_args("inspect")
+        self.assertEqual(cache.missed, ["args.inspect"])
+
+        cm.set_deadline(None)
+        self.assertTrue(cache.fill(cache.missed))
+        self.assertIn("deep", cache.content["cache"]["args"]["inspect"])
+
+    def test_single_filler(self):
+        cache = cm.Cache(self.cache_path)
+        cache.get_cache_list_filters()
+        cache.flush()
+        # the key is locked by another process while it fetches it
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            lock = cs.KeyLock(self.cache_path, "args.inspect", timeout=0)
+            os.write(write, b"1" if lock.acquire() else b"0")
+            time.sleep(1)
+            os._exit(0)
+        try:
+            self.assertEqual(os.read(read, 1), b"1")
+            self.assertTrue(cache.is_filling("args.inspect"))
+            self.assertFalse(cache.is_filling("args.compositor"))
+            self.assertFalse(cache.fill(["args.inspect"]))
+            self.assertNotIn("inspect", cache.content["cache"].get("args", {}))
+        finally:
+            os.waitpid(pid, 0)
+            os.close(read)
+            os.close(write)
+        self.assertFalse(cache.is_filling("args.inspect"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+"""
+Unit tests for the `CompletionEngine` class of the `autocomplete.gpac_autocomplete` module.
+Completions run by many threads at once on the same engine, from a cold cache, must be the
+completions computed one at a time, and the state of a completion (closing quote, truncated
+paths, deadline) must not leak into the completions running at the same time or around it.
+A live engine must follow the version of gpac, and get its cache rebuilt when it changes.
+"""
+import unittest
+import os
+import time
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import autocomplete.gpac_autocomplete as ga
+import autocomplete.cache_manager as cm
+from unittests import helpers
+
+THREADS = 16
+
+list_tests = [
+    "gpac ",
+    "gpac ins",
+    "gpac inspect:",
+    "gpac inspect:mode=",
+    "gpac inspect:deep:mode=pck:#Col",
+    'gpac inspect:log="out',
+    "gpac inspect:log=out",
+    "gpac -h inspect.d",
+    "gpac -h modules gm_",
+    "gpac -h props Wi",
+    "gpac routein:repair=",
+    "gpac -o http",
+    "gpac -i seg",
+    "gpac -i seg1",
+    "gpac httpin:src=f",
+]
+
+
+class CompletionEngineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cwd = os.path.join(self.tmpdir.name, "media")
+        os.makedirs(self.cwd)
+        for i in range(12):
+            with open(os.path.join(self.cwd, f"seg{i}.m4s"), "w", encoding="utf-8"):
+                pass
+        self.max_results = ga.PATH_MAX_RESULTS
+        ga.PATH_MAX_RESULTS = 5
+
+    def tearDown(self):
+        ga.PATH_MAX_RESULTS = self.max_results
+        self.tmpdir.cleanup()
+
+    def engine(self, name: str)-> ga.CompletionEngine:
+        return ga.CompletionEngine(os.path.join(self.tmpdir.name, name, "gpac_autocomplete.json"), "")
+
+    def test_threads(self):
+        sequential = self.engine("sequential")
+        expected = {line: sequential.generate_completions(line, len(line), self.cwd) for line in list_tests}
+        self.assertEqual(expected["gpac -i seg"], ga.too_many_matches)
+
+        engine = self.engine("concurrent")
+        barrier = threading.Barrier(THREADS)
+
+        def run(index: int)-> list:
+            barrier.wait()
+            results = []
+            for round in range(20):
+                for i in range(len(list_tests)):
+                    line = list_tests[(i + index + round) % len(list_tests)]
+                    complete = engine.complete if (index + i) % 2 else engine.generate_completions
+                    results.append((line, complete(line, len(line), self.cwd)))
+            return results
+
+        with ThreadPoolExecutor(max_workers=THREADS) as pool:
+            for results in pool.map(run, range(THREADS)):
+                for line, completions in results:
+                    self.assertEqual(completions, expected[line], "Test failed: _" + line + "_")
+        self.assertGreater(engine.memo.hits, 0)
+
+    def test_reentrant(self):
+        engine = self.engine("reentrant")
+        outer = 'gpac inspect:log="out'
+        expected = engine.generate_completions(outer, len(outer))
+        inner = "gpac -i seg"
+        nested = []
+
+        # a completion started in the middle of another one, e.g. by a callback
+        get_index = engine.get_index
+        def reentrant_get_index(name, source):
+            if not nested:
+                nested.append(None)
+                nested[0] = engine.generate_completions(inner, len(inner), self.cwd)
+            return get_index(name, source)
+        engine.get_index = reentrant_get_index
+        engine.descriptors.clear()
+
+        self.assertEqual(engine.generate_completions(outer, len(outer)), expected)
+        self.assertEqual(nested, [ga.too_many_matches])
+
+    def test_deadlines(self):
+        engine = self.engine("deadlines")
+        line = "gpac inspect:"
+        passed = []
+        thread = threading.Thread(target=lambda: passed.append(
+            engine.generate_completions(line, len(line), None, time.monotonic() - 1)))
+        thread.start()
+        thread.join()
+        # gpac could not be run past the deadline of the other thread, but can be by this one
+        self.assertEqual(passed, [[]])
+        self.assertIn("deep", engine.generate_completions(line, len(line)))
+
+    def test_partial(self):
+        engine = self.engine("partial")
+        filled = []
+        engine.fill_in_background = lambda names, pos, command_line: filled.extend(names)
+        line = "gpac inspect:"
+        # the arguments of inspect could not be fetched before the deadline: the completions are not memoized
+        self.assertEqual(engine.complete(line, len(line), self.cwd, time.monotonic() - 1), [])
+        expected = engine.generate_completions(line, len(line), self.cwd)
+        self.assertIn("deep", expected)
+        self.assertEqual(engine.complete(line, len(line), self.cwd), expected)
+        self.assertEqual(engine.complete(line, len(line), self.cwd, time.monotonic() - 1), expected)
+        # the missed entries were handed to a background process
+        self.assertIn("filters", filled)
+
+    def test_version_change(self):
+        # two builds of gpac, the second one with more filters
+        builds = {version: helpers.copy_fake_gpac(os.path.join(self.tmpdir.name, "gpac-" + version))
+                  for version in ["1.0", "2.0"]}
+        environ = dict(os.environ)
+
+        def use(version: str, filters: int):
+            os.environ["PATH"] = builds[version] + os.pathsep + environ["PATH"]
+            os.environ["FAKE_GPAC_VERSION"] = version
+            os.environ["FAKE_GPAC_EXTRA_FILTERS"] = str(filters)
+
+        try:
+            use("1.0", 0)
+            engine = self.engine("version")
+            line = "gpac zf000"
+            self.assertEqual(engine.complete(line, len(line)), [])
+            self.assertEqual(engine.complete("gpac inspect:mode=", 18), ["pck", "blk", "frame", "raw"])
+            self.assertTrue(engine.flush())
+
+            # the entries of 1.0 are served, stale, while the cache is rebuilt by a background process
+            use("2.0", 2)
+            # the binary is checked again once its fingerprint is older than FINGERPRINT_TTL
+            time.sleep(cm.FINGERPRINT_TTL)
+            self.assertEqual(engine.complete(line, len(line)), [])
+            self.assertEqual(engine.cache.stale, "1.0")
+            timeout = time.monotonic() + 30
+            while engine.cache.stale is not None and time.monotonic() < timeout:
+                time.sleep(0.05)
+                completions = engine.complete(line, len(line))
+            self.assertEqual(completions, ["zf0000", "zf0001"])
+            self.assertEqual(engine.version, ("2.0", None))
+            self.assertEqual(self.engine("version").get_cache().content["version"], "2.0")
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+
+
+if __name__ == '__main__':
+    unittest.main()
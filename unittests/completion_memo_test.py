@@ -0,0 +1,95 @@
+"""
+Unit tests for the memoized completions of the `autocomplete.gpac_autocomplete` module.
+The completions of each prefix of a command line, typed character by character, must be the
+same with and without the memo, and path completions must follow the changes of directories.
+"""
+import unittest
+import os
+import tempfile
+import autocomplete.gpac_autocomplete as ga
+from autocomplete.completion_memo import CompletionMemo, DirListings
+
+list_tests = [
+    "gpac -h inspect.d",
+    "gpac -h modules gm_",
+    "gpac inspect:deep:mode=pck:#Col",
+    "gpac routein:repair=",
+    "gpac -i file",
+    "gpac -o http",
+    "gpac compositor:ogl=on vout",
+    "gpac httpin:src=f",
+]
+
+
+class CompletionMemoTest(unittest.TestCase):
+
+    def test_prefixes(self):
+        ga.engine.memo = CompletionMemo()
+        for test in list_tests:
+            for pos in range(5, len(test) + 1):
+                self.assertEqual(ga.complete(test, pos), ga.generate_completions(test, pos),
+                                 "Test failed: _" + test[:pos] + "_")
+                # same line again, from the memo
+                self.assertEqual(ga.complete(test, pos), ga.generate_completions(test, pos),
+                                 "Test failed: _" + test[:pos] + "_")
+        self.assertGreater(ga.engine.memo.hits, 0)
+        self.assertGreater(ga.engine.memo.narrowed, 0)
+
+    def test_paths(self):
+        ga.engine.memo = CompletionMemo()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, "video1.mp4"), "w", encoding="utf-8"):
+                pass
+            for line in [f"gpac -i {tmpdir}/vid", "gpac -i vid"]:
+                self.assertEqual(ga.complete(line, len(line), tmpdir), [f"{line[8:-3]}video1.mp4 "])
+                with open(os.path.join(tmpdir, "video2.mp4"), "w", encoding="utf-8"):
+                    pass
+                self.assertEqual(ga.complete(line, len(line), tmpdir),
+                                 [f"{line[8:-3]}video1.mp4 ", f"{line[8:-3]}video2.mp4 "])
+                self.assertEqual(ga.complete(line + "e", len(line) + 1, tmpdir),
+                                 [f"{line[8:-3]}video1.mp4 ", f"{line[8:-3]}video2.mp4 "])
+                os.unlink(os.path.join(tmpdir, "video2.mp4"))
+
+    def test_eviction(self):
+        memo = CompletionMemo(2)
+        is_filter = lambda name: False
+        for line in ["gpac a", "gpac b", "gpac c"]:
+            memo.put("2.4", "/", line, line[5:], [line[5:] + "x"], [], is_filter)
+        self.assertIsNone(memo.get("2.4", "/", "gpac a", "a", is_filter))
+        self.assertEqual(memo.get("2.4", "/", "gpac b", "b", is_filter), ["bx"])
+        self.assertIsNone(memo.get("2.5", "/", "gpac b", "b", is_filter))
+        self.assertEqual(memo.get("2.4", "/", "gpac cx", "cx", is_filter), ["cx"])
+
+
+    def test_dir_listings(self):
+        listings = DirListings(1)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name in ["seg1.m4s", "seg2.m4s", "init.mp4"]:
+                with open(os.path.join(tmpdir, name), "w", encoding="utf-8"):
+                    pass
+            self.assertEqual(listings.find(tmpdir, "seg", False, 0), [("seg1.m4s", False), ("seg2.m4s", False)])
+            self.assertIsNone(listings.find(tmpdir, "seg", False, 1))
+            self.assertEqual(listings.find(tmpdir, "seg", True, 1), [])
+            os.makedirs(os.path.join(tmpdir, "segments"))
+            self.assertEqual(listings.find(tmpdir, "seg", True, 1), [("segments", True)])
+            self.assertEqual(list(listings.entries), [os.path.abspath(tmpdir)])
+
+    def test_too_many_paths(self):
+        ga.engine.memo = CompletionMemo()
+        ga.engine.dir_listings = DirListings()
+        max_results = ga.PATH_MAX_RESULTS
+        ga.PATH_MAX_RESULTS = 5
+        try:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                for i in range(12):
+                    with open(os.path.join(tmpdir, f"seg{i}.m4s"), "w", encoding="utf-8"):
+                        pass
+                self.assertEqual(ga.complete("gpac -i seg", 11, tmpdir), ga.too_many_matches)
+                # the marker is not narrowed
+                self.assertEqual(ga.complete("gpac -i seg1", 12, tmpdir), ["seg1.m4s ", "seg10.m4s ", "seg11.m4s "])
+        finally:
+            ga.PATH_MAX_RESULTS = max_results
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+"""
+Unit tests for the `autocomplete.completion_trace` module.
+With GPAC_AC_TRACE set, a completion must log its phases, its runs of gpac and its cache
+lookups as JSON lines. Without it, the traced functions must not be wrapped.
+"""
+import unittest
+import os
+import json
+import autocomplete.completion_trace as trace
+import autocomplete.gpac_autocomplete as ga
+from unittests import helpers
+
+
+class CompletionTraceTest(helpers.TempHomeTest):
+
+    def setUp(self):
+        super().setUp()
+        self.log = os.path.join(self.home, "trace.log")
+        # without deadline, the whole completion is traced by this process
+        self.env.update(GPAC_AC_TRACE=self.log, GPAC_AC_DEADLINE_MS="0")
+
+    def trace(self, line: str)-> list:
+        self.complete(line)
+        with open(self.log, encoding="utf-8") as file:
+            return [json.loads(e) for e in file]
+
+    def test_trace(self):
+        events = self.trace("gpac inspect:mode=")
+        runs = [e["argv"] for e in events if e["event"] == "run"]
+        self.assertIn(["gpac", "-hx", "inspect"], runs)
+        self.assertIn({"section": "args", "key": "inspect", "hit": False},
+                      [{k: e[k] for k in ["section", "key", "hit"] if k in e} for e in events if e["event"] == "lookup"])
+        phases = [e["name"] for e in events if e["event"] == "phase"]
+        for phase in ["Cache.__init__", "CompletionEngine.generate_completions", "CompletionEngine.analyze_filter", "Cache.save"]:
+            self.assertIn(phase, phases)
+        self.assertEqual(len([e for e in events if e["event"] == "completion"]), 1)
+
+        # second completion, from the cache
+        os.unlink(self.log)
+        events = self.trace("gpac inspect:mode=")
+        self.assertEqual([e for e in events if e["event"] == "run"], [])
+        self.assertTrue(all(e["hit"] for e in events if e["event"] == "lookup"))
+
+    def test_disabled(self):
+        self.assertFalse(trace.enabled)
+        function = lambda: None
+        self.assertIs(trace.traced(function), function)
+        self.assertFalse(hasattr(ga.generate_completions, "__wrapped__"))
+
+
+if __name__ == '__main__':
+    unittest.main()
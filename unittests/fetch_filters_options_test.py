@@ -0,0 +1,98 @@
+"""
+Unit tests for the `fetch_filters_options` function in the `autocomplete.cache_manager` module.
+The options of several filters extracted from a single gpac help request must be the same
+as the ones obtained with one request per filter and per enum argument, and the cache must
+get all the enum values of a filter from a single request.
+"""
+import unittest
+import os
+import tempfile
+import autocomplete.cache_manager as cm
+from unittests import helpers
+
+list_filters = ["inspect", "routein", "routeout", "httpout", "compositor", "j2kdec", "cryptout"]
+
+
+class FetchFiltersOptionsTest(helpers.TempHomeTest):
+
+    def test_fetch_filters_options(self):
+        res = cm.fetch_filters_options(list_filters)
+        self.assertEqual(sorted(res.keys()), sorted(list_filters))
+
+        for gfilter in list_filters:
+            dict_args = cm.fetch_list_args(gfilter)
+            values_enum_args = {arg: cm.fetch_type_arg_filter(gfilter, arg)[1]
+                                for arg in dict_args if dict_args[arg] == "enum"}
+            self.assertEqual(res[gfilter], (dict_args, values_enum_args), "Test failed: _" + gfilter + "_")
+            self.assertEqual(cm.fetch_filter_options(gfilter), (dict_args, values_enum_args),
+                             "Test failed: _" + gfilter + "_")
+
+    def test_hidden_options(self):
+        # the advanced and expert options are only listed by gpac -ha / -hx, and the help text
+        # before the options of a filter is not parsed as options
+        self.use_fake_gpac()
+        res = cm.fetch_filters_options(["inspect", "compositor"])
+        for gfilter, hidden in [("inspect", ["xml", "analyze", "fftmcd"]), ("compositor", ["drv", "tvtd"])]:
+            dict_args, values_enum_args = res[gfilter]
+            for arg in hidden:
+                self.assertIn(arg, dict_args, "Test failed: _" + gfilter + "." + arg + "_")
+            self.assertNotIn("syntax", dict_args, "Test failed: _" + gfilter + "_")
+            self.assertNotIn("VAL", sum(values_enum_args.values(), []), "Test failed: _" + gfilter + "_")
+        self.assertEqual(res["compositor"][1]["tvtd"], cm.fetch_type_arg_filter("compositor", "tvtd")[1])
+
+    def test_single_request(self):
+        self.use_fake_gpac()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            log = os.path.join(tmpdir, "gpac.log")
+            os.environ["FAKE_GPAC_LOG"] = log
+            try:
+                cache = cm.Cache(os.path.join(tmpdir, "gpac_autocomplete.json"))
+                for gfilter in list_filters:
+                    if os.path.exists(log):
+                        os.unlink(log)
+                    values = cache.get_cache_list_values_enum_args(gfilter)
+                    args = cache.get_cache_list_args(gfilter)
+                    for arg in args:
+                        cache.get_cache_type_arg_filter(gfilter, arg)
+                    if os.path.exists(log):
+                        with open(log, encoding="utf-8") as file:
+                            # one request per filter
+                            self.assertLessEqual(len(file.readlines()), 1, "Test failed: _" + gfilter + "_")
+                    expected = cm.build_values_enum_args(*cm.fetch_filter_options(gfilter))
+                    self.assertEqual(values, expected, "Test failed: _" + gfilter + "_")
+            finally:
+                del os.environ["FAKE_GPAC_LOG"]
+
+    def test_lazy_hidden_options(self):
+        # a completion fetches the options of a filter hidden by gpac -h FILTER too
+        self.use_fake_gpac()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = cm.Cache(os.path.join(tmpdir, "gpac_autocomplete.json"))
+            for gfilter in ["routein", "compositor"]:
+                self.assertEqual(cache.get_cache_list_args(gfilter), cm.fetch_list_args(gfilter),
+                                 "Test failed: _" + gfilter + "_")
+            self.assertIn("tsidbg", cache.get_cache_list_args("routein"))
+            dict_args = cm.fetch_list_args("compositor")
+            expected = cm.build_values_enum_args(dict_args, {arg: cm.fetch_type_arg_filter("compositor", arg)[1]
+                                                             for arg in dict_args if dict_args[arg] == "enum"})
+            self.assertIn("tvtd", expected.values())
+            self.assertEqual(cache.get_cache_list_values_enum_args("compositor"), expected)
+
+    def test_failing_filter(self):
+        self.use_fake_gpac()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.environ["FAKE_GPAC_FAIL"] = "routein"
+            try:
+                cache = cm.Cache(os.path.join(tmpdir, "gpac_autocomplete.json"))
+                # the request of the chunk of routein fails: its other filters are fetched one by one
+                cache.fill_filters_options(list_filters, 2)
+            finally:
+                del os.environ["FAKE_GPAC_FAIL"]
+            args = cache.content["cache"]["args"]
+            self.assertEqual(sorted(args), sorted(e for e in list_filters if e != "routein"))
+            for gfilter in args:
+                self.assertEqual(args[gfilter], cm.fetch_list_args(gfilter), "Test failed: _" + gfilter + "_")
+
+
+if __name__ == '__main__':
+    unittest.main()
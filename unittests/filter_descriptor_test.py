@@ -0,0 +1,52 @@
+"""
+Unit tests for the `autocomplete.filter_descriptor` module.
+A descriptor must resolve the options of a command line to the arguments they set, and list the
+arguments and enum values not set yet. It must be built once per filter.
+"""
+import unittest
+import autocomplete.gpac_autocomplete as ga
+from autocomplete.filter_descriptor import FilterDescriptor
+from autocomplete.prefix_index import PrefixIndex
+
+args = {"mode": "enum", "deep": "bool", "log": "str", "fmt": "str"}
+enum_values = {"pck": "mode", "blk": "mode", "tree": "mode"}
+
+
+class FilterDescriptorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.lookups = []
+
+        def get_type(gfilter, arg):
+            self.lookups.append((gfilter, arg))
+            return args[arg], [e for e in enum_values if enum_values[e] == arg]
+
+        self.descriptor = FilterDescriptor("inspect", args, enum_values, PrefixIndex(args),
+                                           PrefixIndex(enum_values), get_type)
+
+    def test_resolve(self):
+        opt, used_props = self.descriptor.resolve(["inspect", "deep", "log=x", "blk", "#Width=2", "unknown"])
+        self.assertEqual(opt, ["inspect", "deep", "log", "mode", "#Width=2", "unknown"])
+        self.assertEqual(used_props, {"Width"})
+
+    def test_unused(self):
+        self.assertEqual(self.descriptor.unused({"deep", "mode"}), ["log", "fmt"])
+        self.assertEqual(self.descriptor.unused({"deep"}), ["mode", "log", "fmt", "pck", "blk", "tree"])
+
+    def test_arg_type(self):
+        self.assertEqual(self.descriptor.arg_type("mode"), ("enum", ["pck", "blk", "tree"]))
+        self.assertEqual(self.descriptor.arg_type("mode"), ("enum", ["pck", "blk", "tree"]))
+        self.assertEqual(self.lookups, [("inspect", "mode")])
+
+    def test_built_once(self):
+        ga.reset_lazy_lists()
+        ga.analyze_filter("inspect", "inspect:")
+        descriptor = ga.engine.descriptors["inspect"]
+        ga.analyze_filter("inspect", "inspect:mode=")
+        self.assertIs(ga.get_filter_descriptor("inspect"), descriptor)
+        ga.reset_lazy_lists()
+        self.assertNotIn("inspect", ga.engine.descriptors)
+
+
+if __name__ == '__main__':
+    unittest.main()
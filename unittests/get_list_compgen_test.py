@@ -5,6 +5,7 @@ of file and directory completions based on a given path prefix.
 """
 import unittest
 import os
+import tempfile
 import autocomplete.gpac_autocomplete as ga
 
 class GetListCompgenTest(unittest.TestCase):
@@ -20,6 +21,7 @@ class GetListCompgenTest(unittest.TestCase):
         for dirname in dirs:
             os.makedirs("/tmp/test_dir/" + dirname, exist_ok=True)
 
+        # completions are sorted, whatever the order of the entries in the directory
         list_tests = [
             ("~", ["~/"], ["~/"]),
             ("/home", ["/home/"], ["/home/"]),
@@ -32,12 +34,12 @@ class GetListCompgenTest(unittest.TestCase):
             ("/tmp/test_dir/.t", ["/tmp/test_dir/.test ", "/tmp/test_dir/.test_dir2/",
                                 "/tmp/test_dir/.test_file1 ", "/tmp/test_dir/.test_file2 "],
                                 ["/tmp/test_dir/.test_dir2/"]),
-            ("/tmp/test_dir/.",['/tmp/test_dir/./', '/tmp/test_dir/.space\\ file2 ',
+            ("/tmp/test_dir/.",['/tmp/test_dir/./', '/tmp/test_dir/../',
+                                '/tmp/test_dir/.space\\ dir2/', '/tmp/test_dir/.space\\ file2 ',
                                 '/tmp/test_dir/.test ', '/tmp/test_dir/.test_dir2/',
-                                '/tmp/test_dir/../', '/tmp/test_dir/.test_file1 ',
-                                '/tmp/test_dir/.space\\ dir2/', '/tmp/test_dir/.test_file2 '],
-                                ['/tmp/test_dir/./', '/tmp/test_dir/.test_dir2/',
-                                 '/tmp/test_dir/../', '/tmp/test_dir/.space\\ dir2/']),
+                                '/tmp/test_dir/.test_file1 ', '/tmp/test_dir/.test_file2 '],
+                                ['/tmp/test_dir/./', '/tmp/test_dir/../',
+                                 '/tmp/test_dir/.space\\ dir2/', '/tmp/test_dir/.test_dir2/']),
             ("/tmp/test_dir/this_does_not_exist", [], []),
             ("/tmp/test_dir/space\\ f", ["/tmp/test_dir/space\\ file1 "], []),
             ("/tmp/test_dir/space\\ ", ["/tmp/test_dir/space\\ dir1/",
@@ -60,3 +62,23 @@ class GetListCompgenTest(unittest.TestCase):
         for dirname in dirs:
             os.rmdir("/tmp/test_dir/" + dirname)
         os.rmdir("/tmp/test_dir")
+
+    def test_too_many_matches(self):
+        max_results = ga.PATH_MAX_RESULTS
+        ga.PATH_MAX_RESULTS = 10
+        try:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                for i in range(30):
+                    with open(f"{tmpdir}/seg{i:03}.m4s", "w", encoding="utf-8"):
+                        pass
+                os.makedirs(f"{tmpdir}/segments")
+                # the directory listing stops past 10 matches
+                self.assertEqual(ga.get_list_compgen(f"{tmpdir}/seg", False), ga.too_many_matches)
+                self.assertEqual(ga.get_list_compgen(f"{tmpdir}/seg00", False),
+                                 [f"{tmpdir}/seg{i:03}.m4s " for i in range(10)])
+                self.assertEqual(ga.get_list_compgen(f"{tmpdir}/seg", True), [f"{tmpdir}/segments/"])
+                ga.PATH_MAX_RESULTS = 0
+                self.assertEqual(len(ga.get_list_compgen(f"{tmpdir}/seg", False)), 31)
+        finally:
+            ga.PATH_MAX_RESULTS = max_results
+
@@ -0,0 +1,78 @@
+"""
+Helpers shared by the unit tests: the scripted gpac of the benchmarks, the script run in a new
+interpreter as the Bash script runs it, and the test cases run in a temporary home directory.
+"""
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AUTOCOMPLETE_DIR = os.path.join(ROOT, "autocomplete")
+# scripted gpac of the benchmarks (see benchmarks/fake_gpac/gpac)
+FAKE_GPAC_DIR = os.path.join(ROOT, "benchmarks", "fake_gpac")
+
+# same command as the Bash script, followed by the directory of the script and its arguments
+COMPLETE = "import sys; sys.path[0] = sys.argv[1]; import gpac_autocomplete as ga; sys.exit(ga.main(sys.argv[2:]))"
+
+
+def script_command(*args: str)-> list:
+    """
+    Command running the script with the given arguments in a new interpreter.
+    """
+    return [sys.executable, "-c", COMPLETE, AUTOCOMPLETE_DIR, *args]
+
+
+def copy_fake_gpac(bin_dir: str)-> str:
+    """
+    Copy the scripted gpac to bin_dir, e.g. as another build of gpac, and return bin_dir.
+    """
+    shutil.copytree(FAKE_GPAC_DIR, bin_dir)
+    return bin_dir
+
+
+def gpac_runs(log: str)-> int:
+    """
+    Number of runs of the scripted gpac recorded in its FAKE_GPAC_LOG file.
+    """
+    if not os.path.exists(log):
+        return 0
+    with open(log, encoding="utf-8") as file:
+        return len(file.readlines())
+
+
+class TempHomeTest(unittest.TestCase):
+    """
+    Test case run in a temporary home directory, self.home, whose cache file is self.cache_path.
+    self.env is the environment of the processes started by the test, without base cache, and
+    os.environ is restored after each test.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.home = self.tmpdir.name
+        self.cache_path = os.path.join(self.home, ".cache", "gpac", "gpac_autocomplete.json")
+        self.env = dict(os.environ, HOME=self.home, GPAC_AC_BASE_CACHE="")
+        self.environ = dict(os.environ)
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        self.tmpdir.cleanup()
+
+    def use_fake_gpac(self, bin_dir: str = FAKE_GPAC_DIR):
+        """
+        Run the scripted gpac of bin_dir, in this process and in the processes started by the
+        test, for the tests which need its data or its FAKE_GPAC_* variables.
+        """
+        for env in [os.environ, self.env]:
+            env["PATH"] = bin_dir + os.pathsep + self.environ["PATH"]
+
+    def complete(self, line: str)-> list:
+        """
+        Completions of line printed by the script, run with self.env.
+        """
+        output = subprocess.check_output(script_command(str(len(line)), f'"{line}"'), env=self.env)
+        return output.decode().splitlines()
@@ -0,0 +1,62 @@
+"""
+Unit tests for the `autocomplete.line_tokenizer` module.
+The words of a command line must be the ones matched by the regular expression of the
+previous tokenizer, at the positions given, and long command lines must be tokenized in a
+time linear in their length.
+"""
+import unittest
+import re
+import time
+import random
+import autocomplete.line_tokenizer as lt
+
+PATTERN = r'(?:[^\s"\\]+|"(?:\\.|[^"\\])*"|\\.)+'
+HELP_FLAGS = frozenset(["-h", "-help", "-ha", "-hx", "-hh"])
+
+
+def regex_tokenize(line: str)-> tuple:
+    quote_added = line.count('"') % 2 == 1
+    if quote_added:
+        line += '"'
+    words = re.findall(PATTERN, line)
+    if line[-1:] == " " and line[-2:-1] != "\\":
+        words.append("")
+    help_mode = any(words[i] in HELP_FLAGS for i in range(len(words) - 1))
+    return words, help_mode, quote_added
+
+
+class LineTokenizerTest(unittest.TestCase):
+
+    def check(self, line: str):
+        tokens = lt.tokenize(line, HELP_FLAGS)
+        self.assertEqual((tokens.words, tokens.help_mode, tokens.quote_added), regex_tokenize(line),
+                         "Test failed: _" + line + "_")
+        closed = line + '"' if tokens.quote_added else line
+        self.assertEqual([closed[s:s + len(w)] for s, w in zip(tokens.starts, tokens.words)], tokens.words)
+
+    def test_lines(self):
+        for line in ["gpac ", "gpac -i in.mp4 inspect:deep", 'gpac -i "my file.mp4" ', 'gpac -o "out',
+                     "gpac -i my\\ file.mp4 ", "gpac -h inspect", "gpac -h", 'gpac "a\\"b" c', 'gpac "a\\',
+                     'gpac a"b c"d e', "gpac \\", "gpac a\\\nb", "", " ", "gpac\t-h\tx", 'gpac "x" "']:
+            self.check(line)
+
+    def test_random_lines(self):
+        rand = random.Random(0)
+        alphabet = ["a", "bc", " ", "\t", "\n", '"', "\\", ":", "=", "-h", "é"]
+        for _ in range(20000):
+            self.check("".join(rand.choices(alphabet, k=rand.randint(0, 16))))
+
+    def test_linear(self):
+        def elapsed(size: int)-> float:
+            line = "gpac -i in.mp4 " + 'inspect:log="out file.txt":deep ' * (size // 32)
+            start = time.perf_counter()
+            for _ in range(5):
+                lt.tokenize(line, HELP_FLAGS)
+            return time.perf_counter() - start
+        elapsed(1000)
+        # 16 times longer lines, with a large margin for the timer and the machine load
+        self.assertLess(elapsed(160000), 64 * elapsed(10000))
+
+
+if __name__ == '__main__':
+    unittest.main()
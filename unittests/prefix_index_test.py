@@ -0,0 +1,42 @@
+"""
+Unit tests for the `PrefixIndex` class in the `autocomplete.prefix_index` module.
+Prefix queries must return the same names, in the same order, as a linear scan.
+"""
+import unittest
+import random
+import string
+import autocomplete.prefix_index as pi
+
+
+class PrefixIndexTest(unittest.TestCase):
+
+    def test_startswith(self):
+        names = ["inspect", "httpin", "httpout", "routein", "routeout", "rtpin", "mp4mx", "mp4dmx",
+                 "txtin", "tx3g2srt", "tx3g2vtt", "tx3g2ttml", "http", "i", ""]
+        index = pi.PrefixIndex(names)
+        for prefix in ["", "h", "http", "httpo", "r", "ro", "tx", "tx3g2", "mp4", "x", "inspect",
+                       "inspectx", "i"]:
+            self.assertEqual(index.startswith(prefix), [e for e in names if e.startswith(prefix)],
+                             "Test failed: _" + prefix + "_")
+
+    def test_random_names(self):
+        rand = random.Random(0)
+        names = list({"".join(rand.choices(string.ascii_lowercase[:4], k=rand.randint(1, 6)))
+                      for _ in range(300)})
+        args = {name: "bool" for name in names}
+        index = pi.PrefixIndex(args)
+        for _ in range(200):
+            prefix = "".join(rand.choices(string.ascii_lowercase[:5], k=rand.randint(0, 4)))
+            self.assertEqual(index.startswith(prefix), [e for e in args if e.startswith(prefix)])
+            self.assertEqual(prefix in index, prefix in args)
+
+    def test_stored_order(self):
+        names = ["b", "a", "c"]
+        self.assertEqual(pi.PrefixIndex(names, [1, 0, 2]).order, [1, 0, 2])
+        # orders which do not sort the current names are recomputed
+        for order in [[0, 1, 2], [1, 0], [1, 1, 2], [1, 0, 5], None]:
+            self.assertEqual(pi.PrefixIndex(names, order).order, [1, 0, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+"""
+Unit tests for the completions answered by the Bash script without starting Python.
+Once the lists of the script are written next to the cache, the Bash hook must complete
+empty words, options and filter names as the script does, and leave the other completions,
+and the lists of another or a newer gpac binary or libgpac, to the script.
+"""
+import unittest
+import os
+import json
+import subprocess
+from unittests import helpers
+
+# prints the completions of the hook as a JSON list, or null when it leaves them to the script
+NATIVE = """
+source "$1/bash_gpac_autocomplete.sh"
+if _gpac_native_completion "$2" "${#2}"; then
+    python3 -c 'import json, sys; print(json.dumps(sys.argv[1:]))' "${COMPREPLY[@]}"
+else
+    echo null
+fi
+"""
+
+list_native = ["gpac ", "gpac -", "gpac -h", "gpac -s", "gpac ins", "gpac inspect:deep ", "gpac x", "gpac"]
+list_script = ["gpac inspect", "gpac inspect:", "gpac -i ", "gpac src=", "gpac -h ", "gpac \"ins", "gpac ins\\ "]
+
+
+class ShellListsTest(helpers.TempHomeTest):
+
+    def setUp(self):
+        super().setUp()
+        # a copy of the gpac binary, whose modification time can be changed
+        self.bin_dir = helpers.copy_fake_gpac(os.path.join(self.home, "bin"))
+        self.use_fake_gpac(self.bin_dir)
+        self.env["GPAC_AC_DEADLINE_MS"] = "0"
+        self.lists = os.path.join(self.home, ".cache", "gpac", "gpac_autocomplete.lists")
+
+    def native(self, line: str)-> list|None:
+        output = subprocess.check_output(["bash", "-c", NATIVE, "bash", helpers.ROOT, line], env=self.env)
+        return json.loads(output)
+
+    def test_native(self):
+        self.assertIsNone(self.native("gpac "))
+        self.complete("gpac ")
+        self.assertTrue(os.path.exists(self.lists))
+        for line in list_native:
+            self.assertEqual(self.native(line), self.complete(line), "Test failed: _" + line + "_")
+
+    def test_script(self):
+        self.complete("gpac ")
+        for line in list_script:
+            self.assertIsNone(self.native(line), "Test failed: _" + line + "_")
+
+    def test_gpac_changed(self):
+        self.complete("gpac ")
+        # a newer binary: the lists are left to the script, which writes them again
+        stat = os.stat(self.lists)
+        os.utime(os.path.join(self.bin_dir, "gpac"), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.utime(self.lists, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**10))
+        self.assertIsNone(self.native("gpac "))
+        self.complete("gpac ")
+        self.assertIsNotNone(self.native("gpac "))
+
+        # another binary in PATH
+        self.env["PATH"] = self.environ["PATH"]
+        self.assertIsNone(self.native("gpac "))
+
+    def test_libgpac_changed(self):
+        libgpac = os.path.join(self.bin_dir, "libgpac.so")
+        open(libgpac, "wb").close()
+        self.complete("gpac ")
+        self.assertIsNotNone(self.native("gpac "))
+        # a newer libgpac: the lists are left to the script, which writes them again
+        stat = os.stat(self.lists)
+        os.utime(libgpac, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.utime(self.lists, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**10))
+        self.assertIsNone(self.native("gpac "))
+        self.complete("gpac ")
+        self.assertIsNotNone(self.native("gpac "))
+
+        # another LD_LIBRARY_PATH
+        self.env["LD_LIBRARY_PATH"] = self.home
+        self.assertIsNone(self.native("gpac "))
+        self.complete("gpac ")
+        self.assertIsNotNone(self.native("gpac "))
+
+
+if __name__ == '__main__':
+    unittest.main()
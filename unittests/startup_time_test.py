@@ -0,0 +1,57 @@
+"""
+Unit tests for the startup time of the `autocomplete.gpac_autocomplete` script.
+Trivial completions must not load the cache nor import the modules it needs, and must run
+within STARTUP_BUDGET_MS milliseconds more than an empty Python interpreter, started with
+the flags used by the Bash script.
+"""
+import unittest
+import os
+import sys
+import time
+import subprocess
+from unittests import helpers
+
+# overridable for slow machines, e.g. GPAC_AC_STARTUP_BUDGET_MS=50
+STARTUP_BUDGET_MS = float(os.environ.get("GPAC_AC_STARTUP_BUDGET_MS", "15"))
+PYTHON_FLAGS = ["-S", "-E"]
+RUNS = 15
+
+IMPORT_DIR = "import sys; sys.path[0] = sys.argv[1]"
+
+list_trivial = ["gpac -", "gpac -h", "gpac -i"]
+
+
+def median_time(args: list)-> float:
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *PYTHON_FLAGS, *args], stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return sorted(times)[RUNS // 2] * 1000
+
+
+class StartupTimeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.script_dir = helpers.AUTOCOMPLETE_DIR
+
+    def test_trivial_imports(self):
+        for line in list_trivial:
+            code = IMPORT_DIR + "; import gpac_autocomplete as ga; ga.generate_completions(sys.argv[2], len(sys.argv[2]));" \
+                   "print(' '.join(sys.modules))"
+            modules = subprocess.check_output([sys.executable, *PYTHON_FLAGS, "-c", code, self.script_dir, line]).decode().split()
+            for module in ["cache_manager", "json", "re", "subprocess", "pathlib"]:
+                self.assertNotIn(module, modules, "Test failed: _" + line + "_")
+
+    def test_trivial_budget(self):
+        # compile the modules first, as done by install.sh
+        subprocess.run([sys.executable, *PYTHON_FLAGS, "-c", helpers.COMPLETE, self.script_dir, "6", '"gpac -"'],
+                       stdout=subprocess.DEVNULL, check=True)
+        empty = median_time(["-c", "pass"])
+        for line in list_trivial:
+            elapsed = median_time(["-c", helpers.COMPLETE, self.script_dir, str(len(line)), f'"{line}"'])
+            self.assertLess(elapsed - empty, STARTUP_BUDGET_MS, "Test failed: _" + line + "_")
+
+
+if __name__ == '__main__':
+    unittest.main()